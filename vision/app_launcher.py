@@ -405,19 +405,23 @@ class FeedingControlApp:
         def camera_test():
             try:
                 import cv2
-                cap = cv2.VideoCapture(1)
-                if cap.isOpened():
-                    ret, frame = cap.read()
-                    if ret:
-                        self.log_message("摄像头测试成功")
-                        cv2.imshow("Camera Test", frame)
-                        cv2.waitKey(2000)
-                        cv2.destroyAllWindows()
+                from camera_source import open_camera
+                cap = open_camera(1)
+                try:
+                    if cap.isOpened():
+                        ret, frame = cap.read()
+                        if ret:
+                            self.log_message("摄像头测试成功")
+                            cv2.imshow("Camera Test", frame)
+                            cv2.waitKey(2000)
+                            cv2.destroyAllWindows()
+                        else:
+                            self.log_message("摄像头无法读取图像", "ERROR")
                     else:
-                        self.log_message("摄像头无法读取图像", "ERROR")
+                        self.log_message("无法打开摄像头", "ERROR")
+                finally:
+                    # open_camera 每次调用都要对应一次 release()，打开失败时也一样
                     cap.release()
-                else:
-                    self.log_message("无法打开摄像头", "ERROR")
             except Exception as e:
                 self.log_message(f"摄像头测试失败: {e}", "ERROR")
         
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+批量提取录像中的嘴部轨迹
+对目录中的所有录像（普通视频文件或 frame_record.py 的录制文件）运行嘴部检测，
+每个视频切分成若干段，由进程池并行处理（每个工作进程一个FaceMesh），
+结果按列保存为每个视频一个 .npz 文件：
+    frame          帧序号 (N,) int32
+    time_ms        帧时间（毫秒，相对视频开头）(N,) float64
+    detected       是否检测到嘴部 (N,) bool
+    center         嘴部中心 (N, 2) float32，未检测到为 NaN
+    bbox           嘴部外接框 (x_min, y_min, x_max, y_max) (N, 4) float32
+    landmarks      嘴唇关键点像素坐标 (N, K, 2) float32，顺序与 landmark_ids 一致
+    landmark_ids   关键点索引（mouth_track.MOUTH_LANDMARKS）
+    image_size     图像尺寸 (宽, 高)
+用法: python batch_extract.py <录像目录> <输出目录> [--workers 4]
+"""
+
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import time
+
+import cv2
+import numpy as np
+
+from mouth_track import MOUTH_LANDMARKS
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+# 工作进程中的嘴部检测器，由 _init_worker 创建
+_detector = None
+
+def is_recording(path):
+    """是否为 frame_record.py 的录制文件"""
+    from frame_record import MAGIC
+
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def find_videos(directory):
+    """列出目录（含子目录）中的录像文件"""
+    paths = []
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*"), recursive=True)):
+        if not os.path.isfile(path):
+            continue
+        if path.lower().endswith(VIDEO_EXTENSIONS) or is_recording(path):
+            paths.append(path)
+    return paths
+
+def open_video(path):
+    """打开普通视频或录制文件，返回 VideoCapture 兼容对象"""
+    if is_recording(path):
+        from frame_record import ReplaySource
+        return ReplaySource(path, realtime=False)
+    return cv2.VideoCapture(path)
+
+def frame_time_ms(cap, index, fps):
+    """帧时间（毫秒，相对视频开头）"""
+    if hasattr(cap, "timestamps"):
+        return float(cap.timestamps[index] - cap.timestamps[0]) * 1000.0
+    return index * 1000.0 / fps if fps > 0 else float(index)
+
+def _init_worker(inference_scale, face_mesh_options):
+    """工作进程初始化：每个进程创建一个检测器（FaceMesh在首次推理时加载）"""
+    global _detector
+    from mouth_track import MouthDetector, get_face_mesh
+
+    _detector = MouthDetector(use_roi=True, inference_scale=inference_scale,
+                              face_mesh=get_face_mesh(**face_mesh_options))
+
+def _process_chunk(task):
+    """
+    处理一个视频的一段 [start, end) 帧
+    返回: (视频路径, 起始帧, 列数据字典)
+    """
+    path, start, end = task
+    cap = open_video(path)
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    # 各段之间没有连续性（可能来自不同的视频）：清除ROI跟踪状态和FaceMesh内部的跟踪状态，从整帧检测开始
+    _detector.reset()
+    _detector.face_mesh.reset()
+
+    frames, times, detected, centers, bboxes, landmarks = [], [], [], [], [], []
+    image_size = None
+    empty_points = np.full((len(MOUTH_LANDMARKS), 2), np.nan, dtype=np.float32)
+    index = start
+    while end is None or index < end:
+        success, frame = cap.read()
+        if not success:
+            break
+        image_size = (frame.shape[1], frame.shape[0])
+        mouth = _detector.find_mouth(frame)
+
+        frames.append(index)
+        times.append(frame_time_ms(cap, index, fps))
+        detected.append(mouth is not None)
+        if mouth is None:
+            centers.append((np.nan, np.nan))
+            bboxes.append((np.nan,) * 4)
+            landmarks.append(empty_points)
+        else:
+            points, center, bbox = mouth
+            centers.append(center)
+            bboxes.append(bbox)
+            landmarks.append(points)
+        index += 1
+    cap.release()
+
+    count = len(frames)
+    columns = {
+        "frame": np.array(frames, dtype=np.int32),
+        "time_ms": np.array(times, dtype=np.float64),
+        "detected": np.array(detected, dtype=bool),
+        "center": np.array(centers, dtype=np.float32).reshape(count, 2),
+        "bbox": np.array(bboxes, dtype=np.float32).reshape(count, 4),
+        "landmarks": np.array(landmarks, dtype=np.float32).reshape(count, len(MOUTH_LANDMARKS), 2),
+        "image_size": image_size,
+    }
+    return path, start, columns
+
+def output_path(path, input_dir, output_dir):
+    """输出文件路径：保持相对目录结构，扩展名换成 .npz"""
+    relative = os.path.relpath(path, input_dir)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + ".npz")
+
+def plan_chunks(paths, chunk_frames):
+    """
+    把每个视频按 chunk_frames 帧切分成任务 (路径, 起始帧, 结束帧)
+    帧数未知的视频（部分编码格式）整段作为一个任务
+    """
+    tasks = {}
+    for path in paths:
+        cap = open_video(path)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if chunk_frames <= 0 or frame_count <= 0:
+            tasks[path] = [(path, 0, None)]
+        else:
+            tasks[path] = [(path, start, min(start + chunk_frames, frame_count))
+                           for start in range(0, frame_count, chunk_frames)]
+    return tasks
+
+def save_columns(path, chunks):
+    """按起始帧顺序拼接各段结果并保存"""
+    parts = [chunks[start] for start in sorted(chunks)]
+    image_size = next((part["image_size"] for part in parts if part["image_size"] is not None), (0, 0))
+    columns = {key: np.concatenate([part[key] for part in parts])
+               for key in ("frame", "time_ms", "detected", "center", "bbox", "landmarks")}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, landmark_ids=np.array(MOUTH_LANDMARKS, dtype=np.int32),
+                        image_size=np.array(image_size, dtype=np.int32), **columns)
+    return len(columns["frame"]), int(columns["detected"].sum())
+
+def main():
+    parser = argparse.ArgumentParser(description="批量提取录像中的嘴部轨迹")
+    parser.add_argument("input_dir", help="录像目录")
+    parser.add_argument("output_dir", help="输出目录")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="工作进程数")
+    parser.add_argument("--chunk-frames", type=int, default=1800,
+                        help="每个任务处理的帧数（长视频切分后并行处理，0 为不切分）")
+    parser.add_argument("--inference-scale", type=float, default=1.0, help="推理缩放比例")
+    parser.add_argument("--overwrite", action="store_true", help="覆盖已存在的输出文件")
+    args = parser.parse_args()
+
+    paths = find_videos(args.input_dir)
+    if not args.overwrite:
+        paths = [path for path in paths
+                 if not os.path.exists(output_path(path, args.input_dir, args.output_dir))]
+    if not paths:
+        print("没有需要处理的录像")
+        return
+
+    tasks = plan_chunks(paths, args.chunk_frames)
+    task_list = [task for path in paths for task in tasks[path]]
+    print(f"录像 {len(paths)} 个，任务 {len(task_list)} 个，工作进程 {args.workers} 个")
+
+    pending = {path: len(tasks[path]) for path in paths}
+    results = {path: {} for path in paths}
+    total_frames = 0
+    start_time = time.time()
+    with mp.Pool(args.workers, initializer=_init_worker, initargs=(args.inference_scale, {})) as pool:
+        for path, start, columns in pool.imap_unordered(_process_chunk, task_list):
+            results[path][start] = columns
+            total_frames += len(columns["frame"])
+            pending[path] -= 1
+            if pending[path] == 0:
+                out = output_path(path, args.input_dir, args.output_dir)
+                count, detected = save_columns(out, results.pop(path))
+                print(f"{path}: {count} 帧，检测到嘴部 {detected} 帧 -> {out}")
+
+    elapsed = time.time() - start_time
+    print(f"共处理 {total_frames} 帧，用时 {elapsed:.1f} 秒（{total_frames / max(elapsed, 1e-6):.1f} 帧/秒）")
+
+if __name__ == "__main__":
+    main()
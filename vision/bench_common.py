@@ -0,0 +1,13 @@
+"""
+基准测试脚本共用的工具函数
+"""
+
+import subprocess
+
+def git_revision():
+    """当前代码版本，无法获取时返回 None"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
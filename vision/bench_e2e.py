@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+端到端延迟基准测试
+用录制文件（frame_record.py record 录制）回放画面驱动 RobotArmController，串口换成进程内的假串口，
+记录每条 set_servo_angle 命令的发出时间，统计：
+- 各阶段延迟：帧从采集到被读取、嘴部检测、检测完成到发出命令、串口命令往返
+- 从采集到发出命令的端到端延迟（glass-to-command）
+- 每秒处理帧数和每秒命令数
+结果以 JSON 输出，可以在不同版本之间直接对比
+用法: python bench_e2e.py <录制文件> [--mode dynamic single] [--output result.json]
+"""
+
+import argparse
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from bench_common import git_revision
+from calculate_angle import RobotArmController
+from frame_record import ReplaySource
+
+class FakeSerial:
+    """
+    假串口：记录每条舵机命令的时间，并像下位机一样回复 "Servo X set to Y degrees"
+    response_delay: 模拟下位机处理和串口传输的回复延迟（秒）
+    """
+
+    def __init__(self, response_delay=0.002):
+        self.response_delay = response_delay
+        self.is_open = True
+        self.commands = []      # (发出时间, 舵机号, 角度)
+        self._responses = []    # (可读取时间, 回复内容)
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        """记录命令并安排回复"""
+        now = time.time()
+        for line in data.decode("utf-8").splitlines():
+            parts = line.split()
+            if len(parts) == 3 and parts[0] == "set_servo_angle":
+                servo_id, angle = int(parts[1]), int(parts[2])
+                pulse = 500000 + angle * 2000000 // 180
+                with self._lock:
+                    self.commands.append((now, servo_id, angle))
+                    self._responses.append((now + self.response_delay,
+                                            f"Servo {servo_id} set to {angle} degrees (pulse: {pulse} ns)\n"))
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        """已经可以读取的回复字节数"""
+        now = time.time()
+        with self._lock:
+            return sum(len(text) for ready, text in self._responses if ready <= now)
+
+    def readline(self):
+        """读取一行回复"""
+        with self._lock:
+            if not self._responses or self._responses[0][0] > time.time():
+                return b""
+            return self._responses.pop(0)[1].encode("utf-8")
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._responses = []
+
+    def close(self):
+        self.is_open = False
+
+class LatencyProbe:
+    """
+    给控制器挂上计时钩子，记录各阶段时间
+    命令归属于发出时最近一次检测到嘴部的测量（预测控制时即滤波器最近一次更新所用的帧）
+    """
+
+    def __init__(self, controller, source, first_command_only=False):
+        """
+        first_command_only: 每次测量只统计其后的第一条命令（单次喂食时后续命令之间有固定等待）
+        """
+        self.controller = controller
+        self.first_command_only = first_command_only
+        self._lock = threading.Lock()
+        self.frame_age = []           # 采集 -> 被读取 (ms)
+        self.detect = []              # 单帧检测耗时 (ms)
+        self.detect_to_command = []   # 检测完成 -> 发出命令 (ms)
+        self.glass_to_command = []    # 采集 -> 发出命令 (ms)
+        self.serial_round_trip = []   # send_servo_command 耗时 (ms)
+        self.frames = 0
+        self.detections = 0
+        self._last_capture = None     # 最近读取的帧的采集时间
+        self._measurement = None      # 最近一次检测到嘴部的 (采集时间, 检测完成时间)
+
+        # 读取：记录采集时间和帧龄（read() 内部也调用 read_timestamped）
+        read_timestamped = source.read_timestamped
+
+        def timed_read(*args, **kwargs):
+            success, frame, timestamp = read_timestamped(*args, **kwargs)
+            if success:
+                self.frame_age.append((time.time() - timestamp) * 1000)
+                self._last_capture = timestamp
+            return success, frame, timestamp
+        source.read_timestamped = timed_read
+
+        # 检测：单进程时在控制器线程中运行
+        detector = controller.mouth_detector
+        find_mouth = detector.find_mouth
+
+        def timed_find_mouth(frame):
+            start = time.perf_counter()
+            mouth = find_mouth(frame)
+            self.detect.append((time.perf_counter() - start) * 1000)
+            self.frames += 1
+            if mouth is not None:
+                self._set_measurement(self._last_capture)
+            return mouth
+        detector.find_mouth = timed_find_mouth
+
+        # 多进程流水线：检测耗时由工作进程返回
+        handle_pipeline_result = controller.handle_pipeline_result
+
+        def timed_pipeline_result(result, *args, **kwargs):
+            self.detect.append(result["inference_time"] * 1000)
+            self.frames += 1
+            if result["is_detected"]:
+                self._set_measurement(result["timestamp"])
+            return handle_pipeline_result(result, *args, **kwargs)
+        controller.handle_pipeline_result = timed_pipeline_result
+
+        # 串口命令
+        send_servo_command = controller.send_servo_command
+
+        def timed_send(servo_id, angle):
+            start = time.time()
+            with self._lock:
+                measurement = self._measurement
+                if self.first_command_only:
+                    self._measurement = None
+            if measurement is not None:
+                captured, detected = measurement
+                self.glass_to_command.append((start - captured) * 1000)
+                self.detect_to_command.append((start - detected) * 1000)
+            result = send_servo_command(servo_id, angle)
+            self.serial_round_trip.append((time.time() - start) * 1000)
+            return result
+        controller.send_servo_command = timed_send
+
+    def _set_measurement(self, captured):
+        with self._lock:
+            self.detections += 1
+            if captured is not None:
+                self._measurement = (captured, time.time())
+
+def percentiles(values):
+    """延迟统计 (ms)"""
+    if not values:
+        return {"count": 0}
+    data = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(data.size),
+        "mean": round(float(data.mean()), 3),
+        "p50": round(float(np.percentile(data, 50)), 3),
+        "p90": round(float(np.percentile(data, 90)), 3),
+        "p99": round(float(np.percentile(data, 99)), 3),
+        "max": round(float(data.max()), 3),
+    }
+
+def summarize(probe, serial_port, duration):
+    """整理一次运行的统计结果"""
+    commands = len(serial_port.commands)
+    return {
+        "duration_s": round(duration, 3),
+        "frames": probe.frames,
+        "detections": probe.detections,
+        "frames_per_second": round(probe.frames / duration, 2) if duration > 0 else 0.0,
+        "commands": commands,
+        "commands_per_second": round(commands / duration, 2) if duration > 0 else 0.0,
+        "latency_ms": {
+            "frame_age": percentiles(probe.frame_age),
+            "detect": percentiles(probe.detect),
+            "detect_to_command": percentiles(probe.detect_to_command),
+            "glass_to_command": percentiles(probe.glass_to_command),
+            "serial_round_trip": percentiles(probe.serial_round_trip),
+        },
+    }
+
+def make_controller(path, realtime, response_delay, first_command_only=False):
+    """创建使用回放源和假串口的控制器"""
+    source = ReplaySource(path, realtime=realtime)
+    controller = RobotArmController(headless=True, cap=source)
+    controller.log_callback = lambda message, level: None   # 不打印每条命令，避免影响计时
+    controller.ser = FakeSerial(response_delay)
+    probe = LatencyProbe(controller, source, first_command_only)
+    return controller, source, probe
+
+def run_dynamic(path, realtime, response_delay, args):
+    """动态喂食模式：回放整个录制文件"""
+    controller, source, probe = make_controller(path, realtime, response_delay)
+    finished = threading.Event()
+
+    def stop_at_end():
+        # 回放结束后结束动态模式
+        while not finished.is_set():
+            if source.get(cv2.CAP_PROP_POS_FRAMES) >= source.frame_count:
+                time.sleep(0.2)   # 让最后几帧的检测结果和命令完成
+                controller.is_feeding = False
+                return
+            time.sleep(0.01)
+
+    watcher = threading.Thread(target=stop_at_end, daemon=True)
+    watcher.start()
+    start = time.time()
+    try:
+        controller.dynamic_feeding_mode(target_hz=args.target_hz, predictive=not args.direct,
+                                        control_hz=args.control_hz, pipeline_workers=args.workers)
+    finally:
+        duration = time.time() - start
+        finished.set()
+        controller.cleanup()
+        source.release()
+    return summarize(probe, controller.ser, duration)
+
+def run_single(path, realtime, response_delay, args):
+    """单次喂食：重复 start_feeding，每次读取回放的下一帧"""
+    controller, source, probe = make_controller(path, realtime, response_delay, first_command_only=True)
+    start = time.time()
+    try:
+        for _ in range(args.single_runs):
+            if source.get(cv2.CAP_PROP_POS_FRAMES) >= source.frame_count:
+                break
+            controller.start_feeding()
+            controller.is_feeding = False   # 不复位舵机，下一次直接重新检测
+    finally:
+        duration = time.time() - start
+        controller.cleanup()
+        source.release()
+    return summarize(probe, controller.ser, duration)
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端延迟基准测试")
+    parser.add_argument("recording", help="录制文件（frame_record.py record 录制）")
+    parser.add_argument("--mode", nargs="+", default=["dynamic", "single"], choices=["dynamic", "single"],
+                        help="要测试的模式")
+    parser.add_argument("--fast", action="store_true", help="尽可能快地回放（默认按录制节奏回放）")
+    parser.add_argument("--target-hz", type=float, default=30, help="动态模式检测循环目标频率")
+    parser.add_argument("--control-hz", type=float, default=50, help="预测控制频率")
+    parser.add_argument("--direct", action="store_true", help="动态模式不使用预测控制，检测后直接发送命令")
+    parser.add_argument("--workers", type=int, default=0, help="多进程检测工作进程数（0 为单进程）")
+    parser.add_argument("--single-runs", type=int, default=5, help="单次喂食重复次数")
+    parser.add_argument("--serial-delay", type=float, default=0.002, help="假串口回复延迟（秒）")
+    parser.add_argument("--output", help="结果 JSON 文件，默认输出到终端")
+    args = parser.parse_args()
+
+    realtime = not args.fast
+    if args.fast:
+        args.target_hz = 1000.0   # 不限制循环频率
+
+    report = {
+        "revision": git_revision(),
+        "recording": args.recording,
+        "config": {
+            "realtime": realtime,
+            "target_hz": args.target_hz,
+            "control_hz": args.control_hz,
+            "predictive": not args.direct,
+            "workers": args.workers,
+            "serial_delay_s": args.serial_delay,
+        },
+    }
+    if "dynamic" in args.mode:
+        report["dynamic"] = run_dynamic(args.recording, realtime, args.serial_delay, args)
+    if "single" in args.mode:
+        report["single"] = run_single(args.recording, realtime, args.serial_delay, args)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"结果已保存到 {args.output}")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+推理分辨率基准测试
+在录制的图像帧上，对每个推理缩放比例测量单帧检测耗时，以及嘴部中心相对原始分辨率结果的误差，
+用于为不同设备选择合适的 config.ini [摄像头设置] 推理缩放
+用法: python bench_inference_scale.py <视频文件或图片目录> [--scales 1.0 0.75 0.5 0.35]
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from mouth_track import MouthDetector
+
+def load_frames(source, max_frames):
+    """从视频文件或图片目录读取最多 max_frames 帧"""
+    frames = []
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "*.png")) + glob.glob(os.path.join(source, "*.jpg")))
+        for path in paths[:max_frames]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+    cap = cv2.VideoCapture(source)
+    while len(frames) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def run_pass(frames, scale):
+    """
+    以给定缩放比例对所有帧做整帧检测
+    每次新建的检测器带有自己的FaceMesh，上一个缩放比例的跟踪状态不会带入本次测试
+    返回: (每帧耗时列表(ms), 每帧嘴部中心列表，未检测到为 None)
+    """
+    detector = MouthDetector(use_roi=False, inference_scale=scale)
+    latencies = []
+    centers = []
+    for frame in frames:
+        start = time.perf_counter()
+        mouth = detector.find_mouth(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+        centers.append(None if mouth is None else mouth[1])
+    return latencies, centers
+
+def main():
+    parser = argparse.ArgumentParser(description="推理分辨率基准测试")
+    parser.add_argument("source", help="录制的视频文件或图片目录")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.35],
+                        help="要测试的推理缩放比例")
+    parser.add_argument("--max-frames", type=int, default=300, help="最多使用的帧数")
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.max_frames)
+    if not frames:
+        print(f"无法从 {args.source} 读取图像")
+        return
+
+    img_h, img_w = frames[0].shape[:2]
+    print(f"帧数: {len(frames)}, 原始分辨率: {img_w}x{img_h}")
+
+    # 以原始分辨率的检测结果作为参考
+    _, reference = run_pass(frames, 1.0)
+
+    print(f"{'缩放':>6} {'推理分辨率':>10} {'平均ms':>8} {'P95 ms':>8} {'检出率':>7} {'平均误差px':>10} {'P95误差px':>9} {'最大误差px':>10}")
+    for scale in args.scales:
+        latencies, centers = run_pass(frames, scale)
+
+        errors = [np.hypot(c[0] - r[0], c[1] - r[1])
+                  for c, r in zip(centers, reference) if c is not None and r is not None]
+        detect_rate = sum(c is not None for c in centers) / len(centers)
+        size = f"{int(img_w * scale)}x{int(img_h * scale)}"
+
+        if errors:
+            error_text = f"{np.mean(errors):10.2f} {np.percentile(errors, 95):9.2f} {np.max(errors):10.2f}"
+        else:
+            error_text = f"{'-':>10} {'-':>9} {'-':>10}"
+        print(f"{scale:6.2f} {size:>10} {np.mean(latencies):8.2f} {np.percentile(latencies, 95):8.2f} "
+              f"{detect_rate:7.1%} {error_text}")
+
+if __name__ == "__main__":
+    main()
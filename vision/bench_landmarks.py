@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+嘴部关键点提取微基准测试
+对比逐点循环的旧实现与向量化提取 extract_mouth_points 的单次耗时
+用法: python bench_landmarks.py [--repeat 20000]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from mouth_track import MOUTH_LANDMARKS, extract_mouth_points
+
+def legacy_extract(face_landmarks, img_w, img_h):
+    """旧实现：逐点构造 (x, y) 元组 -> 列表 -> np.array -> 两次 np.mean"""
+    mouth_points = []
+    for idx in MOUTH_LANDMARKS:
+        pt = face_landmarks.landmark[idx]
+        x, y = int(pt.x * img_w), int(pt.y * img_h)
+        mouth_points.append((x, y))
+
+    mouth_points_array = np.array(mouth_points)
+    mouth_center_x = int(np.mean(mouth_points_array[:, 0]))
+    mouth_center_y = int(np.mean(mouth_points_array[:, 1]))
+    return mouth_points, (mouth_center_x, mouth_center_y)
+
+def make_landmarks(num_points=478, seed=0):
+    """生成与FaceMesh输出结构相同的随机关键点（refine_landmarks=True 时为478个点）"""
+    rng = np.random.default_rng(seed)
+    face_landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in rng.random((num_points, 3)):
+        face_landmarks.landmark.add(x=float(x), y=float(y), z=float(z))
+    return face_landmarks
+
+def main():
+    parser = argparse.ArgumentParser(description="嘴部关键点提取微基准测试")
+    parser.add_argument("--repeat", type=int, default=20000, help="每种实现的调用次数")
+    parser.add_argument("--width", type=int, default=640, help="图像宽度")
+    parser.add_argument("--height", type=int, default=480, help="图像高度")
+    args = parser.parse_args()
+
+    face_landmarks = make_landmarks()
+    img_w, img_h = args.width, args.height
+
+    legacy_time = timeit.timeit(lambda: legacy_extract(face_landmarks, img_w, img_h), number=args.repeat)
+    vector_time = timeit.timeit(lambda: extract_mouth_points(face_landmarks, img_w, img_h), number=args.repeat)
+
+    _, legacy_center = legacy_extract(face_landmarks, img_w, img_h)
+    _, vector_center, _ = extract_mouth_points(face_landmarks, img_w, img_h)
+
+    print(f"关键点数量: {len(MOUTH_LANDMARKS)}, 调用次数: {args.repeat}")
+    print(f"旧实现:   {legacy_time / args.repeat * 1e6:8.2f} us/次")
+    print(f"向量化:   {vector_time / args.repeat * 1e6:8.2f} us/次")
+    print(f"加速比:   {legacy_time / vector_time:8.2f}x")
+    print(f"中心点差异: 旧实现 {legacy_center}, 向量化 ({vector_center[0]:.2f}, {vector_center[1]:.2f})")
+
+if __name__ == "__main__":
+    main()
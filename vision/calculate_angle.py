@@ -1,19 +1,48 @@
 import serial
+import sys
 import time
 import cv2
 import mediapipe as mp
-import numpy as np
 import threading
-from mouth_track import get_mouth_data, detect_mouth_position
+from settings import load_camera_settings
+from mouth_filter import MouthKalmanFilter
+from camera_source import open_camera, read_frame
+from mouth_pipeline import MouthPipeline
+from visualizer import VisualizationSink
+from frame_record import FrameRecorder
+from face_tracker import MultiFaceMouthDetector, draw_face_tracks
+from mouth_track import (get_mouth_position, detect_mouth_in_frame, to_pixel,
+                         MouthDetector, MouthTracker, MotionGate, get_face_mesh, MOUTH_LANDMARKS)
 
 class RobotArmController:
-    def __init__(self, serial_port='COM5', baudrate=115200):
-        """初始化机器臂控制器"""
+    def __init__(self, serial_port='COM5', baudrate=115200, headless=False, preview_fps=15, cap=None,
+                 use_tracker=False):
+        """
+        初始化机器臂控制器
+        headless: 无界面模式，控制流程不显示任何画面
+        preview_fps: 预览画面的最大刷新帧率（预览在独立线程中绘制，不阻塞控制流程）
+        cap: 外部传入的已打开摄像头（例如 ReplaySource），为 None 时按配置打开；外部传入的不会在清理时释放
+        use_tracker: 启动后台 MouthTracker 持续检测，单次喂食直接读取其最新结果（get_mouth_position），
+                     不再临时采集一帧并推理（多人脸跟踪模式下不使用）
+        """
+        self.use_tracker = use_tracker
+        self.tracker = None
+        self.cap = cap
+        self._own_cap = cap is None
         self.serial_port = serial_port
         self.baudrate = baudrate
         self.ser = None
+        # 串口锁：预测控制线程与主线程/终端线程都会发送命令，同一时间只允许一个线程收发
+        self.serial_lock = threading.Lock()
         self.is_feeding = False
         self.log_callback = None  # 日志回调函数
+        self.headless = headless
+        self.preview_fps = preview_fps
+        self.visualizer = None
+        
+        # 无界面模式下动态喂食在后台线程中运行，终端仍可接收 stop 命令
+        self.dynamic_thread = None
+        self.dynamic_stop = threading.Event()
         
         # 舵机初始位置
         self.servo_init_positions = {
@@ -31,6 +60,11 @@ class RobotArmController:
             4: 0     # 舵机4
         
             }
+        
+        # 动态跟踪状态：最近发送的舵机1、2角度和跟踪画面尺寸
+        self.tracking_angles = {1: self.servo_init_positions[1], 2: self.servo_init_positions[2]}
+        self.tracking_frame_size = None
+        
           # 初始化嘴部检测
         self.init_mouth_detection()
     
@@ -43,20 +77,79 @@ class RobotArmController:
     
     def init_mouth_detection(self):
         """初始化嘴部检测模块"""
+        # 摄像头设置（config.ini 的 [摄像头设置] 段）
+        self.camera_settings = load_camera_settings()
+        
+        # 控制器摄像头画面专用的共享FaceMesh检测器（首次推理时才创建）；
+        # 跟踪状态属于这一路画面，其他视频流（如 MouthTracker）使用各自的实例
         self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
+        self.face_mesh = get_face_mesh(
+            stream="controller",
+            min_detection_confidence=self.camera_settings["detection_confidence"],
+            min_tracking_confidence=self.camera_settings["tracking_confidence"]
         )
         
         # 嘴部关键点索引
-        self.MOUTH_LANDMARKS = list(set([i for pair in self.mp_face_mesh.FACEMESH_LIPS for i in pair]))
+        self.MOUTH_LANDMARKS = MOUTH_LANDMARKS
+        
+        # 嘴部检测器：跟踪到人脸后只在人脸附近区域推理，跟丢时回退整帧；
+        # 推理缩放比例由配置决定，关键点仍按原始分辨率输出；嘴部附近画面静止时跳过推理
+        # 开启多人脸跟踪时锁定一个喂食对象，只检测该对象的嘴部
+        if self.camera_settings["multi_face"]:
+            self.mouth_detector = MultiFaceMouthDetector(select=self.camera_settings["target_select"],
+                                                         detect_interval=self.camera_settings["face_detect_interval"],
+                                                         inference_scale=self.camera_settings["inference_scale"],
+                                                         motion_gate=MotionGate(),
+                                                         face_mesh=self.face_mesh)
+        else:
+            self.mouth_detector = MouthDetector(use_roi=True,
+                                                inference_scale=self.camera_settings["inference_scale"],
+                                                motion_gate=MotionGate(),
+                                                face_mesh=self.face_mesh)
+        
+        # 嘴部位置预测滤波器：动态模式下舵机按预测位置控制
+        self.mouth_filter = MouthKalmanFilter()
+        
+        # 摄像头（共享的最新帧摄像头源，读取时总是拿到最新一帧）；配置了回放文件时改用录制的画面
+        if not self._own_cap:
+            pass
+        elif self.camera_settings["replay_file"]:
+            print(f"使用录制文件代替摄像头: {self.camera_settings['replay_file']}")
+            self.cap = open_camera(self.camera_settings["replay_file"],
+                                   realtime=self.camera_settings["replay_realtime"])
+        else:
+            self.cap = open_camera(self.camera_settings["device_id"])
         
-        # 摄像头
-        self.cap = cv2.VideoCapture(1)
+        # 后台嘴部跟踪器：与控制器共用摄像头，使用自己的检测器和FaceMesh（跟踪状态属于它自己的画面序列）
+        if self.use_tracker and self.camera_settings["multi_face"]:
+            print("多人脸跟踪模式下喂食对象由控制器锁定，不使用后台跟踪器")
+        elif self.use_tracker:
+            tracker_face_mesh = get_face_mesh(stream="tracker", **{key: self.face_mesh.options[key] for key in
+                                              ("min_detection_confidence", "min_tracking_confidence")})
+            self.tracker = MouthTracker(cap=self.cap,
+                                        detector=MouthDetector(inference_scale=self.camera_settings["inference_scale"],
+                                                               motion_gate=MotionGate(),
+                                                               face_mesh=tracker_face_mesh))
+            if not self.tracker.start():
+                self.tracker = None
+    
+    def show_frame(self, window, frame, overlay=None, hold=0.0):
+        """
+        把画面交给可视化线程显示，立即返回；无界面模式下不做任何事
+        overlay: 绘制叠加信息的函数，只在画面真正显示时于可视化线程中调用
+        hold: 大于0时窗口显示 hold 秒后自动关闭
+        """
+        if self.headless:
+            return
+        if self.visualizer is None:
+            self.visualizer = VisualizationSink(max_fps=self.preview_fps)
+            self.visualizer.start()
+        self.visualizer.submit(window, frame, overlay, hold)
+    
+    def close_window(self, window):
+        """关闭可视化窗口"""
+        if self.visualizer is not None:
+            self.visualizer.close_window(window)
     
     def connect_serial(self):
         """连接串口"""
@@ -70,26 +163,27 @@ class RobotArmController:
             return False
     
     def send_servo_command(self, servo_id, angle):
-        """发送舵机控制命令"""
+        """发送舵机控制命令（可在多个线程中调用，命令和响应的收发由串口锁串行化）"""
         if not self.ser or not self.ser.is_open:
             self.log("串口未连接", "WARNING")
             return False
             
         try:
-            cmd = f"set_servo_angle {servo_id} {angle}\r\n"
-            self.ser.write(cmd.encode('utf-8'))
-            self.log(f"发送命令: 舵机{servo_id} -> {angle}度")
-            
-            # 读取响应
-            response = ""
-            start_time = time.time()
-            while time.time() - start_time < 1:
-                if self.ser.in_waiting > 0:
-                    line = self.ser.readline().decode('utf-8', errors='replace').strip()
-                    if line:
-                        response += line + "\n"
-                        if "degrees" in line:
-                            break
+            with self.serial_lock:
+                cmd = f"set_servo_angle {servo_id} {angle}\r\n"
+                self.ser.write(cmd.encode('utf-8'))
+                self.log(f"发送命令: 舵机{servo_id} -> {angle}度")
+                
+                # 读取响应
+                response = ""
+                start_time = time.time()
+                while time.time() - start_time < 1:
+                    if self.ser.in_waiting > 0:
+                        line = self.ser.readline().decode('utf-8', errors='replace').strip()
+                        if line:
+                            response += line + "\n"
+                            if "degrees" in line:
+                                break
             
             if response:
                 self.log(f"舵机响应: {response.strip()}")
@@ -144,52 +238,69 @@ class RobotArmController:
         return servo1_angle, servo2_angle
     
     def detect_mouth_single_frame(self):
-        """截取一帧检测嘴部并返回位置信息"""
+        """截取一帧检测嘴部并返回位置信息（后台跟踪器在运行时直接读取其最新结果）"""
+        if self.tracker is not None and self.tracker.is_running():
+            return self.detect_mouth_from_tracker()
+        
         if not self.cap.isOpened():
             print("摄像头未打开")
-            return False, None, None, 0, 0
+            return False, None, None, 0, 0, 0, 0
+        
+        # 只读取一帧，检测与显示都基于这一帧
+        success, frame = self.cap.read()
+        if not success:
+            print("读取视频帧失败")
+            return False, None, None, 0, 0, 0, 0
         
-        # 使用mouth_track模块的检测函数
-        is_detected, mouth_center, image_center, offset_x, offset_y = detect_mouth_position(self.cap)
+        is_detected, mouth_center, image_center, offset_x, offset_y = detect_mouth_in_frame(frame, self.mouth_detector)
+        return self.report_single_detection(frame, is_detected, mouth_center, image_center, offset_x, offset_y)
+    
+    def detect_mouth_from_tracker(self):
+        """读取后台跟踪器已发布的最新检测结果，不采集新帧、不推理"""
+        is_detected, mouth_center, image_center, offset_x, offset_y = get_mouth_position()
+        frame, _ = self.tracker.get_latest()    # 显示用，可能比检测结果晚一帧
+        if image_center is None or frame is None:
+            print("跟踪器尚未处理任何帧")
+            return False, None, None, 0, 0, 0, 0
+        return self.report_single_detection(frame, is_detected, mouth_center, image_center, offset_x, offset_y)
+    
+    def report_single_detection(self, frame, is_detected, mouth_center, image_center, offset_x, offset_y):
+        """输出并显示单次检测结果，返回 detect_mouth_single_frame 的结果"""
+        img_h, img_w = frame.shape[:2]
         if is_detected:
             self.log(f"检测到嘴部:")
-            self.log(f"  嘴部中心: {mouth_center}")
+            self.log(f"  嘴部中心: ({mouth_center[0]:.1f}, {mouth_center[1]:.1f})")
             self.log(f"  图像中心: {image_center}")
-            self.log(f"  水平偏移: {offset_x} ({'右' if offset_x > 0 else '左' if offset_x < 0 else '居中'})")
-            self.log(f"  垂直偏移: {offset_y} ({'下' if offset_y > 0 else '上' if offset_y < 0 else '居中'})")
+            self.log(f"  水平偏移: {offset_x:.1f} ({'右' if offset_x > 0 else '左' if offset_x < 0 else '居中'})")
+            self.log(f"  垂直偏移: {offset_y:.1f} ({'下' if offset_y > 0 else '上' if offset_y < 0 else '居中'})")
             
-            # 获取图像尺寸用于角度计算
-            success, frame = self.cap.read()
-            if success:
-                img_h, img_w = frame.shape[:2]
-                
-                # 显示检测结果
-                cv2.circle(frame, mouth_center, 5, (0, 0, 255), -1)  # 嘴部中心
+            # 显示检测结果（在可视化线程中绘制，不阻塞喂食流程）
+            def overlay(frame):
+                mouth_pixel = to_pixel(mouth_center)  # 亚像素坐标仅在绘图时取整
+                cv2.circle(frame, mouth_pixel, 5, (0, 0, 255), -1)  # 嘴部中心
                 cv2.circle(frame, image_center, 5, (255, 0, 0), -1)  # 图像中心
-                cv2.line(frame, image_center, mouth_center, (0, 255, 0), 2)  # 连线
+                cv2.line(frame, image_center, mouth_pixel, (0, 255, 0), 2)  # 连线
                 
-                cv2.putText(frame, f"Mouth: {mouth_center}", 
+                cv2.putText(frame, f"Mouth: {mouth_pixel}", 
                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                 cv2.putText(frame, f"Center: {image_center}", 
                            (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-                cv2.putText(frame, f"Offset: ({offset_x}, {offset_y})", 
+                cv2.putText(frame, f"Offset: ({offset_x:.1f}, {offset_y:.1f})", 
                            (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                
-                cv2.imshow('Mouth Detection', frame)
-                cv2.waitKey(2000)  # 显示2秒
-                cv2.destroyAllWindows()
-                
-                return True, mouth_center, image_center, offset_x, offset_y, img_w, img_h
+                return frame
+            
+            self.show_frame('Mouth Detection', frame, overlay, hold=2.0)  # 显示2秒
+            
+            return True, mouth_center, image_center, offset_x, offset_y, img_w, img_h
         else:
             print("未检测到嘴部")
             # 显示未检测到的帧
-            success, frame = self.cap.read()
-            if success:
+            def overlay(frame):
                 cv2.putText(frame, "No mouth detected", 
                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                cv2.imshow('Mouth Detection', frame)
-                cv2.waitKey(1000)
-                cv2.destroyAllWindows()
+                return frame
+            
+            self.show_frame('Mouth Detection', frame, overlay, hold=1.0)
         
         return False, None, None, 0, 0, 0, 0
     
@@ -257,18 +368,154 @@ class RobotArmController:
         
         print("机器臂已复位到初始状态")
     
-    def dynamic_feeding_mode(self):
-        """动态喂食模式：实时根据嘴部位置调整舵机"""
+    def update_tracking_servos(self, servo1_angle, servo2_angle):
+        """跟踪时更新舵机1、2，只有角度变化超过阈值才发送命令，避免频繁调整"""
+        if abs(servo1_angle - self.tracking_angles[1]) >= 2:
+            self.send_servo_command(1, servo1_angle)
+            self.tracking_angles[1] = servo1_angle
+        
+        if abs(servo2_angle - self.tracking_angles[2]) >= 2:
+            self.send_servo_command(2, servo2_angle)
+            self.tracking_angles[2] = servo2_angle
+    
+    def predictive_control_loop(self, stop_event, control_hz, command_latency):
+        """
+        预测控制循环（在独立线程中运行）：按固定频率读取滤波器对
+        “当前时刻 + 指令延迟”的预测位置并控制舵机，与检测频率无关
+        """
+        period = 1.0 / control_hz
+        while not stop_event.is_set():
+            loop_start = time.time()
+            frame_size = self.tracking_frame_size
+            last_update = self.mouth_filter.last_update_time
+            
+            # 跟丢时间超过最长外推时间后保持舵机不动
+            if (frame_size is not None and last_update is not None
+                    and loop_start - last_update <= self.mouth_filter.max_horizon):
+                predicted = self.mouth_filter.predict(loop_start + command_latency)
+                img_w, img_h = frame_size
+                offset_x = predicted[0] - img_w // 2
+                offset_y = predicted[1] - img_h // 2
+                self.update_tracking_servos(*self.calculate_servo_angles(offset_x, offset_y, img_w, img_h))
+            
+            stop_event.wait(max(0.0, period - (time.time() - loop_start)))
+    
+    def handle_tracking_detection(self, is_detected, mouth_center, capture_time, frame_size, predictive):
+        """
+        动态模式下处理一次检测结果
+        predictive 为 True 时只更新预测滤波器（舵机由预测控制线程驱动），否则直接按检测位置控制舵机
+        """
+        self.tracking_frame_size = frame_size
+        if not is_detected:
+            return
+        
+        if predictive:
+            self.mouth_filter.update(mouth_center, capture_time)
+        else:
+            img_w, img_h = frame_size
+            offset_x = mouth_center[0] - img_w // 2
+            offset_y = mouth_center[1] - img_h // 2
+            self.update_tracking_servos(*self.calculate_servo_angles(offset_x, offset_y, img_w, img_h))
+    
+    def handle_pipeline_result(self, result, predictive=True, recorder=None):
+        """处理多进程流水线返回的一条检测结果（在流水线接收线程中调用）"""
+        self.handle_tracking_detection(result["is_detected"], result["center"], result["timestamp"],
+                                       result["image_size"], predictive)
+        if recorder is not None:
+            recorder.record_result(result["seq"], result["is_detected"], result["center"], result["bbox"])
+    
+    def switch_target(self, track_id=None):
+        """
+        切换喂食对象（多人脸跟踪模式）
+        track_id: 人脸跟踪ID，为 None 时切换到下一个人
+        """
+        if not isinstance(self.mouth_detector, MultiFaceMouthDetector):
+            print("未开启多人脸跟踪（config.ini [摄像头设置] 多人脸跟踪）")
+            return False
+        if self.mouth_detector.lock_target(track_id):
+            print(f"喂食对象已切换为 ID {self.mouth_detector.target_id}")
+            return True
+        ids = sorted(track.track_id for track in self.mouth_detector.tracks)
+        print(f"没有可切换的人脸，当前跟踪的ID: {ids}")
+        return False
+    
+    def face_track_snapshot(self):
+        """当前人脸跟踪的快照 ([(track_id, box), ...], target_id)，用于在可视化线程中绘制"""
+        if not isinstance(self.mouth_detector, MultiFaceMouthDetector):
+            return None
+        tracks = [(track.track_id, track.box) for track in self.mouth_detector.tracks if track.missed == 0]
+        return tracks, self.mouth_detector.target_id
+    
+    def draw_tracking_overlay(self, frame, is_detected, mouth_center, predicted=None, faces=None):
+        """在动态模式画面上绘制嘴部中心、偏移和舵机角度；faces 为 face_track_snapshot() 的结果"""
+        img_h, img_w = frame.shape[:2]
+        if faces is not None:
+            draw_face_tracks(frame, *faces)
+        image_center = (img_w // 2, img_h // 2)
+        
+        if is_detected:
+            offset_x = mouth_center[0] - image_center[0]
+            offset_y = mouth_center[1] - image_center[1]
+            
+            if predicted is not None:
+                cv2.circle(frame, to_pixel(predicted), 5, (0, 255, 255), -1)  # 预测位置
+            
+            mouth_pixel = to_pixel(mouth_center)  # 亚像素坐标仅在绘图时取整
+            cv2.circle(frame, mouth_pixel, 5, (0, 0, 255), -1)  # 嘴部中心
+            cv2.circle(frame, image_center, 5, (255, 0, 0), -1)  # 图像中心
+            cv2.line(frame, image_center, mouth_pixel, (0, 255, 0), 2)  # 连线
+            
+            cv2.putText(frame, f"Mouth: {mouth_pixel}", 
+                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            cv2.putText(frame, f"Offset: ({offset_x:.1f}, {offset_y:.1f})", 
+                       (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            cv2.putText(frame, f"Servo1: {self.tracking_angles[1]}, Servo2: {self.tracking_angles[2]}", 
+                       (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+        else:
+            cv2.putText(frame, "No mouth detected", 
+                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        
+        cv2.putText(frame, "Press 'q' to exit", 
+                   (10, img_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        return frame
+    
+    def dynamic_feeding_mode(self, target_hz=30, predictive=True, control_hz=50, command_latency=0.05,
+                             pipeline_workers=None, max_read_failures=50):
+        """
+        动态喂食模式：实时根据嘴部位置调整舵机
+        每次循环只采集一帧，检测和显示都基于这一帧
+        target_hz: 检测循环的目标频率（次/秒），循环耗时不足一个周期时才等待
+        predictive: 为 True 时检测结果送入预测滤波器，舵机由独立线程按 control_hz 根据预测位置控制；
+                    为 False 时每帧检测后直接根据检测位置控制
+        control_hz: 预测控制循环频率（次/秒）
+        command_latency: 从采集到舵机动作的估计延迟（秒），控制时预测该延迟之后的嘴部位置
+        pipeline_workers: 大于0时使用多进程流水线，嘴部检测在这么多个独立进程中运行，
+                          本线程只负责采集和显示；为 None 时使用配置文件的检测进程数
+        max_read_failures: 连续读取失败这么多次（摄像头断开、回放文件结束）时退出动态模式
+        """
         print("进入动态喂食模式...")
-        print("按 'q' 键退出动态模式")
+        if self.headless:
+            print("无界面模式，使用 stop 命令退出动态模式")
+        else:
+            print("按 'q' 键退出动态模式")
         
         if not self.cap.isOpened():
             print("摄像头未打开")
             return
         
+        if pipeline_workers is None:
+            pipeline_workers = self.camera_settings["pipeline_workers"]
+        
+        # 动态模式自己读取摄像头，后台跟踪器暂停（两个线程不能同时读同一个摄像头），退出后恢复
+        resume_tracker = self.tracker is not None and self.tracker.is_running()
+        if resume_tracker:
+            self.tracker.stop()
+        
         self.is_feeding = True
-        last_servo1_angle = self.servo_init_positions[1]
-        last_servo2_angle = self.servo_init_positions[2]
+        loop_period = 1.0 / target_hz
+        self.tracking_angles = {1: self.servo_init_positions[1], 2: self.servo_init_positions[2]}
+        self.tracking_frame_size = None
+        self.mouth_filter.reset()
         
         # 设置舵机3为喂食位置，舵机4为0度
         self.send_servo_command(3, self.servo_init_positions[3])
@@ -276,66 +523,132 @@ class RobotArmController:
         self.send_servo_command(4, 0)
         time.sleep(0.5)
         
+        control_stop = threading.Event()
+        control_thread = None
+        if predictive:
+            control_thread = threading.Thread(target=self.predictive_control_loop,
+                                              args=(control_stop, control_hz, command_latency),
+                                              daemon=True)
+            control_thread.start()
+        
+        # 配置了录制文件时录制每一帧及其检测结果，用于离线复现
+        recorder = None
+        if self.camera_settings["record_file"]:
+            recorder = FrameRecorder(self.camera_settings["record_file"])
+            print(f"录制画面到: {self.camera_settings['record_file']}")
+        
+        pipeline = None
+        read_failures = 0
+        if self.visualizer is not None:
+            self.visualizer.quit_requested.clear()
         try:
-            while True:
-                success, frame = self.cap.read()
+            # stop_feeding 会清除 is_feeding，stop_dynamic_mode 会设置 dynamic_stop，都会结束循环
+            while self.is_feeding and not self.dynamic_stop.is_set():
+                loop_start = time.time()
+                success, frame, capture_time = read_frame(self.cap)
                 if not success:
+                    read_failures += 1
+                    if not self.cap.isOpened() or read_failures >= max_read_failures:
+                        print("读取视频帧失败，摄像头已断开或回放已结束")
+                        break
+                    time.sleep(0.02)  # 短暂等待后重试，避免空转占满CPU
                     continue
+                read_failures = 0
                 
                 img_h, img_w = frame.shape[:2]
-                image_center = (img_w // 2, img_h // 2)
-                
-                # 检测嘴部位置
-                is_detected, mouth_center, _, offset_x, offset_y = detect_mouth_position(self.cap)
                 
-                if is_detected:
-                    # 计算新的舵机角度
-                    servo1_angle, servo2_angle = self.calculate_servo_angles(offset_x, offset_y, img_w, img_h)
-                    
-                    # 只有角度变化超过阈值才发送命令，避免频繁调整
-                    if abs(servo1_angle - last_servo1_angle) >= 2:
-                        self.send_servo_command(1, servo1_angle)
-                        last_servo1_angle = servo1_angle
-                    
-                    if abs(servo2_angle - last_servo2_angle) >= 2:
-                        self.send_servo_command(2, servo2_angle)
-                        last_servo2_angle = servo2_angle
+                if pipeline_workers > 0:
+                    if pipeline is None:
+                        # 检测结果在流水线接收线程中直接送往控制逻辑
+                        pipeline = MouthPipeline(
+                            workers=pipeline_workers, frame_shape=frame.shape,
+                            detector_options={
+                                "use_roi": pipeline_workers == 1,
+                                "motion_gate": pipeline_workers == 1,
+                                "inference_scale": self.camera_settings["inference_scale"],
+                                "face_mesh_options": self.face_mesh.options,
+                                "multi_face": self.camera_settings["multi_face"],
+                                "target_select": self.camera_settings["target_select"],
+                                "face_detect_interval": self.camera_settings["face_detect_interval"],
+                            },
+                            on_result=lambda result: self.handle_pipeline_result(result, predictive, recorder))
+                        pipeline.start()
+                    pipeline.feed(frame, capture_time)
+                    if recorder is not None:
+                        # 流水线的帧序号与录制序号一致，检测结果到达后再补记
+                        recorder.write(frame, capture_time)
                     
-                    # 显示信息
-                    cv2.circle(frame, mouth_center, 5, (0, 0, 255), -1)  # 嘴部中心
-                    cv2.circle(frame, image_center, 5, (255, 0, 0), -1)  # 图像中心
-                    cv2.line(frame, image_center, mouth_center, (0, 255, 0), 2)  # 连线
-                    
-                    cv2.putText(frame, f"Mouth: {mouth_center}", 
-                               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                    cv2.putText(frame, f"Offset: ({offset_x}, {offset_y})", 
-                               (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                    cv2.putText(frame, f"Servo1: {servo1_angle}, Servo2: {servo2_angle}", 
-                               (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-                    cv2.putText(frame, "Press 'q' to exit", 
-                               (10, img_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                    # 显示最新结果所对应的那一帧（已被覆盖时退回当前帧）
+                    result = pipeline.latest_result()
+                    is_detected = result is not None and result["is_detected"]
+                    mouth_center = result["center"] if is_detected else None
+                    if result is not None:
+                        analysed = pipeline.get_frame(result)
+                        if analysed is not None:
+                            frame = analysed
                 else:
-                    cv2.putText(frame, "No mouth detected", 
-                               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                    cv2.putText(frame, "Press 'q' to exit", 
-                               (10, img_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                
-                cv2.imshow('Dynamic Feeding Mode', frame)
+                    # 在刚采集的这一帧上检测嘴部位置
+                    is_detected, mouth_center, _, _, _ = detect_mouth_in_frame(frame, self.mouth_detector)
+                    self.handle_tracking_detection(is_detected, mouth_center, capture_time, (img_w, img_h), predictive)
+                    if recorder is not None:
+                        recorder.write(frame, capture_time, (is_detected, mouth_center, None))
                 
-                # 检查退出键
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    break
+                if not self.headless:
+                    predicted = None
+                    if predictive and is_detected:
+                        predicted = self.mouth_filter.predict(time.time() + command_latency)
+                    faces = self.face_track_snapshot() if pipeline is None else None
+                    self.show_frame('Dynamic Feeding Mode', frame,
+                                    lambda f, d=is_detected, c=mouth_center, p=predicted, s=faces:
+                                    self.draw_tracking_overlay(f, d, c, p, s))
                     
-                time.sleep(0.1)  # 控制帧率
+                    # 在预览窗口中按下 'q' 键时退出
+                    if self.visualizer.quit_requested.is_set():
+                        break
+                
+                # 按目标频率控制循环节奏（采集和推理已占用的时间不再额外等待）
+                remaining = loop_period - (time.time() - loop_start)
+                if remaining > 0:
+                    time.sleep(remaining)
         
         except KeyboardInterrupt:
             print("动态模式被中断")
         finally:
-            cv2.destroyAllWindows()
+            if pipeline is not None:
+                pipeline.stop()
+            if recorder is not None:
+                recorder.close()
+                print(f"已录制 {recorder.frame_count} 帧")
+            control_stop.set()
+            if control_thread is not None:
+                control_thread.join()
+            self.close_window('Dynamic Feeding Mode')
             self.is_feeding = False
+            if resume_tracker:
+                self.tracker.start()
+            gate = self.mouth_detector.motion_gate
+            if pipeline is None and gate is not None:
+                self.log(f"检测跳过比例: {gate.skip_ratio:.1%} ({gate.skipped_frames}/{gate.total_frames})")
             print("退出动态喂食模式")
     
+    def start_dynamic_mode(self, **options):
+        """在后台线程中运行动态喂食模式（无界面模式使用），立即返回"""
+        if self.dynamic_thread is not None and self.dynamic_thread.is_alive():
+            print("动态喂食模式已在运行")
+            return
+        self.dynamic_stop.clear()
+        self.dynamic_thread = threading.Thread(target=self.dynamic_feeding_mode, kwargs=options,
+                                               name="DynamicFeeding", daemon=True)
+        self.dynamic_thread.start()
+    
+    def stop_dynamic_mode(self):
+        """结束后台线程中的动态喂食模式，等待其退出（之后不会再有跟踪命令发往舵机）"""
+        if self.dynamic_thread is None:
+            return
+        self.dynamic_stop.set()
+        self.dynamic_thread.join()
+        self.dynamic_thread = None
+    
     def run_terminal(self):
         """运行终端控制界面"""
         print("="*50)
@@ -346,7 +659,8 @@ class RobotArmController:
         print("2. dynamic - 动态喂食模式（实时跟踪）")
         print("3. stop    - 停止喂食")
         print("4. init    - 重新初始化舵机")
-        print("5. exit    - 退出程序")
+        print("5. target  - 切换喂食对象（多人脸跟踪，可指定ID：target 2）")
+        print("6. exit    - 退出程序")
         print("="*50)
         
         # 连接串口
@@ -363,20 +677,28 @@ class RobotArmController:
         while True:
             try:
                 command = input("\n请输入命令: ").strip().lower()
+                command, _, argument = command.partition(" ")
                 
                 if command == "start":
                     self.start_feeding()
                 elif command == "dynamic":
-                    self.dynamic_feeding_mode()
+                    if self.headless:
+                        # 无界面模式没有预览窗口可以按 'q'，在后台运行，由 stop 命令结束
+                        self.start_dynamic_mode()
+                    else:
+                        self.dynamic_feeding_mode()
                 elif command == "stop":
+                    self.stop_dynamic_mode()
                     self.stop_feeding()
                 elif command == "init":
                     self.initialize_servos()
+                elif command == "target":
+                    self.switch_target(int(argument) if argument.strip().isdigit() else None)
                 elif command == "exit":
                     print("正在退出程序...")
                     break
                 else:
-                    print("无效命令，请输入: start, dynamic, stop, init, 或 exit")
+                    print("无效命令，请输入: start, dynamic, stop, init, target, 或 exit")
                     
             except KeyboardInterrupt:
                 print("\n程序被用户中断")
@@ -392,11 +714,15 @@ class RobotArmController:
         print("正在清理资源...")
         
         # 停止喂食并复位
+        self.stop_dynamic_mode()
+        if self.tracker is not None:
+            self.tracker.stop()
+            self.tracker = None
         if self.is_feeding:
             self.stop_feeding()
         
         # 关闭摄像头
-        if hasattr(self, 'cap') and self.cap.isOpened():
+        if self._own_cap and self.cap is not None:
             self.cap.release()
         
         # 关闭串口
@@ -404,14 +730,21 @@ class RobotArmController:
             self.ser.close()
             print("串口已关闭")
         
-        # 关闭所有OpenCV窗口
-        cv2.destroyAllWindows()
+        # 停止可视化线程并关闭所有窗口
+        if self.visualizer is not None:
+            self.visualizer.stop()
+            self.visualizer = None
         print("资源清理完成")
 
 def main():
     """主函数"""
+    # 无界面模式：python calculate_angle.py --headless
+    headless = "--headless" in sys.argv[1:]
+    # 后台跟踪：python calculate_angle.py --tracker，单次喂食读取后台跟踪器的最新结果
+    use_tracker = "--tracker" in sys.argv[1:]
+    
     # 创建机器臂控制器实例
-    controller = RobotArmController(serial_port='COM5', baudrate=115200)
+    controller = RobotArmController(serial_port='COM5', baudrate=115200, headless=headless, use_tracker=use_tracker)
     
     # 运行终端界面
     controller.run_terminal()
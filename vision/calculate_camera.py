@@ -1,11 +1,115 @@
 import cv2
 
-import matplotlib.pyplot as plt # plt 用于显示图片
-import matplotlib.image as mpimg # mpimg 用于读取图片
 import os
-import sys
 import numpy as np
 import glob
+import hashlib
+import json
+import multiprocessing as mp
+import tempfile
+
+# 角点缓存目录（与本模块同目录），每幅图像的亚像素角点按“图像内容 + 棋盘格尺寸”的哈希值保存
+CORNER_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corner_cache")
+
+# 标定结果文件（与本模块同目录）
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration_result.json")
+
+# 缓存格式版本，角点检测方式改变时加一使旧缓存失效
+_CORNER_CACHE_VERSION = 1
+
+#设置角点查找限制
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,30,0.001)
+
+def corner_key(data, pattern_size):
+    """图像文件内容和棋盘格尺寸的哈希值，作为角点缓存的键"""
+    digest = hashlib.sha1()
+    digest.update(f"v{_CORNER_CACHE_VERSION}:{pattern_size[0]}x{pattern_size[1]}".encode("ascii"))
+    digest.update(data)
+    return digest.hexdigest()[:20]
+
+def find_corners(path, pattern_size):
+    """
+    读取一幅标定图，查找棋盘格角点并做亚像素精确化
+    返回: (是否找到, 角点 (N,1,2) float32 或 None, 图像尺寸 (宽, 高))
+    """
+    image = cv2.imread(path)
+    gray = cv2.cvtColor(image,cv2.COLOR_RGB2GRAY)
+    #查找角点
+    ok,corners = cv2.findChessboardCorners(gray,pattern_size,None)
+    if not ok:
+        return False, None, gray.shape[::-1]
+    #获取更精确的角点位置
+    exact_corners = cv2.cornerSubPix(gray,corners,(11,11),(-1,-1),SUBPIX_CRITERIA)
+    return True, exact_corners, gray.shape[::-1]
+
+def _find_corners_task(task):
+    """进程池任务：(缓存键, 图像路径, 棋盘格尺寸) -> (缓存键, 检测结果)"""
+    key, path, pattern_size = task
+    return key, find_corners(path, pattern_size)
+
+def _load_corners(path):
+    """读取一条角点缓存，不存在或不完整时返回 None"""
+    try:
+        with np.load(path) as data:
+            corners = data["corners"] if bool(data["ok"]) else None
+            return bool(data["ok"]), corners, tuple(int(v) for v in data["size"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _save_corners(path, result):
+    """写入一条角点缓存：先写临时文件再改名，避免其他进程读到不完整的文件"""
+    ok, corners, size = result
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, ok=ok, corners=corners if ok else np.zeros((0, 1, 2), np.float32),
+                     size=np.array(size, dtype=np.int32))
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def detect_corners(paths, pattern_size, workers=None, cache_dir=CORNER_CACHE_DIR):
+    """
+    检测多幅标定图的棋盘格角点：已缓存的直接读取，其余由进程池并行检测后写入缓存
+    （检测失败的结果也会缓存，增删少量图片后重新标定只需检测新增的图片）
+    paths: 图像路径列表
+    pattern_size: 棋盘格内角点数 (x方向, y方向)
+    workers: 进程数，为 None 时使用 CPU 核数
+    cache_dir: 缓存目录，为 None 时不读写缓存
+    返回: 与 paths 对应的 [(是否找到, 角点, 图像尺寸)]
+    """
+    pattern_size = tuple(pattern_size)
+    keys = []
+    results = {}
+    tasks = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            key = corner_key(f.read(), pattern_size)
+        keys.append(key)
+        if key in results or key in tasks:
+            continue
+        cached = _load_corners(os.path.join(cache_dir, key + ".npz")) if cache_dir is not None else None
+        if cached is not None:
+            results[key] = cached
+        else:
+            tasks[key] = (key, path, pattern_size)
+    tasks = list(tasks.values())
+
+    print(f"角点检测: {len(paths)} 幅图像，需要检测 {len(tasks)} 幅，其余使用缓存")
+    if len(tasks) > 1 and (workers is None or workers > 1):
+        with mp.Pool(min(workers or os.cpu_count() or 1, len(tasks))) as pool:
+            detected = pool.map(_find_corners_task, tasks)
+    else:
+        detected = [_find_corners_task(task) for task in tasks]
+
+    for key, result in detected:
+        results[key] = result
+        if cache_dir is not None:
+            _save_corners(os.path.join(cache_dir, key + ".npz"), result)
+    return [results[key] for key in keys]
+
 class shuangmu:
     def __init__(self):
         self.m1 = 0
@@ -26,8 +130,31 @@ class StereoCalibration(object):
         filepath = glob.glob(cal_path + '/*.png')
         filepath.sort()
         return filepath
+
+    def pair_images(self):
+        """按文件名编号配对左右图像（left_XX.png 与 right_XX.png），返回 [(编号, 左图路径, 右图路径)]"""
+        right = {os.path.basename(path).lower().replace("right", "", 1): path for path in self.imagesR}
+        pairs = []
+        for path in self.imagesL:
+            name = os.path.basename(path).lower().replace("left", "", 1)
+            if name in right:
+                pairs.append((os.path.splitext(name)[0].strip("_"), path, right[name]))
+            else:
+                print(f"{path}: 没有对应的右图，不参与标定")
+        return pairs
+
     #标定图像
-    def calibration_photo(self):
+    def calibration_photo(self, incremental=False, max_error=0.5, reject_ratio=2.0, min_views=10,
+                          result_path=CALIBRATION_PATH, workers=None):
+        """
+        用所有成对的标定图做双目标定
+        incremental: 在 result_path 中已有的标定结果上只加入新的图像对，以已有结果为初值重新求解；
+                     之前剔除的图像对与新图像对一起按新的结果重新检验
+        max_error, reject_ratio, min_views: 剔除误差最大的视图，直到最大的单视图重投影误差（像素）
+                                          不超过 max_error 和 reject_ratio 倍中位数中的较大者，或只剩 min_views 个视图
+        result_path: 标定结果文件，为 None 时不读写
+        workers: 角点检测的进程数
+        """
         #设置要标定的角点个数
         x_nums = 6                                                   #x方向上的角点个数
         y_nums = 6
@@ -36,70 +163,132 @@ class StereoCalibration(object):
         world_point[:,:2] = np.mgrid[:x_nums,:y_nums].T.reshape(-1, 2)    #mgrid[]生成包含两个二维矩阵的矩阵，每个矩阵都有x_nums列,y_nums行
                                                                             #.T矩阵的转置
                                                                             #reshape()重新规划矩阵，但不改变矩阵元素
-        #保存角点坐标
-        world_position = []
-        image_positionl = []
-        image_positionr = []
-        #设置角点查找限制
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,30,0.001)
-        #获取所有标定图
-        for ii in range(20):
-
-            image_path_l = self.imagesL[ii]
-            image_path_r = self.imagesR[ii]
-
-            image_l = cv2.imread(image_path_l)
-            image_r = cv2.imread(image_path_r)
-            gray_l = cv2.cvtColor(image_l,cv2.COLOR_RGB2GRAY)
-            gray_r = cv2.cvtColor(image_r,cv2.COLOR_RGB2GRAY)
-
-            #查找角点
-    #         ok,corners = cv2.findChessboardCorners(gray,(x_nums,y_nums),None)
-            ok1,cornersl = cv2.findChessboardCorners(gray_l,(x_nums,y_nums),None)
-            
-            
-            ok2,cornersr = cv2.findChessboardCorners(gray_r,(x_nums,y_nums),None)
-#            ok1,cornersl = cv2.findCirclesGrid(gray_l,(x_nums,y_nums),None)
-#            ok2,cornersr = cv2.findCirclesGrid(gray_r,(x_nums,y_nums),None)
-            print(f"Left Image - Corners Detected: {ok1}, Right Image - Corners Detected: {ok2}")
-            self.world = world_point
-            print(ok1&ok2)
-            if ok1&ok2:
-                #把每一幅图像的世界坐标放到world_position中
-                center_spacing = 30     ## 圆心的位置距离，这一个其实不重要
-                world_position.append(world_point*center_spacing)
-                #获取更精确的角点位置
-                exact_cornersl = cv2.cornerSubPix(gray_l,cornersl,(11,11),(-1,-1),criteria)
-                exact_cornersr = cv2.cornerSubPix(gray_r,cornersr,(11,11),(-1,-1),criteria)
-                #把获取的角点坐标放到image_position中
-                image_positionl.append(exact_cornersl)
-                image_positionr.append(exact_cornersr)
-                #可视化角点
-    #             image = cv2.drawChessboardCorners(image,(x_nums,y_nums),exact_corners,ok)
-    #             cv2.imshow('image_corner',image)
-    #             cv2.waitKey(0)
+        self.world = world_point
+        center_spacing = 30     ## 圆心的位置距离，这一个其实不重要
+
+        pairs = self.pair_images()
+        previous = None
+        if incremental and result_path is not None and os.path.exists(result_path):
+            previous = load_calibration(result_path)
+            known = set(previous["views"]) | set(previous["rejected"]) | set(previous["failed"])
+            new_pairs = [pair for pair in pairs if pair[0] not in known]
+            if not new_pairs:
+                print("没有新的图像对，标定结果不变")
+                self.apply(previous)
+                return previous
+            # 之前剔除的视图是按当时（视图较少时）的结果判断的，加入新视图后与其他视图一起重新检验
+            print(f"增量标定：已有 {len(previous['views'])} 个视图，新增 {len(new_pairs)} 个图像对，"
+                  f"重新检验之前剔除的 {len(previous['rejected'])} 个")
+            pairs = [pair for pair in pairs if pair[0] in known] + new_pairs
+
+        #获取所有标定图的角点（并行检测，结果按图像内容缓存）
+        count = len(pairs)
+        corners = detect_corners([pair[1] for pair in pairs] + [pair[2] for pair in pairs], (x_nums,y_nums), workers)
+        views = {}
+        failed = []
+        for ii, (name, _, _) in enumerate(pairs):
+            ok1,cornersl,image_shape = corners[ii]
+            ok2,cornersr,_ = corners[count + ii]
+            if ok1 and ok2:
+                views[name] = (cornersl, cornersr)
+            else:
+                print(f"图像对 {name}: 角点检测失败（左: {ok1}, 右: {ok2}），不参与标定")
+                failed.append(name)
+        if len(views) < 3:
+            print(f"只有 {len(views)} 个图像对检测到角点，无法标定")
+            return None
+        print(f"参与标定的图像对: {len(views)} / {count}")
+
+        # 标定和剔除视图都只使用内存中的角点，不再读取图像
+        solution = self.solve(views, world_point*center_spacing, image_shape, previous)
+        rejected = {}
+        while len(solution["views"]) > min_views:
+            errors = solution["per_view_errors"]
+            worst = max(errors, key=lambda name: max(errors[name]))
+            worst_error = max(errors[worst])
+            limit = max(max_error, reject_ratio * float(np.median([max(e) for e in errors.values()])))
+            if worst_error <= limit:
+                break
+            print(f"剔除图像对 {worst}: 重投影误差 {worst_error:.3f} 像素（上限 {limit:.3f}）")
+            rejected[worst] = round(worst_error, 4)
+            del views[worst]
+            solution = self.solve(views, world_point*center_spacing, image_shape, solution)
+        solution["rejected"] = rejected
+        solution["failed"] = failed     # 记录下来，增量标定时不再当作新图像对
+
+        self.apply(solution)
+        print(f"双目标定 RMS: {solution['rms']:.4f} 像素，使用 {len(solution['views'])} 个视图，剔除 {len(rejected)} 个")
+        if result_path is not None:
+            save_calibration(result_path, solution)
+            print(f"标定结果已保存到 {result_path}")
+        return solution
+
+    def calibrate_intrinsics(self, world, image_position, image_shape, guess, side):
+        """
+        单目标定一个相机，guess 给出时以其中 side（"left"/"right"）相机的内参为初值
+        视图较少时上一次的结果可能已经发散（主点落在图像之外），这样的初值 OpenCV 不接受，改为不带初值求解
+        """
+        camera = "左" if side == "left" else "右"
+        if guess is not None:
+            matrix = guess[f"{side}_camera_matrix"]
+            cx, cy = matrix[0, 2], matrix[1, 2]
+            if 0 <= cx < image_shape[0] and 0 <= cy < image_shape[1]:
+                try:
+                    return cv2.calibrateCamera(world, image_position, image_shape, matrix.copy(),
+                                               guess[f"{side}_distortion"].copy(), flags=cv2.CALIB_USE_INTRINSIC_GUESS)
+                except cv2.error as e:
+                    print(f"{camera}相机以已有内参为初值标定失败，改为不带初值求解: {e}")
+            else:
+                print(f"{camera}相机已有内参的主点 ({cx:.1f}, {cy:.1f}) 在图像之外，不作为初值")
+        return cv2.calibrateCamera(world, image_position, image_shape, None, None)
+
+    def solve(self, views, world_position, image_shape, guess=None):
+        """
+        由角点求解单目和双目标定
+        views: {编号: (左图角点, 右图角点)}
+        guess: 之前的标定结果，给出时以其内参为初值（增量标定和剔除视图后重新求解时收敛更快）
+        返回: 标定结果字典（格式同 stereo_rectify.DEFAULT_CALIBRATION，另有 views、per_view_errors、rms）
+        """
+        names = sorted(views)
+        world = [world_position] * len(names)
+        image_positionl = [views[name][0] for name in names]
+        image_positionr = [views[name][1] for name in names]
+
         #计算内参数
-        image_shape = gray_l.shape[::-1]
-        
-        retl, mtxl, distl, rvecsl, tvecsl = cv2.calibrateCamera(world_position, image_positionl, image_shape , None,None)
-        retr, mtxr, distr, rvecsr, tvecsr = cv2.calibrateCamera(world_position, image_positionr, image_shape , None,None)
+        retl, mtxl, distl, rvecsl, tvecsl = self.calibrate_intrinsics(world, image_positionl, image_shape,
+                                                                      guess, "left")
+        retr, mtxr, distr, rvecsr, tvecsr = self.calibrate_intrinsics(world, image_positionr, image_shape,
+                                                                      guess, "right")
         print('ml = ',mtxl)
         print('mr = ',mtxr)
         print('dl = ' , distl)
         print('dr = ' , distr)
-        stereo.m1 = mtxl
-        stereo.m2 = mtxr
-        stereo.d1 = distl
-        stereo.d2 = distr
-        
-        
+
         #计算误差
-        self.cal_error(world_position , image_positionl ,  mtxl , distl , rvecsl , tvecsl)
-        self.cal_error(world_position , image_positionr ,  mtxr,  distr , rvecsr , tvecsr)
+        self.cal_error(world , image_positionl ,  mtxl , distl , rvecsl , tvecsl)
+        self.cal_error(world , image_positionr ,  mtxr,  distr , rvecsr , tvecsr)
 
         ##双目标定
-        self.stereo_calibrate( world_position ,image_positionl , image_positionr , mtxl, distl, mtxr, distr, image_shape)
-        
+        rms, R, T, per_view = self.stereo_calibrate(world ,image_positionl , image_positionr , mtxl, distl, mtxr, distr,
+                                                    image_shape)
+        return {
+            "left_camera_matrix": mtxl, "left_distortion": distl,
+            "right_camera_matrix": mtxr, "right_distortion": distr,
+            "R": R, "T": T, "size": tuple(image_shape),
+            "rms": float(rms),
+            "views": names,
+            "per_view_errors": {name: [float(e) for e in errors] for name, errors in zip(names, per_view)},
+        }
+
+    def apply(self, solution):
+        """把标定结果写入全局的 stereo"""
+        stereo.m1 = solution["left_camera_matrix"]
+        stereo.m2 = solution["right_camera_matrix"]
+        stereo.d1 = solution["left_distortion"]
+        stereo.d2 = solution["right_distortion"]
+        stereo.R = solution["R"]
+        stereo.T = solution["T"]
+
     def cal_error(self , world_position , image_position ,  mtx , dist , rvecs , tvecs):
         #计算偏差
         mean_error = 0
@@ -110,23 +299,54 @@ class StereoCalibration(object):
         print("total error: ", mean_error / len(image_position))
 
     def stereo_calibrate( self ,  objpoints ,imgpoints_l , imgpoints_r , M1, d1, M2, d2, dims):
+        """返回: (RMS 重投影误差, R, T, 每个视图左右图像的重投影误差 (N, 2))"""
         flags = 0
         flags |= cv2.CALIB_FIX_INTRINSIC
         flags |= cv2.CALIB_USE_INTRINSIC_GUESS
         flags |= cv2.CALIB_FIX_FOCAL_LENGTH
         flags |= cv2.CALIB_ZERO_TANGENT_DIST
         stereocalib_criteria = (cv2.TERM_CRITERIA_MAX_ITER +cv2.TERM_CRITERIA_EPS, 100, 1e-5)
-        ret, M1, d1, M2, d2, R, T, E, F = cv2.stereoCalibrate(
+        ret, M1, d1, M2, d2, R, T, E, F, _, _, per_view = cv2.stereoCalibrateExtended(
                                     objpoints, imgpoints_l,
                                     imgpoints_r, M1, d1, M2,
-                                    d2, dims,
+                                    d2, dims, None, None,
                                     criteria=stereocalib_criteria, flags=flags)
         print(R)
         print(T)
-        stereo.R = R
-        stereo.T = T
-        
+        return ret, R, T, per_view
+
+def save_calibration(path, solution):
+    """把标定结果保存为 JSON"""
+    data = {}
+    for key, value in solution.items():
+        data[key] = value.tolist() if isinstance(value, np.ndarray) else value
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+def load_calibration(path):
+    """读取 save_calibration 保存的标定结果，矩阵转为 numpy 数组（可直接传给 stereo_rectify.load_rectification）"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for key in ("left_camera_matrix", "left_distortion", "right_camera_matrix", "right_distortion", "R", "T"):
+        data[key] = np.array(data[key], dtype=np.float64)
+    data["size"] = tuple(data["size"])
+    data.setdefault("rejected", {})
+    data.setdefault("failed", [])
+    return data
+
 if __name__ == '__main__':
-#     calibration_photo()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="双目标定")
+    parser.add_argument("--incremental", action="store_true", help="在已有标定结果上只加入新的图像对")
+    parser.add_argument("--max-error", type=float, default=0.5, help="单视图重投影误差上限（像素）")
+    parser.add_argument("--reject-ratio", type=float, default=2.0, help="单视图误差超过中位数的多少倍时剔除")
+    parser.add_argument("--min-views", type=int, default=10, help="剔除视图后至少保留的视图数")
+    parser.add_argument("--output", default=CALIBRATION_PATH, help="标定结果文件")
+    parser.add_argument("--workers", type=int, default=None, help="角点检测的进程数")
+    args = parser.parse_args()
+
     biaoding = StereoCalibration()
-    biaoding.calibration_photo()
+    biaoding.calibration_photo(incremental=args.incremental, max_error=args.max_error, reject_ratio=args.reject_ratio,
+                               min_views=args.min_views, result_path=args.output, workers=args.workers)
@@ -1,151 +1,183 @@
 import cv2
-import numpy as np
 import time
-import random
 import math
+import argparse
+from camera_source import open_camera
+from stereo_depth import StereoDepthEngine, STEREO_MODES
+from stereo_pipeline import StereoPipeline
+from settings import load_stereo_settings
 
-# -----------------------------------双目相机的基本参数---------------------------------------------------------
-#   left_camera_matrix          左相机的内参矩阵
-#   right_camera_matrix         右相机的内参矩阵
-#
-#   left_distortion             左相机的畸变系数    格式(K1,K2,P1,P2,0)
-#   right_distortion            右相机的畸变系数
-# -------------------------------------------------------------------------------------------------------------
-# 左镜头的内参，如焦距
-left_camera_matrix = np.array([[1.28782208e+03, 0.00000000e+00, 1.63925648e+02],
-                               [0.00000000e+00, 1.30509164e+03, 2.13901456e+02],
-                               [0.00000000e+00, 0.00000000e+00, 1.00000000e+00]])
-right_camera_matrix = np.array([[ 1.23753925e+03,  0.00000000e+00, -1.15126361e+01],
- [ 0.00000000e+00,  1.29207405e+03,  2.28432426e+02],
- [ 0.00000000e+00,  0.00000000e+00,  1.00000000e+00]])
- 
-
-# 畸变系数,K1、K2、K3为径向畸变,P1、P2为切向畸变
-left_distortion = np.array([[ 6.73438062e-01, -1.24494025e+01, -2.86825939e-02, 1.67518823e-02, 5.00656930e+01]])
-right_distortion = np.array([[ 0.2429477,  -5.29792274, -0.03965634,  0.0402608,  15.50194529]])
-# 旋转矩阵
-R = np.array([[0.99031455, 0.00344004, 0.13879936],
-                            [-0.00305175, 0.99999081, -0.00301023],
-                            [-0.13880844, 0.00255749, 0.99031595]])
-# 平移矩阵
-T =  np.array([[-61.22409065], [ -4.82093845], [  5.65538616]])
-size = (640, 480)
-
-
-R1, R2, P1, P2, Q, validPixROI1, validPixROI2 = cv2.stereoRectify(left_camera_matrix, left_distortion,
-                                                                  right_camera_matrix, right_distortion, size, R,
-                                                                  T)
-
-# 校正查找映射表,将原始图像和校正后的图像上的点一一对应起来
-left_map1, left_map2 = cv2.initUndistortRectifyMap(left_camera_matrix, left_distortion, R1, P1, size, cv2.CV_16SC2)
-right_map1, right_map2 = cv2.initUndistortRectifyMap(right_camera_matrix, right_distortion, R2, P2, size, cv2.CV_16SC2)
-print(Q)
+# 双目深度查看器：深度计算由 stereo_depth.StereoDepthEngine 完成（标定参数和校正映射表见 stereo_rectify.py），
+# 采集、校正、立体匹配由 stereo_pipeline.StereoPipeline 分阶段在多个线程中进行，本脚本只负责显示和鼠标测距
 
 # --------------------------鼠标回调函数---------------------------------------------------------
 #   event               鼠标事件
-#   param               输入参数
+#   param               输入参数（StereoDepthEngine，点击时只对该像素计算三维坐标）
 # -----------------------------------------------------------------------------------------------
 def onmouse_pick_points(event, x, y, flags, param):
     if event == cv2.EVENT_LBUTTONDOWN:
-        threeD = param
+        engine = param
         print('\n像素坐标 x = %d, y = %d' % (x, y))
-        # print("世界坐标是：", threeD[y][x][0], threeD[y][x][1], threeD[y][x][2], "mm")
-        print("世界坐标xyz 是：", threeD[y][x][0] / 1000.0, threeD[y][x][1] / 1000.0, threeD[y][x][2] / 1000.0, "m")
-
-        distance = math.sqrt(threeD[y][x][0] ** 2 + threeD[y][x][1] ** 2 + threeD[y][x][2] ** 2)
+        # 取点击位置 5x5 邻域内有效视差的中位数
+        point = engine.point_at(x, y, radius=2)
+        if point is None:
+            print("该位置没有有效视差")
+            return
+        print("世界坐标xyz 是：", point[0] / 1000.0, point[1] / 1000.0, point[2] / 1000.0, "m")
+
+        distance = math.sqrt(point[0] ** 2 + point[1] ** 2 + point[2] ** 2)
         distance = distance / 1000.0  # mm -> m
         print("距离是：", distance, "m")
 
 
-# 打开摄像头，使用实时摄像头
-capture = cv2.VideoCapture(1)
-# 设置分辨率为1280x480，以便包含左右两个相机视图
-capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-WIN_NAME = 'Deep disp'
-cv2.namedWindow(WIN_NAME, cv2.WINDOW_AUTOSIZE)
-cv2.namedWindow("depth", cv2.WINDOW_AUTOSIZE)
-
-# 读取视频
-fps = 0.0
-while True:
-    # 开始计时
-    t1 = time.time()
-    # 是否读取到了帧，读取到了则为True
-    ret, frame = capture.read()
-    if not ret:
-        print("无法获取摄像头画面")
-        break
-        
-    # 切割为左右两张图片
-    frame1 = frame[0:480, 0:640]
-    frame2 = frame[0:480, 640:1280]
-    
-    # 将BGR格式转换成灰度图片，用于畸变矫正
-    imgL = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-    imgR = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
-
-    # 重映射，就是把一幅图像中某位置的像素放置到另一个图片指定位置的过程。
-    # 依据MATLAB测量数据重建无畸变图片,输入图片要求为灰度图
-    img1_rectified = cv2.remap(imgL, left_map1, left_map2, cv2.INTER_LINEAR)
-    img2_rectified = cv2.remap(imgR, right_map1, right_map2, cv2.INTER_LINEAR)
-
-    # 转换为opencv的BGR格式
-    imageL = cv2.cvtColor(img1_rectified, cv2.COLOR_GRAY2BGR)
-    imageR = cv2.cvtColor(img2_rectified, cv2.COLOR_GRAY2BGR)
-
-    # ------------------------------------SGBM算法----------------------------------------------------------
-    blockSize = 3
-    img_channels = 3
-    stereo = cv2.StereoSGBM_create(minDisparity=1,
-                                   numDisparities=64,
-                                   blockSize=blockSize,
-                                   P1=8 * img_channels * blockSize * blockSize,
-                                   P2=32 * img_channels * blockSize * blockSize,
-                                   disp12MaxDiff=-1,
-                                   preFilterCap=1,
-                                   uniquenessRatio=10,
-                                   speckleWindowSize=100,
-                                   speckleRange=100,
-                                   mode=cv2.STEREO_SGBM_MODE_HH)
-    # 计算视差
-    disparity = stereo.compute(img1_rectified, img2_rectified)
-
-    # 归一化函数算法，生成深度图（灰度图）
-    disp = cv2.normalize(disparity, disparity, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-
-    # 生成深度图（颜色图）
-    dis_color = disparity
-    dis_color = cv2.normalize(dis_color, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-    dis_color = cv2.applyColorMap(dis_color, 2)
-
-    # 计算三维坐标数据值
-    threeD = cv2.reprojectImageTo3D(disparity, Q, handleMissingValues=True)
-    # 计算出的threeD，需要乘以16，才等于现实中的距离
-    threeD = threeD * 16
-
-    # 鼠标回调事件
-    cv2.setMouseCallback("depth", onmouse_pick_points, threeD)
-
-    # 完成计时，计算帧率
-    fps = (fps + (1. / (time.time() - t1))) / 2
-    frame = cv2.putText(frame, "fps= %.2f" % (fps), (0, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-
-    # 在深度图上添加提示信息
-    dis_color = cv2.putText(dis_color, "Click to measure distance", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-
-    cv2.imshow("depth", dis_color)
-    cv2.imshow("left", frame1)
-    cv2.imshow(WIN_NAME, disp)  # 显示深度图的双目画面
-    
-    # 若键盘按下q则退出播放
-    if cv2.waitKey(1) & 0xff == ord('q'):
-        break
-
-# 释放资源
-capture.release()
-
-# 关闭所有窗口
-cv2.destroyAllWindows()
\ No newline at end of file
+def mouth_depth_viewer(engine, capture):
+    """嘴部测距：每帧在左图检测嘴部，只在嘴部附近计算视差，显示嘴部的三维位置"""
+    from mouth_track import MouthDetector, draw_mouth_overlay
+
+    detector = MouthDetector()
+    fps = 0.0
+    while True:
+        t1 = time.time()
+        ret, frame = capture.read()
+        if not ret:
+            print("无法获取摄像头画面")
+            break
+
+        frame1, _ = engine.split(frame)
+        mouth = detector.find_mouth(frame1)
+        result = engine.mouth_depth(frame, mouth[0]) if mouth is not None else None
+
+        fps = (fps + (1. / (time.time() - t1))) / 2
+        view = draw_mouth_overlay(frame1.copy(), {"is_detected": mouth is not None,
+                                                  "center": mouth[1] if mouth is not None else None,
+                                                  "points": mouth[0] if mouth is not None else None})
+        cv2.putText(view, "fps= %.2f" % (fps), (0, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        if result is not None:
+            X, Y, Z = result["position"]
+            cv2.putText(view, "Mouth: (%.0f, %.0f, %.0f) mm" % (X, Y, Z), (10, 80),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        elif mouth is not None:
+            cv2.putText(view, "No valid disparity", (10, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        cv2.imshow("mouth depth", view)
+
+        if cv2.waitKey(1) & 0xff == ord('q'):
+            break
+
+    capture.release()
+    cv2.destroyAllWindows()
+
+def main():
+    parser = argparse.ArgumentParser(description="双目深度查看器")
+    parser.add_argument("source", nargs="?", default=1,
+                        help="摄像头设备号，或录制文件路径（回放录制的画面代替摄像头）")
+    stereo_settings = load_stereo_settings()
+    parser.add_argument("--mode", default="hh", choices=list(STEREO_MODES),
+                        help="立体匹配算法（pyramid 为先缩小图像粗匹配、再按条带在窄范围内细化，一般与 --working-range 一起使用）")
+    parser.add_argument("--num-disparities", type=int, default=64, help="视差搜索范围（16的倍数）")
+    parser.add_argument("--working-range", action="store_true",
+                        help="视差搜索范围由工作距离换算（代替 --num-disparities），画面中的物体都在工作距离内时使用")
+    parser.add_argument("--min-distance", type=float, default=stereo_settings["min_distance"],
+                        help="与 --working-range 一起使用：最近工作距离（毫米），默认读取 config.ini")
+    parser.add_argument("--max-distance", type=float, default=stereo_settings["max_distance"],
+                        help="与 --working-range 一起使用：最远工作距离（毫米），默认读取 config.ini")
+    parser.add_argument("--block-size", type=int, default=3, help="匹配块大小")
+    parser.add_argument("--config", help="stereo_autotune.py 输出的调优结果文件，使用其中的匹配参数（忽略上面的参数）")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="与 --config 一起使用：选择每帧耗时不超过该值的质量最高的配置")
+    parser.add_argument("--stages", type=int, default=4, choices=[1, 2, 3, 4],
+                        help="流水线级数（1 为串行，4 为采集、校正、匹配各一个线程）")
+    parser.add_argument("--queue-depth", type=int, default=1, help="相邻阶段之间队列的容量")
+    parser.add_argument("--timings", action="store_true", help="每秒打印一次各阶段耗时")
+    parser.add_argument("--mouth", action="store_true",
+                        help="只测量嘴部距离：在左图检测嘴部，只在嘴部附近的条带内计算视差")
+    args = parser.parse_args()
+    source = int(args.source) if str(args.source).isdigit() else args.source
+
+    options = {}
+    if args.mode == "pyramid":
+        options = {"levels": stereo_settings["pyramid_levels"], "band_height": stereo_settings["band_height"],
+                   "margin": stereo_settings["refine_margin"]}
+    if args.config:
+        from stereo_autotune import select_config
+        from stereo_bench import engine_options
+
+        config, score = select_config(args.config, args.budget_ms)
+        print(f"使用调优配置 {config['name']}：{score['ms_per_frame']:.1f} ms/帧，质量 {score['quality']:.3f}")
+        engine = StereoDepthEngine(**engine_options(config))
+    elif args.working_range:
+        engine = StereoDepthEngine(mode=args.mode, block_size=args.block_size,
+                                   distance_range=(args.min_distance, args.max_distance), **options)
+    else:
+        engine = StereoDepthEngine(mode=args.mode, num_disparities=args.num_disparities,
+                                   block_size=args.block_size, **options)
+    print(engine.rectification.Q)
+    print(f"视差搜索范围: {engine.min_disparity} - {engine.min_disparity + engine.num_disparities}")
+
+    # 打开摄像头，使用实时摄像头（共享的最新帧摄像头源）
+    # 设置分辨率为1280x480，以便包含左右两个相机视图
+    capture = open_camera(source, width=2 * engine.width, height=engine.height)
+
+    if args.mouth:
+        mouth_depth_viewer(engine, capture)
+        return
+
+    WIN_NAME = 'Deep disp'
+    cv2.namedWindow(WIN_NAME, cv2.WINDOW_AUTOSIZE)
+    cv2.namedWindow("depth", cv2.WINDOW_AUTOSIZE)
+
+    # 鼠标回调通过引擎按需计算点击位置的三维坐标，不再每帧计算整幅点云
+    cv2.setMouseCallback("depth", onmouse_pick_points, engine)
+
+    # 采集、校正、匹配在流水线线程中进行，主线程只负责显示
+    pipeline = StereoPipeline(engine, capture, stages=args.stages, queue_depth=args.queue_depth)
+    pipeline.start()
+
+    # 读取视频
+    fps = 0.0
+    last_report = time.time()
+    while True:
+        # 开始计时
+        t1 = time.time()
+        # 取出已计算好视差的一帧
+        item = pipeline.get()
+        if item is None:
+            print("无法获取摄像头画面")
+            break
+
+        # 载入视差供显示和鼠标测距使用
+        engine.load_disparity(item.disparity)
+        disp = engine.normalized()
+        dis_color = engine.colorize()
+
+        # 完成计时，计算帧率
+        fps = (fps + (1. / (time.time() - t1))) / 2
+        frame1, _ = engine.split(item.frame)
+        frame1 = cv2.putText(frame1, "fps= %.2f" % (fps), (0, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+        # 在深度图上添加提示信息
+        dis_color = cv2.putText(dis_color, "Click to measure distance", (10, 30),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+        cv2.imshow("depth", dis_color)
+        cv2.imshow("left", frame1)
+        cv2.imshow(WIN_NAME, disp)  # 显示深度图的双目画面
+        pipeline.release(item)
+
+        if args.timings and time.time() - last_report >= 1.0:
+            print(pipeline.timer.format())
+            last_report = time.time()
+
+        # 若键盘按下q则退出播放
+        if cv2.waitKey(1) & 0xff == ord('q'):
+            break
+
+    # 释放资源
+    pipeline.stop()
+    print("各阶段平均耗时:", pipeline.timer.format())
+    capture.release()
+
+    # 关闭所有窗口
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+最新帧摄像头源
+cv2.VideoCapture 内部有帧缓冲队列，处理速度跟不上时 read() 会拿到几百毫秒前的旧帧。
+CameraSource 在专用线程中持续采集，只保留最新一帧及其采集时间戳；
+同一设备通过 open_camera() 在各模块之间共享，避免多个模块争用摄像头
+"""
+
+import threading
+import time
+
+import cv2
+
+class CameraSource:
+    """
+    最新帧摄像头源，提供与 cv2.VideoCapture 兼容的 read()/isOpened()/get()/set()/release() 接口
+    返回的帧由所有使用者共享：latest()/next_after() 返回只读帧，read() 返回可修改的副本
+    """
+
+    def __init__(self, device=1, width=None, height=None, max_failures=30):
+        """
+        device: 摄像头设备号
+        width, height: 采集分辨率，为 None 时使用摄像头默认值
+        max_failures: 连续读取失败多少次后停止采集
+        """
+        self.device = device
+        self.width = width
+        self.height = height
+        self.max_failures = max_failures
+
+        self._cap = cv2.VideoCapture(device)
+        if width is not None:
+            self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height is not None:
+            self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+        self._cap_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = None
+        self._running = False
+        self._thread = None
+        self._local = threading.local()   # 每个读取线程上一次 read() 拿到的时间戳
+        self._refcount = 0                # 由 open_camera() 维护的引用计数
+
+    def start(self):
+        """启动采集线程"""
+        if self._running:
+            return True
+        if not self._cap.isOpened():
+            print(f"无法打开摄像头 {self.device}")
+            return False
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"CameraSource-{self.device}", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """停止采集线程并释放摄像头"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(2.0)
+        self._thread = None
+        with self._cap_lock:
+            self._cap.release()
+
+    def _run(self):
+        """采集线程：不断抓取新帧，只保留最新一帧"""
+        failures = 0
+        while self._running:
+            with self._cap_lock:
+                grabbed = self._cap.grab()
+                timestamp = time.time()
+                success, frame = self._cap.retrieve() if grabbed else (False, None)
+
+            if not success:
+                failures += 1
+                if failures >= self.max_failures:
+                    print(f"摄像头 {self.device} 连续读取失败，停止采集")
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+
+            frame.flags.writeable = False
+            with self._cond:
+                self._frame = frame
+                self._timestamp = timestamp
+                self._cond.notify_all()
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        # 采集结束（读取失败或被停止）：释放摄像头，并从共享表中移除，之后的 open_camera 会重新打开设备
+        with self._cap_lock:
+            self._cap.release()
+        _forget_source(self)
+
+    def latest(self):
+        """
+        获取最新一帧（只读）
+        返回: (frame, timestamp)，尚无图像时返回 (None, None)
+        """
+        with self._cond:
+            return self._frame, self._timestamp
+
+    def next_after(self, timestamp, timeout=1.0):
+        """
+        阻塞等待采集时间晚于 timestamp 的新帧（只读）
+        timestamp: 为 None 时只要有图像即返回
+        返回: (frame, timestamp)，超时或采集已停止时返回 (None, None)
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._frame is None or (timestamp is not None and self._timestamp <= timestamp):
+                remaining = deadline - time.time()
+                if not self._running or remaining <= 0:
+                    return None, None
+                self._cond.wait(remaining)
+            return self._frame, self._timestamp
+
+    def read_timestamped(self, timeout=1.0):
+        """
+        读取当前线程尚未读过的最新一帧
+        返回: (success, frame, timestamp)，frame 为可修改的副本
+        """
+        frame, timestamp = self.next_after(getattr(self._local, "timestamp", None), timeout)
+        if frame is None:
+            return False, None, None
+        self._local.timestamp = timestamp
+        return True, frame.copy(), timestamp
+
+    def read(self):
+        """与 cv2.VideoCapture.read() 兼容：返回 (success, frame)"""
+        success, frame, _ = self.read_timestamped()
+        return success, frame
+
+    def isOpened(self):
+        """采集线程是否在运行"""
+        return self._running
+
+    def get(self, prop_id):
+        """读取摄像头属性（同 cv2.VideoCapture.get）"""
+        with self._cap_lock:
+            return self._cap.get(prop_id)
+
+    def set(self, prop_id, value):
+        """设置摄像头属性（同 cv2.VideoCapture.set）"""
+        with self._cap_lock:
+            return self._cap.set(prop_id, value)
+
+    def release(self):
+        """释放一次引用，最后一个使用者释放时停止采集"""
+        with _sources_lock:
+            self._refcount = max(0, self._refcount - 1)
+            if self._refcount > 0:
+                return
+            if _sources.get(self.device) is self:
+                del _sources[self.device]
+        self.stop()
+
+# 已打开的共享摄像头源（按设备号）
+_sources = {}
+_sources_lock = threading.Lock()
+
+def _forget_source(source):
+    """把已停止的摄像头源从共享表中移除（表中已是新打开的源时不做任何事）"""
+    with _sources_lock:
+        if _sources.get(source.device) is source:
+            del _sources[source.device]
+
+def open_camera(device=1, width=None, height=None, realtime=True):
+    """
+    打开（或复用已打开的）共享摄像头源
+    每次调用都需要对应一次 release()；设备已被其他模块打开时沿用其分辨率
+    device: 摄像头设备号，或录制文件路径（使用 frame_record.ReplaySource 回放，分辨率为录制时的分辨率）
+    realtime: 回放录制文件时是否按原始节奏回放
+    """
+    if isinstance(device, str):
+        from frame_record import ReplaySource
+
+        with _sources_lock:
+            source = _sources.get(device)
+            if source is None or not source.isOpened():
+                source = ReplaySource(device, realtime=realtime)
+                _sources[device] = source
+            source._refcount += 1
+            return source
+
+    with _sources_lock:
+        source = _sources.get(device)
+        if source is None or not source.isOpened():
+            source = CameraSource(device, width, height)
+            if source.start():
+                _sources[device] = source
+        elif (width, height) != (None, None) and (width, height) != (source.width, source.height):
+            print(f"摄像头 {device} 已以 {source.width}x{source.height} 打开，忽略请求的分辨率 {width}x{height}")
+        source._refcount += 1
+        return source
+
+def read_frame(cap):
+    """
+    从摄像头读取一帧并附带采集时间戳
+    支持 CameraSource（使用采集线程记录的时间）、ReplaySource（使用录制的时间）和普通 cv2.VideoCapture（使用读取完成的时间）
+    返回: (success, frame, timestamp)
+    """
+    if hasattr(cap, "read_timestamped"):
+        return cap.read_timestamped()
+    success, frame = cap.read()
+    return success, frame, time.time()
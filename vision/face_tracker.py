@@ -0,0 +1,336 @@
+"""
+多人脸跟踪与喂食对象锁定
+画面中有多个人（例如护理人员靠近）时，用轻量的人脸检测（BlazeFace）找出所有人脸框，
+按 IoU/中心距离关联到持久的跟踪ID，锁定喂食对象后只在该对象的人脸区域内运行FaceMesh，
+关键点推理的耗时不随画面中人数增加。
+人脸检测每隔几帧才运行一次，中间的帧由FaceMesh的人脸轮廓更新喂食对象的人脸框
+"""
+
+import threading
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from mouth_track import MouthDetector, MOUTH_LANDMARK_INDEX
+
+mp_face_detection = mp.solutions.face_detection
+
+class SharedFaceDetection:
+    """
+    可在多个线程间共享的人脸检测器：模型在第一次 process 时才加载，process 调用串行执行
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self._detector = None
+        self._lock = threading.Lock()
+
+    def process(self, rgb_image):
+        """对RGB图像运行人脸检测"""
+        with self._lock:
+            if self._detector is None:
+                self._detector = mp_face_detection.FaceDetection(**self.options)
+            return self._detector.process(rgb_image)
+
+# 人脸检测器注册表：相同配置的检测器在整个进程中只创建一次
+_face_detection_registry = {}
+_registry_lock = threading.Lock()
+
+def get_face_detector(model_selection=0, min_detection_confidence=0.5):
+    """
+    获取共享的人脸检测器
+    model_selection: 0 为近距离模型（2米以内），1 为远距离模型
+    """
+    key = (model_selection, min_detection_confidence)
+    with _registry_lock:
+        detector = _face_detection_registry.get(key)
+        if detector is None:
+            detector = SharedFaceDetection(model_selection=model_selection,
+                                           min_detection_confidence=min_detection_confidence)
+            _face_detection_registry[key] = detector
+        return detector
+
+def detect_faces(frame, scale=1.0, detector=None):
+    """
+    检测图像中的所有人脸
+    scale: 检测前的缩放比例，人脸框仍按原图坐标输出
+    返回: (N, 4) float32 人脸框数组 (x0, y0, x1, y1)
+    """
+    img_h, img_w = frame.shape[:2]
+    if scale != 1.0:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if detector is None:
+        detector = get_face_detector()
+    results = detector.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    boxes = np.zeros((0, 4), dtype=np.float32)
+    if results.detections:
+        boxes = np.array([(box.xmin, box.ymin, box.xmin + box.width, box.ymin + box.height)
+                          for box in (d.location_data.relative_bounding_box for d in results.detections)],
+                         dtype=np.float32)
+        boxes = np.clip(boxes, 0.0, 1.0) * np.array((img_w, img_h, img_w, img_h), dtype=np.float32)
+    return boxes
+
+def box_iou(boxes_a, boxes_b):
+    """两组框两两之间的 IoU，返回 (len(a), len(b)) 数组"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(1, -1, 4)
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+class FaceTrack:
+    """一个被跟踪的人脸"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = tuple(float(v) for v in box)   # (x0, y0, x1, y1)
+        self.hits = 1       # 累计匹配次数
+        self.missed = 0     # 连续未匹配的检测次数
+
+    @property
+    def center(self):
+        x0, y0, x1, y1 = self.box
+        return (x0 + x1) / 2, (y0 + y1) / 2
+
+    @property
+    def size(self):
+        x0, y0, x1, y1 = self.box
+        return max(x1 - x0, y1 - y0)
+
+class FaceTracker:
+    """
+    基于 IoU 和中心距离的人脸跟踪器，为每张人脸分配持久的ID
+    先按 IoU 从大到小贪心匹配，剩余的再按中心距离（相对人脸大小）匹配，
+    连续 max_missed 次检测都没有匹配上的跟踪被删除
+    """
+
+    def __init__(self, iou_threshold=0.3, max_distance=0.6, max_missed=15):
+        """
+        iou_threshold: IoU 匹配阈值
+        max_distance: 中心距离匹配阈值（相对人脸框边长）
+        max_missed: 最多允许连续未匹配的检测次数
+        """
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.reset()
+
+    def reset(self):
+        """清除所有跟踪"""
+        self.tracks = {}
+        self._next_id = 1
+
+    def get(self, track_id):
+        """按ID获取跟踪，不存在时返回 None"""
+        return self.tracks.get(track_id)
+
+    def update(self, boxes):
+        """
+        用一次检测得到的人脸框更新跟踪
+        boxes: (N, 4) 人脸框数组
+        返回: 当前所有跟踪的列表
+        """
+        tracks = list(self.tracks.values())
+        unmatched_tracks = set(range(len(tracks)))
+        unmatched_boxes = set(range(len(boxes)))
+
+        if tracks and len(boxes):
+            track_boxes = np.array([track.box for track in tracks], dtype=np.float32)
+            iou = box_iou(track_boxes, boxes)
+            for ti, bi in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[ti, bi] < self.iou_threshold:
+                    break
+                if ti in unmatched_tracks and bi in unmatched_boxes:
+                    self._match(tracks[ti], boxes[bi])
+                    unmatched_tracks.discard(ti)
+                    unmatched_boxes.discard(bi)
+
+            # IoU 没有匹配上的（快速移动），按中心距离匹配
+            if unmatched_tracks and unmatched_boxes:
+                track_list, box_list = sorted(unmatched_tracks), sorted(unmatched_boxes)
+                track_centers = np.array([tracks[ti].center for ti in track_list], dtype=np.float32)
+                track_sizes = np.array([tracks[ti].size for ti in track_list], dtype=np.float32)
+                box_centers = (boxes[box_list, :2] + boxes[box_list, 2:]) / 2
+                distance = np.linalg.norm(track_centers[:, None] - box_centers[None], axis=2)
+                distance /= np.maximum(track_sizes[:, None], 1.0)
+                for i, j in zip(*np.unravel_index(np.argsort(distance, axis=None), distance.shape)):
+                    if distance[i, j] > self.max_distance:
+                        break
+                    ti, bi = track_list[i], box_list[j]
+                    if ti in unmatched_tracks and bi in unmatched_boxes:
+                        self._match(tracks[ti], boxes[bi])
+                        unmatched_tracks.discard(ti)
+                        unmatched_boxes.discard(bi)
+
+        for ti in unmatched_tracks:
+            track = tracks[ti]
+            track.missed += 1
+            if track.missed > self.max_missed:
+                del self.tracks[track.track_id]
+
+        for bi in sorted(unmatched_boxes):
+            track = FaceTrack(self._next_id, boxes[bi])
+            self.tracks[track.track_id] = track
+            self._next_id += 1
+
+        return list(self.tracks.values())
+
+    @staticmethod
+    def _match(track, box):
+        track.box = tuple(float(v) for v in box)
+        track.hits += 1
+        track.missed = 0
+
+class MultiFaceMouthDetector(MouthDetector):
+    """
+    多人脸场景下的嘴部检测器：跟踪画面中所有人脸，锁定一个喂食对象，只检测该对象的嘴部
+    锁定的对象在跟踪器中消失（连续多次检测不到）之前不会切换到其他人
+    find_mouth 与 lock_target 可在不同线程中调用（例如跟踪线程与终端命令）
+    """
+
+    def __init__(self, select="center", detect_interval=5, min_hits=2, detection_confidence=0.5,
+                 tracker=None, **kwargs):
+        """
+        select: 自动选择喂食对象的方式，"center" 选离画面中心最近的人脸，"largest" 选最大（最近）的人脸
+        detect_interval: 每隔多少帧运行一次整帧人脸检测，中间的帧只运行FaceMesh并用其人脸轮廓更新喂食对象的人脸框；
+                         没有喂食对象或FaceMesh跟丢时下一帧立即检测
+        min_hits: 自动选择时优先考虑至少被检测到 min_hits 次的人脸，避免锁定误检
+        detection_confidence: 人脸检测置信度阈值
+        tracker: 使用的 FaceTracker，为 None 时使用默认参数
+        其余参数同 MouthDetector（始终使用ROI裁剪推理）
+        """
+        self.select = select
+        self.detect_interval = max(1, detect_interval)
+        self.min_hits = min_hits
+        self.face_detector = get_face_detector(min_detection_confidence=detection_confidence)
+        self.tracker = tracker or FaceTracker()
+        self.target_id = None
+        self._frame_index = 0
+        self._lock = threading.RLock()
+        kwargs["use_roi"] = True
+        super().__init__(**kwargs)
+
+    def reset(self):
+        """清除跟踪状态和锁定的喂食对象"""
+        with self._lock:
+            super().reset()
+            self.tracker.reset()
+            self.target_id = None
+            self._frame_index = 0
+
+    def _reset_landmarks(self):
+        """只清除嘴部关键点的跟踪状态，保留人脸跟踪和锁定的对象"""
+        MouthDetector.reset(self)
+
+    @property
+    def tracks(self):
+        """当前所有人脸跟踪的列表快照（可在其他线程中读取）"""
+        with self._lock:
+            return list(self.tracker.tracks.values())
+
+    def lock_target(self, track_id=None):
+        """
+        锁定喂食对象
+        track_id: 人脸跟踪ID，为 None 时切换到下一个人脸
+        返回: 是否锁定成功
+        """
+        with self._lock:
+            if track_id is None:
+                ids = sorted(self.tracker.tracks)
+                if not ids:
+                    return False
+                later = [i for i in ids if self.target_id is None or i > self.target_id]
+                track_id = later[0] if later else ids[0]
+            if track_id not in self.tracker.tracks:
+                return False
+            if track_id != self.target_id:
+                self.target_id = track_id
+                self._reset_landmarks()
+            return True
+
+    def _select_target(self, img_w, img_h):
+        """按选择方式自动选出喂食对象"""
+        visible = [track for track in self.tracker.tracks.values() if track.missed == 0]
+        candidates = [track for track in visible if track.hits >= self.min_hits] or visible
+        if not candidates:
+            return None
+        if self.select == "largest":
+            return max(candidates, key=lambda track: track.size)
+        return min(candidates, key=lambda track: np.hypot(track.center[0] - img_w / 2,
+                                                          track.center[1] - img_h / 2))
+
+    def find_mouth(self, frame):
+        """
+        检测喂食对象的嘴部，坐标均为原图坐标
+        返回: (mouth_points, mouth_center, mouth_bbox)，没有喂食对象或未检测到时返回 None
+        """
+        with self._lock:
+            return self._find_target_mouth(frame)
+
+    def _find_target_mouth(self, frame):
+        """find_mouth 的实现（调用方持有 self._lock）"""
+        # 每一帧都经过运动门控（统计跳帧比例的分母包含所有帧）；没有上一次结果时门控也没有参考区域，必定检测
+        if (self.motion_gate is not None and not self.motion_gate.should_detect(frame)
+                and self._last_result is not None):
+            return self._last_result
+
+        img_h, img_w = frame.shape[:2]
+        target = self.tracker.get(self.target_id)
+        # 没有喂食对象、关键点跟丢或到了检测间隔时运行整帧人脸检测，其余帧沿用已有跟踪
+        detected = target is None or self.face_box is None or self._frame_index % self.detect_interval == 0
+        if detected:
+            self.tracker.update(detect_faces(frame, self.inference_scale, self.face_detector))
+            target = self.tracker.get(self.target_id)
+            self._frame_index = 0
+        self._frame_index += 1
+
+        if target is None:
+            # 锁定的对象已消失，重新选择
+            target = self._select_target(img_w, img_h)
+            self.target_id = None if target is None else target.track_id
+            self._reset_landmarks()
+            if target is None:
+                return None
+
+        # 只在喂食对象的人脸附近运行FaceMesh；刚锁定时以检测框作为初始人脸框
+        if self.face_box is None:
+            self.face_box = target.box
+        roi = self.compute_roi(img_w, img_h)
+        coords = self._run_face_mesh(frame, roi)
+        if coords is None:
+            self._reset_landmarks()
+            return None
+
+        # 本帧检测到了该对象时，确认关键点确实属于它（裁剪区域内可能有其他人的脸）
+        if detected and target.missed == 0:
+            x0, y0, x1, y1 = target.box
+            pad_x, pad_y = (x1 - x0) * 0.25, (y1 - y0) * 0.25
+            mouth_x, mouth_y = coords[:len(MOUTH_LANDMARK_INDEX)].mean(axis=0)
+            if not (x0 - pad_x <= mouth_x <= x1 + pad_x and y0 - pad_y <= mouth_y <= y1 + pad_y):
+                self._reset_landmarks()
+                return None
+
+        result = self._accept(frame, roi, coords)
+        if not detected:
+            # 两次检测之间由FaceMesh的人脸轮廓更新喂食对象的人脸框，下次检测时按新位置关联
+            target.box = self.face_box
+        return result
+
+def draw_face_tracks(frame, tracks, target_id=None):
+    """
+    绘制人脸跟踪框和ID，喂食对象用绿色，其他人用灰色
+    tracks: FaceTrack 列表，或 (track_id, box) 列表
+    """
+    for track in tracks:
+        track_id, box = (track.track_id, track.box) if isinstance(track, FaceTrack) else track
+        color = (0, 255, 0) if track_id == target_id else (160, 160, 160)
+        x0, y0, x1, y1 = (int(round(v)) for v in box)
+        cv2.rectangle(frame, (x0, y0), (x1, y1), color, 2)
+        label = f"ID {track_id}" + (" (target)" if track_id == target_id else "")
+        cv2.putText(frame, label, (x0, max(15, y0 - 5)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    return frame
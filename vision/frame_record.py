@@ -0,0 +1,405 @@
+"""
+帧录制与回放
+录制：把摄像头帧（压缩编码）、采集时间戳和每帧的嘴部检测结果写入一个可随机访问的录制文件；
+回放：ReplaySource 与 cv2.VideoCapture 接口兼容，可以替代摄像头用于 detect_mouth_position、
+RobotArmController 和 calculate_z.py，按原始节奏（实时）或尽可能快地回放，便于在没有摄像头的机器上
+复现现场问题和测量处理吞吐量
+
+文件格式（小端）：
+    文件头   MAGIC(8) + 头信息长度(uint32) + 头信息(JSON)
+    每一帧   时间戳(float64) + 数据长度(uint32) + 编码后的图像
+    索引     npz：各帧偏移、时间戳、检测结果
+    文件尾   索引偏移(uint64) + INDEX_MAGIC(8)
+录制中断（没有写入索引）的文件回放时按帧头顺序扫描恢复，检测结果丢失
+"""
+
+import io
+import json
+import mmap
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+MAGIC = b"MTHREC01"
+INDEX_MAGIC = b"MTHIDX01"
+FRAME_HEADER = struct.Struct("<dI")
+TRAILER = struct.Struct("<Q8s")
+
+class FrameRecorder:
+    """录制摄像头帧、时间戳和检测结果"""
+
+    def __init__(self, path, codec=".jpg", quality=95):
+        """
+        path: 录制文件路径
+        codec: 图像编码格式，".jpg" 体积小，".png" 无损（回放结果与现场完全一致）
+        quality: JPEG 质量
+        """
+        self.path = path
+        self.codec = codec
+        self._params = [cv2.IMWRITE_JPEG_QUALITY, quality] if codec == ".jpg" else []
+        self._lock = threading.Lock()
+        self._offsets = []
+        self._timestamps = []
+        self._results = {}     # 帧序号 -> (is_detected, center, bbox)
+
+        self._file = open(path, "wb")
+        header = json.dumps({"codec": codec, "created": time.time()}).encode("utf-8")
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    @property
+    def frame_count(self):
+        """已录制的帧数"""
+        return len(self._offsets)
+
+    def write(self, frame, timestamp=None, result=None):
+        """
+        写入一帧
+        timestamp: 采集时间，为 None 时使用当前时间
+        result: 可选的检测结果 (is_detected, center, bbox)，也可之后通过 record_result 补充
+        返回: 帧序号
+        """
+        success, encoded = cv2.imencode(self.codec, frame, self._params)
+        if not success:
+            raise ValueError(f"无法以 {self.codec} 编码图像")
+        timestamp = time.time() if timestamp is None else timestamp
+
+        with self._lock:
+            index = len(self._offsets)
+            self._offsets.append(self._file.tell())
+            self._timestamps.append(timestamp)
+            self._file.write(FRAME_HEADER.pack(timestamp, encoded.nbytes))
+            self._file.write(encoded.tobytes())
+            if result is not None:
+                self._results[index] = result
+        return index
+
+    def record_result(self, index, is_detected, center=None, bbox=None):
+        """记录某一帧的嘴部检测结果（检测在其他线程或进程中完成时使用）"""
+        with self._lock:
+            self._results[index] = (is_detected, center, bbox)
+
+    def close(self):
+        """写入索引并关闭文件"""
+        with self._lock:
+            if self._file is None:
+                return
+            count = len(self._offsets)
+            detected = np.zeros(count, dtype=bool)
+            centers = np.full((count, 2), np.nan, dtype=np.float32)
+            bboxes = np.full((count, 4), np.nan, dtype=np.float32)
+            for index, (is_detected, center, bbox) in self._results.items():
+                detected[index] = is_detected
+                if center is not None:
+                    centers[index] = center
+                if bbox is not None:
+                    bboxes[index] = bbox
+
+            buffer = io.BytesIO()
+            np.savez(buffer,
+                     offsets=np.array(self._offsets, dtype=np.int64),
+                     timestamps=np.array(self._timestamps, dtype=np.float64),
+                     detected=detected, centers=centers, bboxes=bboxes,
+                     has_result=np.isin(np.arange(count), list(self._results)))
+            index_offset = self._file.tell()
+            self._file.write(buffer.getvalue())
+            self._file.write(TRAILER.pack(index_offset, INDEX_MAGIC))
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _load_index(data):
+    """读取录制文件的索引；没有索引时扫描帧头恢复"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("不是有效的录制文件")
+    header_size, = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(bytes(data[start:start + header_size]).decode("utf-8"))
+    first_frame = start + header_size
+
+    if len(data) >= first_frame + TRAILER.size:
+        index_offset, magic = TRAILER.unpack_from(data, len(data) - TRAILER.size)
+        if magic == INDEX_MAGIC:
+            with np.load(io.BytesIO(data[index_offset:len(data) - TRAILER.size])) as index:
+                return header, {key: index[key] for key in index.files}
+
+    print("录制文件没有索引（录制可能被中断），按帧扫描恢复")
+    offsets, timestamps = [], []
+    position = first_frame
+    while position + FRAME_HEADER.size <= len(data):
+        timestamp, size = FRAME_HEADER.unpack_from(data, position)
+        if position + FRAME_HEADER.size + size > len(data):
+            break
+        offsets.append(position)
+        timestamps.append(timestamp)
+        position += FRAME_HEADER.size + size
+    count = len(offsets)
+    return header, {
+        "offsets": np.array(offsets, dtype=np.int64),
+        "timestamps": np.array(timestamps, dtype=np.float64),
+        "detected": np.zeros(count, dtype=bool),
+        "centers": np.full((count, 2), np.nan, dtype=np.float32),
+        "bboxes": np.full((count, 4), np.nan, dtype=np.float32),
+        "has_result": np.zeros(count, dtype=bool),
+    }
+
+class ReplaySource:
+    """
+    录制文件回放源，提供与 cv2.VideoCapture 兼容的 read()/grab()/retrieve()/isOpened()/get()/set()/release() 接口，
+    以及与 CameraSource 相同的 read_timestamped()
+    realtime=True 时按录制时的节奏回放，读取跟不上时像真实摄像头一样跳过过期的帧，时间戳换算到当前时钟；
+    realtime=False 时每次读取依次返回下一帧、不等待，帧序列可完全复现；时间戳为读取时刻（相当于帧刚被采集），
+    使预测滤波和延迟统计仍然使用当前时钟，录制时的原始时间可通过 timestamps 查询
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        """
+        path: 录制文件路径
+        realtime: 是否按原始节奏回放
+        loop: 播放到结尾后是否从头开始
+        """
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header, index = _load_index(self._data)
+        self._offsets = index["offsets"]
+        self.timestamps = index["timestamps"]
+        self._detected = index["detected"]
+        self._centers = index["centers"]
+        self._bboxes = index["bboxes"]
+        self._has_result = index["has_result"]
+        self.frame_count = len(self._offsets)
+
+        self._lock = threading.Lock()
+        self._position = 0
+        self._grabbed = None         # grab() 选中、尚未 retrieve() 的帧序号
+        self._last_index = None
+        self._clock = None           # 实时回放：(起始的当前时间, 起始帧的录制时间)
+        self._refcount = 0           # 由 open_camera() 维护的引用计数
+
+        first = self._decode(0) if self.frame_count else None
+        self.height, self.width = first.shape[:2] if first is not None else (0, 0)
+        duration = self.timestamps[-1] - self.timestamps[0] if self.frame_count > 1 else 0
+        self.fps = (self.frame_count - 1) / duration if duration > 0 else 0.0
+
+    def _decode(self, index):
+        """解码第 index 帧"""
+        offset = int(self._offsets[index])
+        _, size = FRAME_HEADER.unpack_from(self._data, offset)
+        start = offset + FRAME_HEADER.size
+        encoded = np.frombuffer(self._data, dtype=np.uint8, count=size, offset=start)
+        return cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED)
+
+    def _next_index(self):
+        """选出下一帧的序号，实时回放时等待该帧到期；播放结束返回 None"""
+        if self._position >= self.frame_count:
+            if not self.loop or self.frame_count == 0:
+                return None
+            self._position = 0
+            self._clock = None
+
+        if not self.realtime:
+            index = self._position
+        else:
+            if self._clock is None:
+                self._clock = (time.time(), self.timestamps[self._position])
+            start_time, start_stamp = self._clock
+            # 等待下一帧到期，然后跳到已经到期的最新一帧
+            due = start_time + (self.timestamps[self._position] - start_stamp)
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            recorded_now = start_stamp + (time.time() - start_time)
+            index = int(np.searchsorted(self.timestamps, recorded_now, side="right")) - 1
+            index = min(max(index, self._position), self.frame_count - 1)
+
+        self._position = index + 1
+        return index
+
+    def _timestamp(self, index):
+        """第 index 帧返回给调用方的时间戳"""
+        if not self.realtime:
+            return time.time()
+        start_time, start_stamp = self._clock
+        return start_time + float(self.timestamps[index] - start_stamp)
+
+    def grab(self):
+        """选中下一帧（同 cv2.VideoCapture.grab）"""
+        with self._lock:
+            self._grabbed = self._next_index()
+            return self._grabbed is not None
+
+    def retrieve(self):
+        """解码 grab() 选中的帧（同 cv2.VideoCapture.retrieve）"""
+        with self._lock:
+            index, self._grabbed = self._grabbed, None
+            if index is None:
+                return False, None
+            self._last_index = index
+        return True, self._decode(index)
+
+    def read_timestamped(self, timeout=None):
+        """
+        读取下一帧
+        返回: (success, frame, timestamp)
+        """
+        with self._lock:
+            index = self._next_index()
+            if index is None:
+                return False, None, None
+            self._last_index = index
+            timestamp = self._timestamp(index)
+        return True, self._decode(index), timestamp
+
+    def read(self):
+        """与 cv2.VideoCapture.read() 兼容：返回 (success, frame)"""
+        success, frame, _ = self.read_timestamped()
+        return success, frame
+
+    def seek(self, index):
+        """跳转到第 index 帧（下一次读取返回该帧）"""
+        with self._lock:
+            self._position = min(max(int(index), 0), self.frame_count)
+            self._grabbed = None
+            self._clock = None
+
+    def recorded_result(self, index=None):
+        """
+        录制时该帧的嘴部检测结果
+        index: 帧序号，为 None 时取最近一次读取的帧
+        返回: (is_detected, center, bbox)，没有记录时返回 None
+        """
+        index = self._last_index if index is None else index
+        if index is None or not self._has_result[index]:
+            return None
+        if not self._detected[index]:
+            return False, None, None
+        center = tuple(float(v) for v in self._centers[index])
+        bbox = tuple(float(v) for v in self._bboxes[index])
+        return True, center, bbox
+
+    def isOpened(self):
+        """录制文件是否已打开"""
+        return self._data is not None
+
+    def get(self, prop_id):
+        """读取属性（支持尺寸、帧率、帧数和当前位置）"""
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._position)
+        if prop_id == cv2.CAP_PROP_POS_MSEC and self.frame_count:
+            index = min(self._position, self.frame_count - 1)
+            return float(self.timestamps[index] - self.timestamps[0]) * 1000.0
+        return 0.0
+
+    def set(self, prop_id, value):
+        """设置属性：只支持 CAP_PROP_POS_FRAMES（跳转），其他属性忽略"""
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            self.seek(value)
+            return True
+        return False
+
+    def release(self):
+        """释放一次引用，最后一个使用者释放时关闭文件"""
+        from camera_source import _sources, _sources_lock
+
+        with _sources_lock:
+            self._refcount = max(0, self._refcount - 1)
+            if self._refcount > 0:
+                return
+            if _sources.get(self.path) is self:
+                del _sources[self.path]
+        with self._lock:
+            if self._data is not None:
+                self._data.close()
+                self._file.close()
+                self._data = None
+
+def record(path, device=1, seconds=None, codec=".jpg", detect=True, show=True):
+    """
+    从摄像头录制，同时记录每一帧的嘴部检测结果
+    seconds: 录制时长，为 None 时直到按下 'q' 键（或 Ctrl+C）
+    """
+    from camera_source import open_camera, read_frame
+    from mouth_track import MouthDetector, draw_mouth_overlay
+
+    cap = open_camera(device)
+    detector = MouthDetector() if detect else None
+    start = time.time()
+    with FrameRecorder(path, codec=codec) as recorder:
+        try:
+            while cap.isOpened() and (seconds is None or time.time() - start < seconds):
+                success, frame, timestamp = read_frame(cap)
+                if not success:
+                    continue
+                result = None
+                if detector is not None:
+                    mouth = detector.find_mouth(frame)
+                    result = (False, None, None) if mouth is None else (True, mouth[1], mouth[2])
+                recorder.write(frame, timestamp, result)
+
+                if show:
+                    data = {"is_detected": bool(result and result[0]),
+                            "center": result[1] if result else None,
+                            "points": mouth[0] if detector is not None and mouth is not None else None}
+                    cv2.imshow("Recording", draw_mouth_overlay(frame, data))
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            cap.release()
+            if show:
+                cv2.destroyAllWindows()
+        print(f"已录制 {recorder.frame_count} 帧到 {path}")
+
+def main():
+    """命令行：录制摄像头，或查看录制文件信息"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="摄像头帧录制与回放")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="从摄像头录制")
+    record_parser.add_argument("path", help="录制文件路径")
+    record_parser.add_argument("--device", type=int, default=1, help="摄像头设备号")
+    record_parser.add_argument("--seconds", type=float, default=None, help="录制时长（秒）")
+    record_parser.add_argument("--codec", default=".jpg", choices=[".jpg", ".png"], help="图像编码格式")
+    record_parser.add_argument("--no-detect", action="store_true", help="不记录嘴部检测结果")
+    record_parser.add_argument("--no-show", action="store_true", help="不显示画面")
+
+    info_parser = subparsers.add_parser("info", help="查看录制文件信息")
+    info_parser.add_argument("path", help="录制文件路径")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.path, args.device, args.seconds, args.codec,
+               detect=not args.no_detect, show=not args.no_show)
+    else:
+        source = ReplaySource(args.path, realtime=False)
+        detected = int(source._detected.sum())
+        recorded = int(source._has_result.sum())
+        print(f"帧数: {source.frame_count}，分辨率: {source.width}x{source.height}，"
+              f"平均帧率: {source.fps:.1f}，编码: {source.header.get('codec')}")
+        print(f"检测结果: {recorded} 帧有记录，其中 {detected} 帧检测到嘴部")
+        source.release()
+
+if __name__ == "__main__":
+    main()
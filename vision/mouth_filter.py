@@ -0,0 +1,92 @@
+"""
+嘴部位置预测滤波器
+使用匀速模型的卡尔曼滤波器平滑嘴部中心，并可预测任意时刻的位置，
+让舵机控制以固定高频率运行，而不必等待较慢的FaceMesh检测
+"""
+
+import threading
+
+import numpy as np
+
+class MouthKalmanFilter:
+    """
+    嘴部中心的匀速模型卡尔曼滤波器
+    x、y 两轴使用相同的噪声参数，因此共用一个 2x2 协方差矩阵，状态为 [[px, py], [vx, vy]]
+    """
+
+    def __init__(self, process_noise=3000.0, measurement_noise=4.0, max_horizon=0.3):
+        """
+        process_noise: 加速度噪声谱密度（像素²/秒³），越大越相信新的测量、响应越快
+        measurement_noise: 测量噪声方差（像素²），越大输出越平滑
+        max_horizon: 最长外推时间（秒），超过后位置不再继续外推
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.max_horizon = max_horizon
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清除滤波状态（例如跟丢嘴部之后）"""
+        with self._lock:
+            self._state = None          # [[px, py], [vx, vy]]
+            self._cov = None            # 2x2 协方差
+            self._timestamp = None      # 最近一次测量的时间
+
+    @property
+    def initialized(self):
+        """是否已经收到过测量"""
+        return self._state is not None
+
+    @property
+    def last_update_time(self):
+        """最近一次测量的时间戳，未初始化时为 None"""
+        return self._timestamp
+
+    def update(self, center, timestamp):
+        """
+        输入一次嘴部中心测量
+        center: (x, y) 像素坐标
+        timestamp: 该帧的采集时间（秒，与 predict 使用同一时钟）
+        """
+        measurement = np.array(center, dtype=np.float64)
+
+        with self._lock:
+            if self._state is None:
+                self._state = np.array([measurement, [0.0, 0.0]])
+                self._cov = np.diag([self.measurement_noise, 1e4])
+                self._timestamp = timestamp
+                return
+
+            # 预测到测量时刻（乱序到达的测量按 dt=0 处理）
+            dt = max(timestamp - self._timestamp, 0.0)
+            transition = np.array([[1.0, dt], [0.0, 1.0]])
+            noise = self.process_noise * np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]])
+            state = transition @ self._state
+            cov = transition @ self._cov @ transition.T + noise
+
+            # 用测量值校正（观测矩阵 H = [1, 0]）
+            innovation = measurement - state[0]
+            gain = cov[:, 0] / (cov[0, 0] + self.measurement_noise)
+            self._state = state + np.outer(gain, innovation)
+            self._cov = cov - np.outer(gain, cov[0, :])
+            self._timestamp = max(timestamp, self._timestamp)
+
+    def predict(self, timestamp):
+        """
+        预测给定时刻的嘴部中心（不改变滤波状态）
+        返回: (x, y)，尚未初始化时返回 None
+        """
+        with self._lock:
+            if self._state is None:
+                return None
+            dt = min(max(timestamp - self._timestamp, 0.0), self.max_horizon)
+            position = self._state[0] + self._state[1] * dt
+        return float(position[0]), float(position[1])
+
+    def velocity(self):
+        """当前速度估计 (vx, vy)（像素/秒），尚未初始化时返回 None"""
+        with self._lock:
+            if self._state is None:
+                return None
+            return float(self._state[1][0]), float(self._state[1][1])
@@ -0,0 +1,330 @@
+"""
+多进程嘴部检测流水线
+采集到的帧写入 multiprocessing.shared_memory 环形缓冲区，一个或多个工作进程从中取帧运行嘴部检测，
+检测结果通过轻量队列返回主进程。MediaPipe推理不再与控制线程、界面线程和串口I/O争用同一个GIL。
+
+帧的来源有两种：
+- 独立采集进程（MouthPipeline(device=1)），适合单独运行；
+- 主进程调用 feed() 写入（RobotArmController 使用这种方式，摄像头仍由 CameraSource 共享）
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+class FrameRing:
+    """
+    共享内存帧环形缓冲区：slots 个固定尺寸的帧槽
+    每个槽有一个序号，写入过程中序号为 -1；读取方在拷贝前后比较序号，不一致说明该槽已被覆盖
+    """
+
+    def __init__(self, shm, shape, seqs, owner=False):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.slots = len(seqs)
+        self.seqs = seqs
+        self.owner = owner
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shape, slots):
+        """在当前进程创建缓冲区"""
+        size = int(np.prod(shape)) * slots
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        seqs = mp.Array('q', [-1] * slots, lock=False)
+        return cls(shm, shape, seqs, owner=True)
+
+    @classmethod
+    def attach(cls, name, shape, seqs):
+        """
+        在子进程中连接已创建的缓冲区
+        共享内存只由创建者释放：子进程连接时登记到 resource_tracker 的项立即注销，
+        否则子进程退出时 resource_tracker 会报告泄漏或提前释放主进程仍在使用的共享内存
+        """
+        try:
+            return cls(shared_memory.SharedMemory(name=name, track=False), shape, seqs)     # Python 3.13+
+        except TypeError:
+            pass
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, shape, seqs)
+
+    def write(self, frame, seq):
+        """把帧写入 seq 对应的槽，返回槽号"""
+        slot = seq % self.slots
+        self.seqs[slot] = -1
+        if frame.shape != self.shape:
+            frame = cv2.resize(frame, (self.shape[1], self.shape[0]))
+        self.frames[slot] = frame
+        self.seqs[slot] = seq
+        return slot
+
+    def read(self, slot, seq):
+        """读取槽中的帧副本，该槽已被新帧覆盖时返回 None"""
+        if self.seqs[slot] != seq:
+            return None
+        frame = self.frames[slot].copy()
+        if self.seqs[slot] != seq:
+            return None
+        return frame
+
+    def close(self):
+        """断开共享内存，创建者同时释放"""
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            # 子进程与主进程共用同一个 resource_tracker 时，子进程的注销也注销了创建者的登记；
+            # 释放前重新登记，使 unlink() 内部的注销与之配对
+            if os.name == "posix":
+                resource_tracker.register(self.shm._name, "shared_memory")
+            self.shm.unlink()
+
+def _submit(tasks, task):
+    """提交任务；队列已满时丢弃最旧的任务，保证工作进程总是处理最新的帧"""
+    while True:
+        try:
+            tasks.put_nowait(task)
+            return
+        except queue.Full:
+            try:
+                tasks.get_nowait()
+            except queue.Empty:
+                pass
+
+def _capture_main(device, ring_name, shape, seqs, tasks, stop_event):
+    """采集进程：读取摄像头并写入环形缓冲区"""
+    ring = FrameRing.attach(ring_name, shape, seqs)
+    cap = cv2.VideoCapture(device)
+    if shape[1] and shape[0]:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, shape[1])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, shape[0])
+
+    seq = 0
+    try:
+        while not stop_event.is_set():
+            success, frame = cap.read()
+            timestamp = time.time()
+            if not success:
+                print("采集进程读取视频帧失败")
+                break
+            slot = ring.write(frame, seq)
+            _submit(tasks, (slot, seq, timestamp))
+            seq += 1
+    finally:
+        cap.release()
+        ring.close()
+
+def _worker_main(worker_id, ring_name, shape, seqs, tasks, results, stop_event, detector_options):
+    """工作进程：从缓冲区取帧运行嘴部检测，结果放入结果队列"""
+    # 在子进程中导入，每个工作进程各自加载一个FaceMesh
+    from mouth_track import MouthDetector, MotionGate, get_face_mesh
+
+    ring = FrameRing.attach(ring_name, shape, seqs)
+    options = {
+        "inference_scale": detector_options.get("inference_scale", 1.0),
+        "motion_gate": MotionGate() if detector_options.get("motion_gate") else None,
+        "face_mesh": get_face_mesh(**detector_options.get("face_mesh_options", {})),
+    }
+    if detector_options.get("multi_face"):
+        from face_tracker import MultiFaceMouthDetector
+        detector = MultiFaceMouthDetector(select=detector_options.get("target_select", "center"),
+                                          detect_interval=detector_options.get("face_detect_interval", 5), **options)
+    else:
+        detector = MouthDetector(use_roi=detector_options.get("use_roi", True), **options)
+    try:
+        while not stop_event.is_set():
+            try:
+                task = tasks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            slot, seq, timestamp = task
+            frame = ring.read(slot, seq)
+            if frame is None:
+                continue  # 处理前已被新帧覆盖
+
+            start = time.time()
+            mouth = detector.find_mouth(frame)
+            result = {
+                "seq": seq,
+                "slot": slot,
+                "timestamp": timestamp,          # 帧采集时间
+                "is_detected": mouth is not None,
+                "center": None,
+                "bbox": None,
+                "points": None,
+                "image_size": (shape[1], shape[0]),
+                "worker": worker_id,
+                "inference_time": time.time() - start,
+            }
+            if mouth is not None:
+                result["points"], result["center"], result["bbox"] = mouth
+            results.put(result)
+    finally:
+        ring.close()
+
+class MouthPipeline:
+    """
+    多进程嘴部检测流水线
+    结果由主进程中的接收线程汇总，只保留序号最新的一条，也可通过 on_result 回调逐条处理
+    """
+
+    def __init__(self, workers=1, frame_shape=(480, 640, 3), slots=8, device=None,
+                 detector_options=None, on_result=None):
+        """
+        workers: 检测工作进程数
+        frame_shape: 帧尺寸 (高, 宽, 3)，尺寸不符的帧写入时会被缩放
+        slots: 环形缓冲区槽数，应大于工作进程数
+        device: 摄像头设备号；为 None 时不启动采集进程，由调用方通过 feed() 写入帧
+        detector_options: 传给工作进程中 MouthDetector 的参数
+                          (use_roi, inference_scale, motion_gate, face_mesh_options, multi_face, target_select,
+                           face_detect_interval)
+        on_result: 每收到一条检测结果时在接收线程中调用的回调
+        """
+        self.workers = workers
+        self.frame_shape = tuple(frame_shape)
+        self.slots = max(slots, workers + 2)
+        self.device = device
+        # 多个工作进程轮流处理相邻帧时，ROI跟踪和运动门控的状态不连续，只在单进程时启用
+        self.detector_options = detector_options or {"use_roi": workers == 1, "motion_gate": workers == 1}
+        self.on_result = on_result
+
+        self._ring = None
+        self._tasks = None
+        self._results = None
+        self._stop_event = None
+        self._processes = []
+        self._receiver = None
+        self._seq = 0
+        self._result_lock = threading.Lock()
+        self._latest_result = None
+        self.result_count = 0
+
+    def start(self):
+        """创建共享内存并启动各进程"""
+        if self._processes:
+            return
+
+        self._ring = FrameRing.create(self.frame_shape, self.slots)
+        self._tasks = mp.Queue(maxsize=self.workers * 2)
+        self._results = mp.Queue()
+        self._stop_event = mp.Event()
+        ring_args = (self._ring.shm.name, self.frame_shape, self._ring.seqs)
+
+        for worker_id in range(self.workers):
+            process = mp.Process(target=_worker_main, name=f"MouthWorker-{worker_id}", daemon=True,
+                                 args=(worker_id,) + ring_args + (self._tasks, self._results,
+                                                                  self._stop_event, self.detector_options))
+            process.start()
+            self._processes.append(process)
+
+        if self.device is not None:
+            process = mp.Process(target=_capture_main, name="MouthCapture", daemon=True,
+                                 args=(self.device,) + ring_args + (self._tasks, self._stop_event))
+            process.start()
+            self._processes.append(process)
+
+        self._receiver = threading.Thread(target=self._receive, name="MouthPipelineReceiver", daemon=True)
+        self._receiver.start()
+
+    def stop(self):
+        """停止所有进程并释放共享内存"""
+        if not self._processes:
+            return
+
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(2.0)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._receiver.join(1.0)
+        self._receiver = None
+
+        for q in (self._tasks, self._results):
+            q.cancel_join_thread()
+            q.close()
+        self._ring.close()
+        self._ring = None
+
+    def is_running(self):
+        """流水线是否在运行"""
+        return bool(self._processes)
+
+    def feed(self, frame, timestamp=None):
+        """
+        由主进程写入一帧（未启动采集进程时使用）
+        返回: 该帧的序号
+        """
+        seq = self._seq
+        self._seq += 1
+        slot = self._ring.write(frame, seq)
+        _submit(self._tasks, (slot, seq, time.time() if timestamp is None else timestamp))
+        return seq
+
+    def get_frame(self, result):
+        """取回某条检测结果对应的帧（已被覆盖时返回 None），用于显示"""
+        return self._ring.read(result["slot"], result["seq"])
+
+    def latest_result(self):
+        """最新的一条检测结果，尚无结果时返回 None"""
+        with self._result_lock:
+            return self._latest_result
+
+    def _receive(self):
+        """接收线程：汇总各工作进程的结果"""
+        while not self._stop_event.is_set():
+            try:
+                result = self._results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            with self._result_lock:
+                # 多个工作进程的结果可能乱序到达，丢弃比已有结果更旧的
+                if self._latest_result is not None and result["seq"] < self._latest_result["seq"]:
+                    continue
+                self._latest_result = result
+                self.result_count += 1
+
+            if self.on_result is not None:
+                self.on_result(result)
+
+def main():
+    """独立运行：采集进程 + 检测进程，打印检测频率和最新结果"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="多进程嘴部检测流水线")
+    parser.add_argument("--device", type=int, default=1, help="摄像头设备号")
+    parser.add_argument("--workers", type=int, default=2, help="检测工作进程数")
+    args = parser.parse_args()
+
+    pipeline = MouthPipeline(workers=args.workers, device=args.device)
+    pipeline.start()
+    try:
+        last_count = 0
+        while True:
+            time.sleep(1.0)
+            result = pipeline.latest_result()
+            rate = pipeline.result_count - last_count
+            last_count = pipeline.result_count
+            if result is None:
+                print(f"检测频率: {rate} 次/秒，尚无结果")
+            elif result["is_detected"]:
+                center = result["center"]
+                print(f"检测频率: {rate} 次/秒，嘴部中心: ({center[0]:.1f}, {center[1]:.1f}), "
+                      f"延迟: {(time.time() - result['timestamp']) * 1000:.0f} ms")
+            else:
+                print(f"检测频率: {rate} 次/秒，未检测到嘴部")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+
+if __name__ == "__main__":
+    main()
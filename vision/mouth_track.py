@@ -1,15 +1,15 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import sys
 import threading
+import time
 
-# 初始化 MediaPipe Face Mesh
+from camera_source import open_camera
+from settings import load_camera_settings
+
+# MediaPipe Face Mesh 模块（模型在首次使用时才创建，导入本模块不会加载模型）
 mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False,
-                                   max_num_faces=1,
-                                   refine_landmarks=True,
-                                   min_detection_confidence=0.5,
-                                   min_tracking_confidence=0.5)
 
 # 初始化绘图工具
 mp_drawing = mp.solutions.drawing_utils
@@ -18,156 +18,606 @@ mp_drawing_styles = mp.solutions.drawing_styles
 # 嘴部的关键点索引（基于官方468个点）
 MOUTH_LANDMARKS = list(set([i for pair in mp_face_mesh.FACEMESH_LIPS for i in pair]))
 
+# 预先计算的嘴部关键点索引数组，用于向量化提取
+MOUTH_LANDMARK_INDEX = np.array(MOUTH_LANDMARKS, dtype=np.intp)
+
+# 脸部外轮廓关键点索引，用于计算人脸外接框（ROI裁剪区域）
+FACE_OVAL_INDEX = np.array(sorted(set(i for pair in mp_face_mesh.FACEMESH_FACE_OVAL for i in pair)), dtype=np.intp)
+
+# 嘴唇连线（转换为 MOUTH_LANDMARKS 列表中的下标，用于根据 points 绘制轮廓）
+_MOUTH_INDEX = {idx: i for i, idx in enumerate(MOUTH_LANDMARKS)}
+LIP_CONNECTIONS = [(_MOUTH_INDEX[a], _MOUTH_INDEX[b]) for a, b in mp_face_mesh.FACEMESH_LIPS]
+
 # 创建全局容器存储嘴部特征点和中心点坐标
 mouth_data = {
     "center": (0, 0),           # 嘴部中心点
     "points": [],               # 所有嘴部特征点
     "frame_count": 0,           # 帧计数
     "is_detected": False,       # 是否检测到嘴部
-    "last_update_time": 0       # 最后更新时间
+    "last_update_time": 0,      # 最后更新时间
+    "image_size": (0, 0)        # 图像尺寸 (宽, 高)
 }
 
 # 添加线程锁以确保数据安全
 data_lock = threading.Lock()
 
+# FaceMesh 默认配置
+DEFAULT_FACE_MESH_OPTIONS = {
+    "static_image_mode": False,
+    "max_num_faces": 1,
+    "refine_landmarks": True,
+    "min_detection_confidence": 0.5,
+    "min_tracking_confidence": 0.5,
+}
+
+class SharedFaceMesh:
+    """
+    可在多个线程间共享的FaceMesh：模型在第一次 process 时才加载，
+    同一实例的 process 调用串行执行（MediaPipe 的计算图不支持并发调用）
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self._face_mesh = None
+        self._lock = threading.Lock()
+
+    def process(self, rgb_image):
+        """对RGB图像运行FaceMesh"""
+        with self._lock:
+            if self._face_mesh is None:
+                self._face_mesh = mp_face_mesh.FaceMesh(**self.options)
+            return self._face_mesh.process(rgb_image)
+
+    def reset(self):
+        """清除FaceMesh内部的跟踪状态（切换到不连续的画面时调用），下一帧重新做人脸检测"""
+        with self._lock:
+            if self._face_mesh is not None:
+                self._face_mesh.reset()
+
+# FaceMesh 检测器注册表：相同视频流、相同配置的检测器在整个进程中只创建一次
+_face_mesh_registry = {}
+_registry_lock = threading.Lock()
+
+def get_face_mesh(stream="default", **options):
+    """
+    获取共享的FaceMesh检测器，相同视频流和配置返回同一实例，模型在首次推理时才加载
+    跟踪模式（static_image_mode=False）的FaceMesh在两次调用之间保留关键点跟踪状态，
+    不同视频流（摄像头、裁剪区域、录像）的帧交替送入同一实例会互相破坏跟踪，因此每个视频流使用自己的实例；
+    只有处理同一个连续画面序列的使用者才应共享同一个 stream
+    stream: 视频流名称
+    options: 覆盖 DEFAULT_FACE_MESH_OPTIONS 中的参数
+    """
+    config = dict(DEFAULT_FACE_MESH_OPTIONS, **options)
+    key = (stream,) + tuple(sorted(config.items()))
+    with _registry_lock:
+        face_mesh = _face_mesh_registry.get(key)
+        if face_mesh is None:
+            face_mesh = SharedFaceMesh(**config)
+            _face_mesh_registry[key] = face_mesh
+        return face_mesh
+
 # 获取当前嘴部数据的函数（可从其他模块调用）
 def get_mouth_data():
     with data_lock:
         return mouth_data.copy()
 
-def detect_mouth_position(cap=None):
+def get_mouth_position():
+    """
+    读取跟踪器最新发布的嘴部位置，不会读取摄像头或进行推理
+    返回: (is_detected, mouth_center, image_center, offset_x, offset_y)，与 detect_mouth_position 相同
+    """
+    data = get_mouth_data()
+    img_w, img_h = data["image_size"]
+    if img_w == 0 or img_h == 0:
+        return False, None, None, 0, 0
+
+    image_center = (img_w // 2, img_h // 2)
+    if not data["is_detected"]:
+        return False, None, image_center, 0, 0
+
+    mouth_center = data["center"]
+    offset_x = mouth_center[0] - image_center[0]
+    offset_y = mouth_center[1] - image_center[1]
+    return True, mouth_center, image_center, offset_x, offset_y
+
+def landmarks_to_pixels(face_landmarks, img_w, img_h, index=MOUTH_LANDMARK_INDEX, offset=(0, 0)):
+    """
+    按索引取出关键点并转换为像素坐标（保留亚像素精度）
+    img_w, img_h: 送入FaceMesh的图像尺寸（裁剪图则为裁剪区域尺寸）
+    offset: 裁剪区域左上角在原图中的坐标，用于映射回原图坐标
+    返回: (N, 2) float32 数组
+    """
+    landmark = face_landmarks.landmark
+    coords = np.array([(landmark[i].x, landmark[i].y) for i in np.asarray(index).tolist()], dtype=np.float32)
+    coords *= np.array((img_w, img_h), dtype=np.float32)
+    if offset[0] or offset[1]:
+        coords += np.array(offset, dtype=np.float32)
+    return coords
+
+def mouth_geometry(mouth_points):
+    """
+    根据嘴部像素坐标计算中心点和外接框
+    返回: (mouth_center, mouth_bbox)
+    """
+    center = mouth_points.mean(axis=0)
+    top_left = mouth_points.min(axis=0)
+    bottom_right = mouth_points.max(axis=0)
+    mouth_center = (float(center[0]), float(center[1]))
+    mouth_bbox = (float(top_left[0]), float(top_left[1]), float(bottom_right[0]), float(bottom_right[1]))
+    return mouth_center, mouth_bbox
+
+def extract_mouth_points(face_landmarks, img_w, img_h, offset=(0, 0)):
+    """
+    从一张人脸的关键点中提取嘴部像素坐标
+    返回: (mouth_points, mouth_center, mouth_bbox)
+          mouth_points 为 (N, 2) float32 数组，mouth_center 为亚像素中心 (x, y)，
+          mouth_bbox 为 (x_min, y_min, x_max, y_max)
+    """
+    mouth_points = landmarks_to_pixels(face_landmarks, img_w, img_h, offset=offset)
+    mouth_center, mouth_bbox = mouth_geometry(mouth_points)
+    return mouth_points, mouth_center, mouth_bbox
+
+def to_pixel(point):
+    """将亚像素坐标四舍五入为绘图用的整数像素坐标"""
+    return int(round(point[0])), int(round(point[1]))
+
+def process_face(image, scale=1.0, face_mesh=None):
+    """
+    对图像运行FaceMesh
+    scale: 推理前的缩放比例。FaceMesh输出的是归一化坐标，按原图尺寸换算即可还原，无需额外处理
+    face_mesh: 使用的检测器，为 None 时使用 "default" 视频流的共享检测器
+    返回: 第一张人脸的关键点，未检测到时返回 None
+    """
+    if scale != 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    # 转换颜色空间 BGR -> RGB，获取面部网格结果
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if face_mesh is None:
+        face_mesh = get_face_mesh()
+    results = face_mesh.process(rgb_image)
+
+    if results.multi_face_landmarks:
+        return results.multi_face_landmarks[0]
+    return None
+
+def find_mouth(frame):
+    """
+    在给定图像上运行FaceMesh（整帧推理）并提取第一张人脸的嘴部
+    返回: (mouth_points, mouth_center, mouth_bbox)，未检测到时返回 None
+    """
+    face_landmarks = process_face(frame)
+    if face_landmarks is None:
+        return None
+
+    img_h, img_w = frame.shape[:2]
+    return extract_mouth_points(face_landmarks, img_w, img_h)
+
+class MotionGate:
+    """
+    运动门控：比较嘴部附近区域与上次检测时的灰度差异，
+    画面基本静止时跳过FaceMesh推理并复用上一次的结果，且至少每隔 max_interval 秒强制重新检测
+    """
+
+    def __init__(self, threshold=3.0, max_interval=0.5, margin=0.5, sample_size=32):
+        """
+        threshold: 区域内平均灰度差阈值（0-255），低于该值视为静止
+        max_interval: 两次完整检测之间的最长间隔（秒）
+        margin: 比较区域在嘴部外接框基础上向外扩展的比例
+        sample_size: 比较前将区域缩小到的边长（像素），越小越省时
+        """
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.margin = margin
+        self.sample_size = sample_size
+        self.total_frames = 0
+        self.skipped_frames = 0
+        self.reset()
+
+    def reset(self):
+        """清除参考区域，下一帧必定完整检测"""
+        self._region = None
+        self._reference = None
+        self._detect_time = 0.0
+
+    @property
+    def skip_ratio(self):
+        """跳过推理的帧数占比"""
+        if self.total_frames == 0:
+            return 0.0
+        return self.skipped_frames / self.total_frames
+
+    def _sample(self, frame, region):
+        """截取区域并缩小为灰度小图"""
+        x0, y0, x1, y1 = region
+        patch = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        return cv2.resize(patch, (self.sample_size, self.sample_size), interpolation=cv2.INTER_AREA)
+
+    def should_detect(self, frame, now=None):
+        """判断本帧是否需要重新运行FaceMesh（同时更新跳帧统计）"""
+        now = time.time() if now is None else now
+        self.total_frames += 1
+
+        if self._reference is None or now - self._detect_time >= self.max_interval:
+            return True
+
+        diff = cv2.absdiff(self._sample(frame, self._region), self._reference)
+        if float(diff.mean()) >= self.threshold:
+            return True
+
+        self.skipped_frames += 1
+        return False
+
+    def record(self, frame, mouth_bbox, now=None):
+        """完成一次检测后，以嘴部外接框附近区域作为新的参考"""
+        img_h, img_w = frame.shape[:2]
+        x0, y0, x1, y1 = mouth_bbox
+        pad_x = (x1 - x0) * self.margin
+        pad_y = (y1 - y0) * self.margin
+        region = (max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y)),
+                  min(img_w, int(x1 + pad_x) + 1), min(img_h, int(y1 + pad_y) + 1))
+        if region[2] - region[0] < 2 or region[3] - region[1] < 2:
+            self.reset()
+            return
+
+        self._region = region
+        self._reference = self._sample(frame, region)
+        self._detect_time = time.time() if now is None else now
+
+# 嘴部与脸部轮廓关键点合并后的索引，一次提取即可同时得到嘴部点和人脸框
+_TRACK_INDEX = np.concatenate([MOUTH_LANDMARK_INDEX, FACE_OVAL_INDEX])
+
+class MouthDetector:
     """
-    检测嘴部位置的函数，可以被其他模块调用
+    带ROI裁剪的嘴部检测器（每个视频流使用一个实例）
+    检测到人脸后，下一帧只在上一帧人脸框附近的区域内推理；
+    裁剪区域边距随测得的帧间运动自适应增大，跟丢时回退到整帧推理
+    """
+
+    def __init__(self, use_roi=True, roi_margin=0.2, motion_gain=2.0, min_roi_size=96, inference_scale=1.0,
+                 motion_gate=None, face_mesh=None):
+        """
+        use_roi: 是否启用ROI裁剪
+        roi_margin: 基础边距（相对人脸框长边的比例）
+        motion_gain: 运动补偿系数，边距额外增加 motion_gain * 平均帧间位移（像素）
+        min_roi_size: 裁剪区域的最小边长（像素）
+        inference_scale: 推理分辨率缩放比例，关键点仍按原始分辨率输出
+        motion_gate: 可选的 MotionGate，画面静止时复用上一次的检测结果
+        face_mesh: 使用的检测器（get_face_mesh 返回的共享实例），为 None 时创建本检测器专用的默认配置实例
+                   （FaceMesh 的跟踪状态属于一个视频流，不能与其他视频流的检测器共用）
+        """
+        self.use_roi = use_roi
+        self.inference_scale = inference_scale
+        self.motion_gate = motion_gate
+        self.face_mesh = face_mesh if face_mesh is not None else SharedFaceMesh(**DEFAULT_FACE_MESH_OPTIONS)
+        self.roi_margin = roi_margin
+        self.motion_gain = motion_gain
+        self.min_roi_size = min_roi_size
+        self.reset()
+
+    def reset(self):
+        """清除跟踪状态，下一帧使用整帧推理"""
+        self.face_box = None        # 上一帧人脸框 (x0, y0, x1, y1)，原图坐标
+        self.last_roi = None        # 上一帧实际使用的裁剪区域，None 表示整帧
+        self._last_center = None
+        self._motion = 0.0          # 平滑后的帧间位移（像素）
+        self._last_result = None    # 上一次检测结果，供运动门控复用
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+
+    def compute_roi(self, img_w, img_h):
+        """
+        根据上一帧人脸框和运动量计算本帧的裁剪区域
+        返回: (x0, y0, x1, y1)，无需裁剪时返回 None
+        """
+        if not self.use_roi or self.face_box is None:
+            return None
+
+        x0, y0, x1, y1 = self.face_box
+        half = max(x1 - x0, y1 - y0, self.min_roi_size) / 2
+        half += self.roi_margin * 2 * half + self.motion_gain * self._motion
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+
+        roi = (max(0, int(cx - half)), max(0, int(cy - half)),
+               min(img_w, int(cx + half) + 1), min(img_h, int(cy + half) + 1))
+
+        # 裁剪区域接近整帧时直接整帧推理
+        if (roi[2] - roi[0]) * (roi[3] - roi[1]) >= 0.8 * img_w * img_h:
+            return None
+        return roi
+
+    def find_mouth(self, frame):
+        """
+        检测嘴部，坐标均为原图坐标
+        返回: (mouth_points, mouth_center, mouth_bbox)，未检测到时返回 None
+        """
+        # 嘴部附近画面基本不变时直接复用上一次的结果
+        # 每一帧都经过运动门控（统计跳帧比例的分母包含所有帧）；没有上一次结果时门控也没有参考区域，必定检测
+        if (self.motion_gate is not None and not self.motion_gate.should_detect(frame)
+                and self._last_result is not None):
+            return self._last_result
+
+        img_h, img_w = frame.shape[:2]
+        roi = self.compute_roi(img_w, img_h)
+
+        coords = None
+        if roi is not None:
+            coords = self._run_face_mesh(frame, roi)
+            if coords is None:
+                # ROI内跟丢，回退到整帧推理
+                roi = None
+
+        if coords is None:
+            coords = self._run_face_mesh(frame, None)
+            if coords is None:
+                self.reset()
+                return None
+
+        return self._accept(frame, roi, coords)
+
+    def _run_face_mesh(self, frame, roi):
+        """
+        在裁剪区域（roi 为 None 时整帧）内运行FaceMesh
+        返回: 嘴部与脸部轮廓关键点的原图坐标（按 _TRACK_INDEX 顺序），未检测到时返回 None
+        """
+        if roi is None:
+            img_h, img_w = frame.shape[:2]
+            face_landmarks = process_face(frame, self.inference_scale, self.face_mesh)
+            offset, size = (0, 0), (img_w, img_h)
+        else:
+            x0, y0, x1, y1 = roi
+            face_landmarks = process_face(frame[y0:y1, x0:x1], self.inference_scale, self.face_mesh)
+            offset, size = (x0, y0), (x1 - x0, y1 - y0)
+
+        if face_landmarks is None:
+            return None
+        return landmarks_to_pixels(face_landmarks, size[0], size[1], _TRACK_INDEX, offset)
+
+    def _accept(self, frame, roi, coords):
+        """采用一次检测结果：计算嘴部几何、更新跟踪状态和运动门控"""
+        mouth_points = coords[:len(MOUTH_LANDMARK_INDEX)]
+        face_oval = coords[len(MOUTH_LANDMARK_INDEX):]
+        mouth_center, mouth_bbox = mouth_geometry(mouth_points)
+
+        self._update_track(face_oval, mouth_center)
+        self.last_roi = roi
+        self._last_result = (mouth_points, mouth_center, mouth_bbox)
+        if self.motion_gate is not None:
+            self.motion_gate.record(frame, mouth_bbox)
+        return self._last_result
+
+    def _update_track(self, face_oval, mouth_center):
+        """更新人脸框和帧间运动估计"""
+        top_left = face_oval.min(axis=0)
+        bottom_right = face_oval.max(axis=0)
+        self.face_box = (float(top_left[0]), float(top_left[1]), float(bottom_right[0]), float(bottom_right[1]))
+
+        if self._last_center is not None:
+            moved = np.hypot(mouth_center[0] - self._last_center[0], mouth_center[1] - self._last_center[1])
+            self._motion = 0.5 * self._motion + 0.5 * float(moved)
+        self._last_center = mouth_center
+
+def detect_mouth_in_frame(frame, detector=None):
+    """
+    在给定图像上检测嘴部位置（不读取摄像头），检测结果与传入的帧一一对应
+    detector: MouthDetector 实例，用于连续帧的ROI裁剪推理；为 None 时整帧推理
+    返回: (is_detected, mouth_center, image_center, offset_x, offset_y)
+    """
+    img_h, img_w = frame.shape[:2]
+    image_center = (img_w // 2, img_h // 2)
+
+    if detector is None:
+        mouth = find_mouth(frame)
+    else:
+        mouth = detector.find_mouth(frame)
+    if mouth is None:
+        return False, None, image_center, 0, 0
+
+    _, mouth_center, _ = mouth
+
+    # 计算偏移量
+    offset_x = mouth_center[0] - image_center[0]  # 正值表示向右偏移
+    offset_y = mouth_center[1] - image_center[1]  # 正值表示向下偏移
+
+    return True, mouth_center, image_center, offset_x, offset_y
+
+def detect_mouth_position(cap=None, detector=None):
+    """
+    检测嘴部位置的函数，可以被其他模块调用（读取一帧后调用 detect_mouth_in_frame）
+    detector: 可选的 MouthDetector 实例，对同一摄像头连续调用时启用ROI裁剪推理
     返回: (is_detected, mouth_center, image_center, offset_x, offset_y)
     """
     if cap is None:
-        cap = cv2.VideoCapture(1)
+        cap = open_camera(1)
         should_close = True
     else:
         should_close = False
-    
+
     try:
         success, frame = cap.read()
         if not success:
             return False, None, None, 0, 0
-        
-        img_h, img_w = frame.shape[:2]
-        image_center = (img_w // 2, img_h // 2)
-        
-        # 转换颜色空间
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # 检测面部
-        results = face_mesh.process(rgb_frame)
-        
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                # 收集嘴部关键点
-                mouth_points = []
-                for idx in MOUTH_LANDMARKS:
-                    pt = face_landmarks.landmark[idx]
-                    x, y = int(pt.x * img_w), int(pt.y * img_h)
-                    mouth_points.append((x, y))
-                
-                if mouth_points:
-                    # 计算嘴部中心点
-                    mouth_points_array = np.array(mouth_points)
-                    mouth_center_x = int(np.mean(mouth_points_array[:, 0]))
-                    mouth_center_y = int(np.mean(mouth_points_array[:, 1]))
-                    mouth_center = (mouth_center_x, mouth_center_y)
-                    
-                    # 计算偏移量
-                    offset_x = mouth_center_x - image_center[0]  # 正值表示向右偏移
-                    offset_y = mouth_center_y - image_center[1]  # 正值表示向下偏移
-                    
-                    return True, mouth_center, image_center, offset_x, offset_y
-        
-        return False, None, image_center, 0, 0
-    
+
+        return detect_mouth_in_frame(frame, detector)
+
     finally:
         if should_close and cap is not None:
             cap.release()
 
-# 打开摄像头
-cap = cv2.VideoCapture(1)
+class MouthTracker:
+    """
+    嘴部跟踪器：在后台线程中持续采集图像并进行FaceMesh推理，
+    检测结果发布到 mouth_data，其他模块通过 get_mouth_data() 读取
+    """
+
+    def __init__(self, camera_id=1, cap=None, detector=None):
+        """
+        camera_id: 摄像头设备号或录制文件路径（cap 为 None 时由跟踪器通过 open_camera 打开共享摄像头源）
+        cap: 外部传入的已打开摄像头，停止时不会被释放
+        detector: 使用的嘴部检测器（例如 face_tracker.MultiFaceMouthDetector），为 None 时使用 MouthDetector
+        """
+        self.camera_id = camera_id
+        self.cap = cap
+        self._own_cap = cap is None
+        self.detector = detector or MouthDetector(motion_gate=MotionGate())
+        self._thread = None
+        self._stop_event = threading.Event()
 
-while cap.isOpened():
-    success, frame = cap.read()
-    if not success:
-        print("读取视频帧失败")
-        break
+        # 最新一帧图像及其对应的检测数据
+        self._frame_lock = threading.Lock()
+        self._latest_frame = None
+        self._latest_data = None
 
-    # 转换颜色空间 BGR -> RGB
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def start(self):
+        """启动后台跟踪线程"""
+        if self.is_running():
+            return True
 
-    # 获取面部网格结果
-    results = face_mesh.process(rgb_frame)
+        if self.cap is None:
+            self.cap = open_camera(self.camera_id)
+        if not self.cap.isOpened():
+            print("摄像头未打开")
+            return False
 
-    # 更新检测状态
-    with data_lock:
-        mouth_data["is_detected"] = False
-        mouth_data["frame_count"] += 1
-        
-    if results.multi_face_landmarks:
-        for face_landmarks in results.multi_face_landmarks:
-            img_h, img_w, _ = frame.shape
-            
-            # 收集所有嘴部关键点的坐标
-            mouth_points = []
-            for idx in MOUTH_LANDMARKS:
-                pt = face_landmarks.landmark[idx]
-                x, y = int(pt.x * img_w), int(pt.y * img_h)
-                mouth_points.append((x, y))
-                cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)  # 在嘴部关键点画绿色小圆点
-            
-            # 计算嘴部中心点
-            if mouth_points:
-                mouth_points_array = np.array(mouth_points)
-                mouth_center_x = int(np.mean(mouth_points_array[:, 0]))
-                mouth_center_y = int(np.mean(mouth_points_array[:, 1]))
-                
-                # 标记嘴部中心点（红色）
-                cv2.circle(frame, (mouth_center_x, mouth_center_y), 5, (0, 0, 255), -1)
-                
-                # 显示中心点坐标
-                cv2.putText(frame, f"Center: ({mouth_center_x}, {mouth_center_y})", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                
-                # 更新全局数据容器
-                with data_lock:
-                    mouth_data["center"] = (mouth_center_x, mouth_center_y)
-                    mouth_data["points"] = mouth_points.copy()  # 使用copy以避免引用问题
-                    mouth_data["is_detected"] = True
+        self._stop_event.clear()
+        self.detector.reset()
+        self._thread = threading.Thread(target=self._run, name="MouthTracker", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=2.0):
+        """停止后台跟踪线程并释放自行打开的摄像头"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        if self._own_cap and self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def is_running(self):
+        """跟踪线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_latest(self):
+        """
+        获取最近处理的一帧图像及其检测数据
+        返回: (frame, data)，尚未处理任何帧时返回 (None, None)
+        """
+        with self._frame_lock:
+            if self._latest_frame is None:
+                return None, None
+            return self._latest_frame.copy(), self._latest_data
+
+    def _run(self):
+        """后台线程：采集 -> 推理 -> 发布"""
+        while not self._stop_event.is_set():
+            success, frame = self.cap.read()
+            if not success:
+                print("读取视频帧失败")
+                break
+
+            img_h, img_w = frame.shape[:2]
+
+            mouth_points = None
+            mouth = self.detector.find_mouth(frame)
+            if mouth is not None:
+                mouth_points, mouth_center, _ = mouth
+
+            # 在同一次加锁中更新全部字段，读取方不会看到中间状态
+            with data_lock:
+                mouth_data["frame_count"] += 1
+                mouth_data["image_size"] = (img_w, img_h)
+                mouth_data["is_detected"] = mouth_points is not None
+                if mouth_points is not None:
+                    # 发布的数据保持原来的格式：整数中心点和 (x, y) 整数元组列表
+                    mouth_data["center"] = tuple(int(v) for v in mouth_center)
+                    mouth_data["points"] = [tuple(p) for p in mouth_points.astype(int).tolist()]
                     mouth_data["last_update_time"] = cv2.getTickCount() / cv2.getTickFrequency()
-                
-                # 显示检测到的点数
-                cv2.putText(frame, f"Points: {len(mouth_points)}", 
-                           (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-            # 画完整嘴部区域轮廓
-            mp_drawing.draw_landmarks(
-                frame,
-                face_landmarks,
-                connections=mp_face_mesh.FACEMESH_LIPS,
-                landmark_drawing_spec=None,
-                connection_drawing_spec=mp_drawing.DrawingSpec(color=(0, 255, 255), thickness=1, circle_radius=1)
-            )
+                snapshot = mouth_data.copy()
+
+            with self._frame_lock:
+                self._latest_frame = frame
+                self._latest_data = snapshot
+
+def draw_mouth_overlay(frame, data):
+    """在图像上绘制嘴部关键点、轮廓、中心点和检测状态"""
+    if data["is_detected"]:
+        mouth_points = np.round(data["points"]).astype(np.int32).tolist()
+        center_x, center_y = data["center"]
+
+        # 画完整嘴部区域轮廓
+        for a, b in LIP_CONNECTIONS:
+            cv2.line(frame, tuple(mouth_points[a]), tuple(mouth_points[b]), (0, 255, 255), 1)
+
+        # 在嘴部关键点画绿色小圆点
+        for x, y in mouth_points:
+            cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
+
+        # 标记嘴部中心点（红色）
+        cv2.circle(frame, to_pixel(data["center"]), 5, (0, 0, 255), -1)
+
+        # 显示中心点坐标
+        cv2.putText(frame, f"Center: ({center_x:.1f}, {center_y:.1f})",
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+        # 显示检测到的点数
+        cv2.putText(frame, f"Points: {len(mouth_points)}",
+                   (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
     # 显示检测状态
-    status = "Detected" if mouth_data["is_detected"] else "Not Detected"
-    cv2.putText(frame, f"Status: {status}", 
+    status = "Detected" if data["is_detected"] else "Not Detected"
+    cv2.putText(frame, f"Status: {status}",
                (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+    return frame
+
+def main():
+    """
+    独立运行：启动跟踪器并显示实时检测画面（参数为录制文件路径时回放录制的画面）
+    config.ini [摄像头设置] 开启多人脸跟踪时使用 face_tracker.MultiFaceMouthDetector，按 't' 键切换喂食对象
+    """
+    settings = load_camera_settings()
+    detector = None
+    if settings["multi_face"]:
+        from face_tracker import MultiFaceMouthDetector, draw_face_tracks   # face_tracker 依赖本模块，在此处导入
+        detector = MultiFaceMouthDetector(select=settings["target_select"],
+                                          detect_interval=settings["face_detect_interval"],
+                                          motion_gate=MotionGate())
+        print("多人脸跟踪已开启，按 't' 键切换喂食对象")
 
-    cv2.imshow('Mouth Tracking', frame)
-    if cv2.waitKey(5) & 0xFF == 27:  # 按 Esc 退出
-        break
+    tracker = MouthTracker(camera_id=sys.argv[1] if len(sys.argv) > 1 else 1, detector=detector)
+    if not tracker.start():
+        return
+
+    try:
+        while tracker.is_running():
+            frame, data = tracker.get_latest()
+            if frame is not None:
+                if detector is not None:
+                    draw_face_tracks(frame, detector.tracks, detector.target_id)
+                cv2.imshow('Mouth Tracking', draw_mouth_overlay(frame, data))
+            key = cv2.waitKey(5) & 0xFF
+            if key == 27:  # 按 Esc 退出
+                break
+            if key == ord('t') and detector is not None:
+                if detector.lock_target():
+                    print(f"喂食对象已切换为 ID {detector.target_id}")
+    finally:
+        tracker.stop()
+        cv2.destroyAllWindows()
+        gate = tracker.detector.motion_gate
+        print(f"检测跳过比例: {gate.skip_ratio:.1%} ({gate.skipped_frames}/{gate.total_frames})")
 
-cap.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()
 
 # 示例：如何在其他地方使用这些数据
+# tracker = MouthTracker(camera_id=1)
+# tracker.start()
 # current_mouth_data = get_mouth_data()
 # if current_mouth_data["is_detected"]:
 #     center = current_mouth_data["center"]
 #     points = current_mouth_data["points"]
 #     # 进行其他处理...
+# tracker.stop()
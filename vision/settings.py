@@ -0,0 +1,51 @@
+"""
+读取 config.ini 配置文件
+"""
+
+import configparser
+import os
+
+# 默认配置文件路径（与本模块同目录）
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini")
+
+def load_config(path=CONFIG_PATH):
+    """读取配置文件，文件不存在时返回空配置"""
+    config = configparser.ConfigParser()
+    config.read(path, encoding="utf-8")
+    return config
+
+def load_camera_settings(path=CONFIG_PATH):
+    """读取 [摄像头设置] 段，缺失的项使用默认值"""
+    config = load_config(path)
+    if not config.has_section("摄像头设置"):
+        config.add_section("摄像头设置")
+    section = config["摄像头设置"]
+
+    return {
+        "device_id": section.getint("设备ID", fallback=1),
+        "detection_confidence": section.getfloat("检测置信度", fallback=0.5),
+        "tracking_confidence": section.getfloat("跟踪置信度", fallback=0.5),
+        "inference_scale": section.getfloat("推理缩放", fallback=1.0),
+        "replay_file": section.get("回放文件", fallback="").strip(),
+        "replay_realtime": section.getboolean("回放实时", fallback=True),
+        "record_file": section.get("录制文件", fallback="").strip(),
+        "multi_face": section.getboolean("多人脸跟踪", fallback=False),
+        "target_select": section.get("目标选择", fallback="center").strip(),
+        "face_detect_interval": section.getint("人脸检测间隔", fallback=5),
+        "pipeline_workers": section.getint("检测进程数", fallback=0),
+    }
+
+def load_stereo_settings(path=CONFIG_PATH):
+    """读取 [双目设置] 段，缺失的项使用默认值"""
+    config = load_config(path)
+    if not config.has_section("双目设置"):
+        config.add_section("双目设置")
+    section = config["双目设置"]
+
+    return {
+        "min_distance": section.getfloat("工作距离最小", fallback=200.0),
+        "max_distance": section.getfloat("工作距离最大", fallback=600.0),
+        "pyramid_levels": section.getint("金字塔层数", fallback=2),
+        "band_height": section.getint("条带高度", fallback=48),
+        "refine_margin": section.getint("细化余量", fallback=8),
+    }
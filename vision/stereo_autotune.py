@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+SGBM 参数自动调优
+在 stereo_images 数据集上随机搜索匹配模式、blockSize、numDisparities、P1/P2、uniquenessRatio 和斑点滤波参数，
+由进程池并行评估，每种配置统计：
+- 速度：每帧匹配耗时（各工作进程中 OpenCV 只用一个线程，配置之间的耗时可以直接比较）
+- 质量：有效视差比例、左右一致性（左图视差与右图视差相差不超过1像素的比例），
+        两者的乘积（既有效又通过左右一致性检查的像素比例）作为质量分数
+速度和质量的 Pareto 最优配置按耗时排序写入 JSON 文件，calculate_z.py --config 可以直接读取，
+stereo_bench.py --configs 也可以用它复测
+用法: python stereo_autotune.py [--trials 200] [--workers 4] [--output stereo_tuned.json]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import time
+
+import cv2
+import numpy as np
+
+from bench_common import git_revision
+from stereo_bench import IMAGE_DIR, baseline_config, engine_options, load_pairs, pyramid_config, working_range
+from stereo_depth import StereoDepthEngine
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stereo_tuned.json")
+
+# 搜索空间；P1/P2 以 img_channels * blockSize² 的倍数给出
+SEARCH_SPACE = {
+    "mode": ["hh", "sgbm", "3way", "bm"],
+    "block_size": [3, 5, 7, 9],
+    "num_disparities": [32, 64, 96, 128],
+    "p1_factor": [4, 8, 16],
+    "p2_factor": [16, 32, 64],
+    "uniqueness_ratio": [5, 10, 15],
+    "speckle_window_size": [0, 50, 100, 200],
+    "speckle_range": [1, 2, 32, 100],
+}
+
+# 工作进程中校正好的灰度图像对，由 _init_worker 准备
+_pairs = None
+
+def sample_configs(trials, seed=0, min_disparity=1, distance_range=None):
+    """
+    从搜索空间中不重复地随机抽取 trials 个配置
+    distance_range: 给出工作距离范围（毫米）时视差范围由它换算，不再搜索 numDisparities，并加入 pyramid 模式
+    """
+    rng = random.Random(seed)
+    space = dict(SEARCH_SPACE)
+    if distance_range is not None:
+        space["mode"] = space["mode"] + ["pyramid"]
+        space["num_disparities"] = [None]
+    configs, seen = [], set()
+    attempts = 0
+    while len(configs) < trials and attempts < trials * 20:
+        attempts += 1
+        choice = {name: rng.choice(values) for name, values in space.items()}
+        if choice["p2_factor"] <= choice["p1_factor"]:
+            continue    # SGBM 要求 P2 > P1
+        if choice["mode"] == "bm":
+            # 块匹配没有 P1/P2，块大小至少为5
+            choice["block_size"] = max(5, choice["block_size"])
+            choice["p1_factor"] = choice["p2_factor"] = None
+        key = tuple(sorted(choice.items()))
+        if key in seen:
+            continue
+        seen.add(key)
+        configs.append(make_config(choice, min_disparity, distance_range))
+    return configs
+
+def make_config(choice, min_disparity=1, distance_range=None):
+    """把搜索空间中的一个取值换算为 StereoDepthEngine 的参数"""
+    area = 3 * choice["block_size"] ** 2     # 与 create_matcher 的 img_channels=3 一致
+    config = {
+        "name": "{mode}-b{block_size}-n{num_disparities}-u{uniqueness_ratio}-s{speckle_window_size}/{speckle_range}"
+                .format(**choice),
+        "mode": choice["mode"],
+        "block_size": choice["block_size"],
+    }
+    if distance_range is not None:
+        config["name"] = config["name"].replace("-nNone", "")
+        config["distance_range"] = list(distance_range)
+    else:
+        config["num_disparities"] = choice["num_disparities"]
+        config["min_disparity"] = min_disparity
+    config.update({
+        "uniqueness_ratio": choice["uniqueness_ratio"],
+        "speckle_window_size": choice["speckle_window_size"],
+        "speckle_range": choice["speckle_range"],
+    })
+    if choice["p1_factor"] is not None:
+        config["name"] += f"-p{choice['p1_factor']}/{choice['p2_factor']}"
+        config["p1"] = choice["p1_factor"] * area
+        config["p2"] = choice["p2_factor"] * area
+    return config
+
+def lr_consistency(left_disparity, right_disparity, min_disparity, tolerance=1.0):
+    """
+    左右一致性检查：左图像素 x 的视差 d 对应右图像素 x-d，其右图视差应与 d 相差不超过 tolerance
+    返回: (有效视差比例, 有效视差中通过检查的比例)
+    """
+    height, width = left_disparity.shape
+    valid = left_disparity >= min_disparity * 16
+    count = int(np.count_nonzero(valid))
+    if count == 0:
+        return 0.0, 0.0
+    ys, xs = np.nonzero(valid)
+    d = left_disparity[ys, xs] / 16.0
+    xr = np.round(xs - d).astype(np.int32)
+    inside = xr >= 0
+    dr = right_disparity[ys[inside], xr[inside]] / 16.0
+    consistent = int(np.count_nonzero(np.abs(dr - d[inside]) <= tolerance))
+    return count / float(height * width), consistent / float(count)
+
+def right_disparity(matcher, left, right):
+    """右图视差：左右图像水平翻转并交换后匹配，再翻转回来"""
+    flipped = matcher.compute(np.ascontiguousarray(right[:, ::-1]), np.ascontiguousarray(left[:, ::-1]))
+    return flipped[:, ::-1]
+
+def _init_worker(image_dir, max_pairs):
+    """工作进程初始化：读取并校正数据集（所有配置共用同一份校正结果）"""
+    global _pairs
+    cv2.setNumThreads(1)
+    engine = StereoDepthEngine()
+    _pairs = []
+    for _, left, right in load_pairs(image_dir)[:max_pairs or None]:
+        left_rectified, right_rectified = engine.rectify(left, right)
+        _pairs.append((left_rectified.copy(), right_rectified.copy()))
+
+def evaluate(config):
+    """评估一种配置，返回得分字典"""
+    engine = StereoDepthEngine(**engine_options(config))
+    matcher, min_disparity = engine.matcher, engine.min_disparity
+
+    matcher.compute(*_pairs[0])     # 预热
+    times, valid, consistency = [], [], []
+    for left, right in _pairs:
+        start = time.perf_counter()
+        disparity = matcher.compute(left, right)
+        times.append((time.perf_counter() - start) * 1000)
+        fraction, consistent = lr_consistency(disparity, right_disparity(matcher, left, right), min_disparity)
+        valid.append(fraction)
+        consistency.append(consistent)
+
+    valid_fraction = float(np.mean(valid))
+    lr = float(np.mean(consistency))
+    return {
+        "name": config["name"],
+        "ms_per_frame": round(float(np.mean(times)), 3),
+        "valid_fraction": round(valid_fraction, 4),
+        "lr_consistency": round(lr, 4),
+        "quality": round(float(np.mean(np.multiply(valid, consistency))), 4),
+    }
+
+def pareto_front(scores):
+    """速度（越小越好）和质量（越大越好）的 Pareto 最优项，按耗时排序"""
+    front = []
+    best_quality = 0.0      # 没有任何可靠视差的配置不进入前沿
+    for score in sorted(scores, key=lambda s: (s["ms_per_frame"], -s["quality"])):
+        if score["quality"] > best_quality:
+            front.append(score)
+            best_quality = score["quality"]
+    return front
+
+def select_config(path, budget_ms=None):
+    """
+    从调优结果文件中选择一种配置（供 calculate_z.py 使用）
+    budget_ms: 每帧耗时上限，选择不超过上限的质量最高的配置；为 None 时选择质量最高的配置
+    返回: (配置字典, 得分字典)
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    scores = {score["name"]: score for score in data["scores"]}
+    candidates = [config for config in data["configs"]
+                  if budget_ms is None or scores[config["name"]]["ms_per_frame"] <= budget_ms]
+    if not candidates:
+        # 没有满足耗时上限的配置时使用最快的
+        candidates = [min(data["configs"], key=lambda c: scores[c["name"]]["ms_per_frame"])]
+    config = max(candidates, key=lambda c: scores[c["name"]]["quality"])
+    return config, scores[config["name"]]
+
+def main():
+    parser = argparse.ArgumentParser(description="SGBM 参数自动调优")
+    parser.add_argument("--images", default=IMAGE_DIR, help="包含 Left 和 Right 子目录的图像目录")
+    parser.add_argument("--trials", type=int, default=200, help="随机搜索的配置数")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="工作进程数")
+    parser.add_argument("--max-pairs", type=int, default=0, help="最多使用的图像对数（0 为全部）")
+    parser.add_argument("--min-disparity", type=int, default=1, help="搜索的配置使用的最小视差")
+    parser.add_argument("--working-range", action="store_true",
+                        help="视差范围由 config.ini 中的工作距离换算（数据集中的物体在工作距离内时使用）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Pareto 最优配置的输出文件")
+    args = parser.parse_args()
+
+    # calculate_z.py 的默认参数和 pyramid 模式一起参与比较
+    configs = [baseline_config(), pyramid_config()]
+    distance_range = working_range() if args.working_range else None
+    configs += sample_configs(args.trials, args.seed, args.min_disparity, distance_range)
+    print(f"评估 {len(configs)} 种配置，工作进程 {args.workers} 个")
+
+    scores = []
+    start = time.time()
+    with mp.Pool(args.workers, initializer=_init_worker, initargs=(args.images, args.max_pairs)) as pool:
+        for i, score in enumerate(pool.imap_unordered(evaluate, configs), 1):
+            scores.append(score)
+            print(f"[{i}/{len(configs)}] {score['name']}: {score['ms_per_frame']:.1f} ms, "
+                  f"有效 {score['valid_fraction']:.1%}, 一致 {score['lr_consistency']:.1%}, 质量 {score['quality']:.3f}")
+    print(f"用时 {time.time() - start:.1f} 秒")
+
+    front = pareto_front(scores)
+    by_name = {config["name"]: config for config in configs}
+    print(f"\nPareto 最优配置 {len(front)} 种:")
+    print(f"{'配置':<48} {'ms/帧':>8} {'有效视差':>8} {'左右一致':>8} {'质量':>7}")
+    for score in front:
+        print(f"{score['name']:<48} {score['ms_per_frame']:8.2f} {score['valid_fraction']:8.1%} "
+              f"{score['lr_consistency']:8.1%} {score['quality']:7.3f}")
+    for name in ("baseline", "pyramid-range"):
+        score = next(s for s in scores if s["name"] == name)
+        print(f"{name}: {score['ms_per_frame']:.2f} ms, 质量 {score['quality']:.3f}"
+              f"{'（在 Pareto 前沿上）' if score in front else ''}")
+
+    report = {
+        "revision": git_revision(),
+        "images": args.images,
+        "threads_per_worker": 1,
+        "configs": [by_name[score["name"]] for score in front],
+        "scores": front,
+        "baseline": [s for s in scores if s["name"] in ("baseline", "pyramid-range")],
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"结果已保存到 {args.output}")
+
+if __name__ == "__main__":
+    main()
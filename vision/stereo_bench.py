@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+双目深度基准测试
+读取 stereo_images/Left 和 stereo_images/Right 中成对的图像，用标定参数校正后，
+对每种视差计算配置统计：
+- 每帧耗时（校正、立体匹配分开统计）
+- 有效视差像素的比例
+- 内存峰值（在新进程中单独运行一遍，统计进程的 RSS 峰值，包含 OpenCV 内部分配的缓冲区；
+  各配置都包含同样的解释器、OpenCV 和数据集的占用，不支持的平台（Windows）上不统计）
+第一项配置 "baseline" 与 calculate_z.py 的默认参数相同，深度计算的任何改动都可以在固定的数据集上对比
+用法: python stereo_bench.py [--images stereo_images] [--configs configs.json] [--output result.json]
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:     # Windows 没有 resource 模块
+    resource = None
+
+from bench_common import git_revision
+from settings import load_stereo_settings
+from stereo_depth import StereoDepthEngine
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stereo_images")
+
+def load_pairs(directory=IMAGE_DIR):
+    """
+    读取 Left/left_XX.png 与 Right/right_XX.png 中编号相同的图像对
+    返回: [(编号, 左图, 右图)]
+    """
+    pairs = []
+    for left_path in sorted(glob.glob(os.path.join(directory, "Left", "left_*.png"))):
+        suffix = os.path.basename(left_path)[len("left_"):]
+        right_path = os.path.join(directory, "Right", "right_" + suffix)
+        left, right = cv2.imread(left_path), cv2.imread(right_path)
+        if left is None or right is None:
+            continue
+        pairs.append((os.path.splitext(suffix)[0], left, right))
+    return pairs
+
+def baseline_config():
+    """与 calculate_z.py 默认参数相同的配置（hh 模式，固定64视差）"""
+    return {"name": "baseline", "mode": "hh", "block_size": 3, "num_disparities": 64, "min_disparity": 1}
+
+def working_range():
+    """config.ini 中的工作距离范围（毫米）"""
+    settings = load_stereo_settings()
+    return [settings["min_distance"], settings["max_distance"]]
+
+def pyramid_config():
+    """与 calculate_z.py --mode pyramid --working-range 相同的配置"""
+    settings = load_stereo_settings()
+    return {
+        "name": "pyramid-range",
+        "mode": "pyramid",
+        "block_size": 3,
+        "distance_range": working_range(),
+        "levels": settings["pyramid_levels"],
+        "band_height": settings["band_height"],
+        "margin": settings["refine_margin"],
+    }
+
+def default_configs():
+    """默认测试的配置：baseline、pyramid 模式，以及工作距离范围内的各匹配模式"""
+    distance_range = working_range()
+    configs = [baseline_config(), pyramid_config()]
+    for mode in ("hh", "sgbm", "3way", "bm"):
+        configs.append({"name": f"{mode}-range", "mode": mode, "block_size": 3, "distance_range": distance_range})
+    return configs
+
+def engine_options(config):
+    """配置中传给 StereoDepthEngine 的参数（去掉 name）"""
+    options = {key: value for key, value in config.items() if key != "name"}
+    if options.get("distance_range") is not None:
+        options["distance_range"] = tuple(options["distance_range"])
+    return options
+
+def run_pairs(engine, pairs):
+    """
+    对所有图像对计算视差
+    返回: (每帧校正耗时(ms), 每帧匹配耗时(ms), 每帧有效视差比例)
+    """
+    rectify_ms, match_ms, valid = [], [], []
+    threshold = engine.min_disparity * 16
+    for _, left, right in pairs:
+        start = time.perf_counter()
+        engine.rectify(left, right)
+        rectified = time.perf_counter()
+        engine.matcher.compute(engine.left_rectified, engine.right_rectified, engine.disparity)
+        done = time.perf_counter()
+        rectify_ms.append((rectified - start) * 1000)
+        match_ms.append((done - rectified) * 1000)
+        valid.append(float(np.count_nonzero(engine.disparity >= threshold)) / engine.disparity.size)
+    return rectify_ms, match_ms, valid
+
+def _peak_rss(config, directory):
+    """在子进程中运行：读取数据集并用该配置处理一遍，返回本进程的 RSS 峰值（字节）"""
+    pairs = load_pairs(directory)
+    engine = StereoDepthEngine(**engine_options(config))
+    for _, left, right in pairs:
+        engine.rectify(left, right)
+        engine.matcher.compute(engine.left_rectified, engine.right_rectified, engine.disparity)
+    return peak_rss()
+
+def peak_rss():
+    """
+    本进程的 RSS 峰值（字节）
+    Linux 上读取 /proc/self/status 的 VmHWM：ru_maxrss 在 fork+exec 后沿用父进程的峰值，子进程中不能直接使用
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def measure_memory(config, directory=IMAGE_DIR):
+    """在新进程中单独运行一遍，返回 RSS 峰值（字节）；不支持的平台返回 None。计时的那几遍不受影响"""
+    if resource is None:
+        return None
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_peak_rss, (config, directory))
+
+def benchmark(config, pairs, repeat=3, directory=IMAGE_DIR):
+    """测试一种配置，返回统计结果；directory 为 pairs 所在的目录（统计内存时在子进程中重新读取）"""
+    engine = StereoDepthEngine(**engine_options(config))
+    run_pairs(engine, pairs[:1])    # 预热
+
+    rectify_ms, match_ms = [], []
+    for _ in range(repeat):
+        rect, match, valid = run_pairs(engine, pairs)
+        rectify_ms.extend(rect)
+        match_ms.extend(match)
+    total_ms = np.add(rectify_ms, match_ms)
+    peak_rss = measure_memory(config, directory)
+
+    return {
+        "name": config.get("name", engine.mode),
+        "config": config,
+        "disparity_range": [engine.min_disparity, engine.min_disparity + engine.num_disparities],
+        "frames": len(pairs),
+        "ms_per_frame": round(float(total_ms.mean()), 3),
+        "p90_ms": round(float(np.percentile(total_ms, 90)), 3),
+        "rectify_ms": round(float(np.mean(rectify_ms)), 3),
+        "match_ms": round(float(np.mean(match_ms)), 3),
+        "valid_fraction": round(float(np.mean(valid)), 4),
+        "peak_rss_mb": None if peak_rss is None else round(peak_rss / 1e6, 1),
+    }
+
+def load_configs(path):
+    """从 JSON 文件读取配置列表（[{...}] 或 {"configs": [...]}）"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    configs = data["configs"] if isinstance(data, dict) else data
+    for i, config in enumerate(configs):
+        config.setdefault("name", f"config-{i}")
+    return configs
+
+def main():
+    parser = argparse.ArgumentParser(description="双目深度基准测试")
+    parser.add_argument("--images", default=IMAGE_DIR, help="包含 Left 和 Right 子目录的图像目录")
+    parser.add_argument("--configs", help="配置列表 JSON 文件（默认测试 baseline 和各匹配模式）")
+    parser.add_argument("--repeat", type=int, default=3, help="每种配置重复遍历数据集的次数")
+    parser.add_argument("--output", help="结果 JSON 文件")
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.images)
+    if not pairs:
+        print(f"{args.images} 中没有成对的图像")
+        return
+    print(f"图像对: {len(pairs)}，尺寸: {pairs[0][1].shape[1]}x{pairs[0][1].shape[0]}")
+
+    configs = load_configs(args.configs) if args.configs else default_configs()
+    results = []
+    print(f"{'配置':<36} {'视差范围':>10} {'ms/帧':>8} {'P90 ms':>8} {'校正ms':>7} {'匹配ms':>8} {'有效视差':>8} {'RSS峰值MB':>10}")
+    for config in configs:
+        result = benchmark(config, pairs, args.repeat, args.images)
+        results.append(result)
+        low, high = result["disparity_range"]
+        rss = "-" if result["peak_rss_mb"] is None else f"{result['peak_rss_mb']:.1f}"
+        print(f"{result['name']:<36} {f'{low}-{high}':>10} {result['ms_per_frame']:8.2f} {result['p90_ms']:8.2f} "
+              f"{result['rectify_ms']:7.2f} {result['match_ms']:8.2f} {result['valid_fraction']:8.1%} "
+              f"{rss:>10}")
+
+    if args.output:
+        report = {"revision": git_revision(), "images": args.images, "pairs": len(pairs), "results": results}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"结果已保存到 {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+双目深度计算
+StereoDepthEngine 只创建一次立体匹配器，校正、视差、伪彩色和三维坐标的输出缓冲区在各帧之间复用；
+视差搜索范围可以由工作距离范围换算（disparity_range），"pyramid" 模式先在缩小的图像上匹配，
+再在全分辨率图像上按条带只搜索粗视差附近的窄范围（PyramidMatcher）；
+三维重投影使用按视差定点格式（×16）换算过的 Q 矩阵，不再需要对整幅 threeD 乘以 16，
+并且只对请求的像素计算（point_at/points_at），整幅点云只在调用 point_cloud() 时才计算；
+只需要嘴部距离时，mouth_depth() 只在嘴部附近的水平条带内做校正和立体匹配
+"""
+
+import cv2
+import numpy as np
+
+from stereo_rectify import load_rectification
+
+# 可选的匹配算法："bm" 为块匹配，"pyramid" 为由粗到细的 SGBM（见 PyramidMatcher），其余为 SGBM 的不同模式
+STEREO_MODES = {
+    "hh": cv2.STEREO_SGBM_MODE_HH,
+    "sgbm": cv2.STEREO_SGBM_MODE_SGBM,
+    "3way": cv2.STEREO_SGBM_MODE_SGBM_3WAY,
+    "bm": None,
+    "pyramid": None,
+}
+
+def disparity_range(Q, min_distance, max_distance):
+    """
+    工作距离范围（毫米）对应的视差搜索范围
+    Q: stereoRectify 得到的重投影矩阵（真实视差）
+    返回: (min_disparity, num_disparities)，num_disparities 向上取为16的倍数
+    """
+    Q = np.asarray(Q, dtype=np.float64)
+    # Z = Q[2,3] / (Q[3,2]*d + Q[3,3])  =>  d = (Q[2,3]/Z - Q[3,3]) / Q[3,2]
+    near, far = ((Q[2, 3] / z - Q[3, 3]) / Q[3, 2] for z in (min_distance, max_distance))
+    low, high = min(near, far), max(near, far)
+    min_disparity = max(0, int(np.floor(low)))
+    num_disparities = max(16, int(np.ceil((high - min_disparity + 1) / 16.0)) * 16)
+    return min_disparity, num_disparities
+
+def create_matcher(mode="hh", num_disparities=64, block_size=3, min_disparity=1, uniqueness_ratio=10,
+                   speckle_window_size=100, speckle_range=100, img_channels=3, p1=None, p2=None, **pyramid_options):
+    """
+    创建立体匹配器
+    mode: "hh"、"sgbm"、"3way"（SGBM）、"bm"（块匹配，速度最快，只支持灰度图，块大小至少为5）
+          或 "pyramid"（由粗到细的 SGBM，pyramid_options 见 PyramidMatcher）
+    num_disparities: 视差搜索范围，必须是16的倍数
+    p1, p2: SGBM 的视差平滑惩罚，为 None 时分别为 8 和 32 倍的 img_channels * block_size²
+    """
+    if mode not in STEREO_MODES:
+        raise ValueError(f"未知的匹配模式: {mode}，可选: {', '.join(STEREO_MODES)}")
+
+    if mode == "pyramid":
+        return PyramidMatcher(min_disparity, num_disparities, block_size=block_size,
+                              uniqueness_ratio=uniqueness_ratio, speckle_window_size=speckle_window_size,
+                              speckle_range=speckle_range, img_channels=img_channels, p1=p1, p2=p2,
+                              **pyramid_options)
+
+    if mode == "bm":
+        matcher = cv2.StereoBM_create(numDisparities=num_disparities, blockSize=max(5, block_size | 1))
+        matcher.setMinDisparity(min_disparity)
+        matcher.setUniquenessRatio(uniqueness_ratio)
+        matcher.setSpeckleWindowSize(speckle_window_size)
+        matcher.setSpeckleRange(speckle_range)
+        return matcher
+
+    return cv2.StereoSGBM_create(minDisparity=min_disparity,
+                                 numDisparities=num_disparities,
+                                 blockSize=block_size,
+                                 P1=8 * img_channels * block_size * block_size if p1 is None else p1,
+                                 P2=32 * img_channels * block_size * block_size if p2 is None else p2,
+                                 disp12MaxDiff=-1,
+                                 preFilterCap=1,
+                                 uniquenessRatio=uniqueness_ratio,
+                                 speckleWindowSize=speckle_window_size,
+                                 speckleRange=speckle_range,
+                                 mode=STEREO_MODES[mode])
+
+class PyramidMatcher:
+    """
+    由粗到细的立体匹配
+    先把左右图像缩小 2**levels 倍，在完整的视差范围内做 SGBM 得到粗视差；
+    再把全分辨率图像分成水平条带，每个条带只在粗视差（放大回原尺度）的分布范围加减 margin 内做 SGBM，
+    没有有效粗视差的条带（工作距离内没有物体）不再匹配，条带左右也只保留有粗视差的列。
+    SGBM 不会输出图像最左侧 min_disparity + num_disparities 列的视差，近距离时这一区域很宽，
+    所以粗匹配和细化时都在左侧补上这么宽的空白，再裁掉
+    提供与 cv2 匹配器相同的 compute(left, right, disparity=None) 接口，返回定点视差（×16），
+    无效像素为 (min_disparity - 1) * 16
+    """
+
+    _COARSE_GUARD = 4
+
+    def __init__(self, min_disparity, num_disparities, levels=2, band_height=48, margin=8, overlap=8,
+                 min_pixels=4, cluster_ratio=0.2, base_mode="hh", block_size=3, **options):
+        """
+        min_disparity, num_disparities: 全分辨率下的视差搜索范围（见 disparity_range）
+        levels: 金字塔层数，粗匹配的图像缩小 2**levels 倍
+        band_height: 细化条带的高度（像素）
+        margin: 细化时在粗视差范围两侧多搜索的视差（像素）
+        overlap: 条带上下多取的行数，减少条带边界处的匹配误差
+        min_pixels, cluster_ratio: 条带内粗视差直方图中，像素数不少于 min_pixels 且不少于最多区间的
+                                   cluster_ratio 倍的区间才参与细化
+        base_mode: 粗匹配和细化使用的 SGBM 模式
+        options: 其他匹配参数（同 create_matcher）
+        """
+        self.min_disparity = min_disparity
+        self.num_disparities = num_disparities
+        self.levels = levels
+        self.band_height = band_height
+        self.margin = margin
+        self.overlap = overlap
+        self.min_pixels = min_pixels
+        self.cluster_ratio = cluster_ratio
+        self.scale = 2 ** levels
+
+        # 粗匹配的搜索范围两侧各多出 _COARSE_GUARD 个像素：范围之外的物体（如远处的背景）的视差
+        # 会堆积在搜索范围的边界附近，只接受落在工作距离对应范围内的粗视差
+        self.coarse_low = min_disparity / self.scale * 16
+        self.coarse_high = (min_disparity + num_disparities) / self.scale * 16
+        coarse_min = max(0, min_disparity // self.scale - self._COARSE_GUARD)
+        coarse_max = -(-(min_disparity + num_disparities) // self.scale) + self._COARSE_GUARD
+        coarse_num = max(16, -(-(coarse_max - coarse_min) // 16) * 16)
+        self.coarse_min = coarse_min
+        self.coarse_num = coarse_num
+        self.coarse = create_matcher(base_mode, coarse_num, block_size, coarse_min, **options)
+        self.fine = create_matcher(base_mode, 16, block_size, min_disparity, **options)
+        self.invalid = (min_disparity - 1) * 16
+        self.bands = []      # 最近一次 compute 实际匹配的条带 (x0, y0, x1, y1, min_disparity, num_disparities)
+
+    def compute(self, left, right, disparity=None):
+        height, width = left.shape[:2]
+        if disparity is None:
+            disparity = np.empty((height, width), np.int16)
+        disparity.fill(self.invalid)
+        self.bands = []
+
+        # 粗匹配
+        size = (max(1, width // self.scale), max(1, height // self.scale))
+        coarse_left = cv2.resize(left, size, interpolation=cv2.INTER_AREA)
+        coarse_right = cv2.resize(right, size, interpolation=cv2.INTER_AREA)
+        coarse = self._match(self.coarse, coarse_left, coarse_right, self.coarse_min + self.coarse_num)
+        # 超出工作距离，或匹配点落在补出的空白中（超出右图）的视差无效
+        valid = ((coarse >= self.coarse_low) & (coarse < self.coarse_high)
+                 & (coarse <= np.arange(size[0], dtype=np.int32) * 16))
+        scale_x = width / size[0]
+        scale_y = height / size[1]
+        # 放大回原尺寸的粗视差（真实视差，无效处为0），用于检查细化结果
+        guide = cv2.resize(np.where(valid, coarse, 0).astype(np.float32) * (scale_x / 16.0), (width, height),
+                           interpolation=cv2.INTER_NEAREST)
+
+        full_min = self.min_disparity
+        full_max = self.min_disparity + self.num_disparities
+        for y0 in range(0, height, self.band_height):
+            y1 = min(height, y0 + self.band_height)
+            rows = slice(int(y0 / scale_y), max(int(y0 / scale_y) + 1, int(np.ceil(y1 / scale_y))))
+            band_valid = valid[rows]
+            if not band_valid.any():
+                continue
+
+            # 条带内粗视差（换算到全分辨率）的直方图，只保留像素较多的区间：
+            # 真实物体的视差集中在少数区间，误匹配则分散在整个搜索范围
+            band_coarse = coarse[rows].astype(np.float32) * (scale_x / 16.0)
+            values = band_coarse[band_valid]
+            bins = np.maximum(0, np.floor((values - full_min) / self.margin).astype(np.int32))
+            counts = np.bincount(bins)
+            keep = counts >= max(self.min_pixels, counts.max() * self.cluster_ratio)
+            if not keep.any():
+                continue
+            kept = np.nonzero(keep)[0]
+            low = full_min + kept[0] * self.margin
+            high = full_min + (kept[-1] + 1) * self.margin
+            band_min = int(np.clip(low - self.margin, full_min, full_max - 16))
+            band_num = max(16, int(np.ceil((min(high + self.margin, full_max) - band_min) / 16.0)) * 16)
+
+            # 只保留粗视差落在上述区间内的列；右图中的匹配点在左侧最多 band_min + band_num 处
+            in_range = band_valid & (band_coarse >= low) & (band_coarse < high)
+            columns = np.nonzero(in_range.any(axis=0))[0]
+            x0 = max(0, int(columns[0] * scale_x) - self.margin)
+            x1 = min(width, int((columns[-1] + 1) * scale_x) + self.margin)
+            rx0 = max(0, x0 - band_min - band_num)
+            py0 = max(0, y0 - self.overlap)
+            py1 = min(height, y1 + self.overlap)
+
+            self.fine.setMinDisparity(band_min)
+            self.fine.setNumDisparities(band_num)
+            band = self._match(self.fine, left[py0:py1, rx0:x1], right[py0:py1, rx0:x1],
+                               band_min + band_num - (x0 - rx0))
+            band = band[y0 - py0:y1 - py0, x0 - rx0:]
+            # 与粗视差相差超过 margin 的细化结果（多为搜索范围之外的物体被迫匹配到窄范围内）无效
+            consistent = np.abs(band / 16.0 - guide[y0:y1, x0:x1]) <= self.margin
+            band[(band < band_min * 16) | (band > np.arange(x0, x1, dtype=np.int32) * 16) | ~consistent] = self.invalid
+            disparity[y0:y1, x0:x1] = band
+            self.bands.append((x0, y0, x1, y1, band_min, band_num))
+        return disparity
+
+    @staticmethod
+    def _match(matcher, left, right, pad):
+        """在左侧补 pad 列空白后匹配，返回与输入同尺寸的视差"""
+        if pad <= 0:
+            return matcher.compute(np.ascontiguousarray(left), np.ascontiguousarray(right))
+        left = cv2.copyMakeBorder(left, 0, 0, pad, 0, cv2.BORDER_CONSTANT, value=0)
+        right = cv2.copyMakeBorder(right, 0, 0, pad, 0, cv2.BORDER_CONSTANT, value=0)
+        return matcher.compute(left, right)[:, pad:]
+
+def scaled_q(Q):
+    """
+    把 Q 换算为可以直接作用于 StereoSGBM/StereoBM 定点视差（真实视差×16）的矩阵：
+    视差只出现在 W = Q[3,2]*d + Q[3,3] 中，把 Q[3,2] 除以16即可，重投影结果直接是毫米
+    """
+    Q = np.array(Q, dtype=np.float64)
+    Q[3, 2] /= 16.0
+    return Q
+
+class StereoDepthEngine:
+    """
+    可复用的双目深度计算引擎（每个视频流一个实例，非线程安全）
+    compute() 和 point_cloud() 的返回值指向引擎内部的缓冲区，下一次计算时会被覆盖，需要保留时请复制
+    """
+
+    def __init__(self, mode="hh", num_disparities=64, block_size=3, min_disparity=1, rectification=None,
+                 distance_range=None, **matcher_options):
+        """
+        mode: 匹配算法，见 STEREO_MODES
+        num_disparities, block_size, min_disparity: 匹配参数（同 cv2.StereoSGBM_create）
+        rectification: stereo_rectify.load_rectification() 的结果，为 None 时使用默认标定
+        distance_range: 工作距离范围 (最近, 最远)（毫米），给出时由它换算 min_disparity 和 num_disparities
+        matcher_options: 其他匹配参数（uniqueness_ratio、speckle_window_size、speckle_range、p1、p2，
+                         pyramid 模式还可指定 levels、band_height、margin，见 PyramidMatcher）
+        """
+        self.rectification = rectification or load_rectification()
+        if distance_range is not None:
+            min_disparity, num_disparities = disparity_range(self.rectification.Q, *distance_range)
+        self.mode = mode
+        self.num_disparities = num_disparities
+        self.block_size = block_size
+        self.min_disparity = min_disparity
+        self.distance_range = distance_range
+        self.Q = scaled_q(self.rectification.Q)
+        self.matcher = create_matcher(mode, num_disparities, block_size, min_disparity, **matcher_options)
+
+        width, height = self.rectification.size
+        self.width, self.height = width, height
+        self._gray = (np.empty((height, width), np.uint8), np.empty((height, width), np.uint8))
+        self.left_rectified = np.empty((height, width), np.uint8)
+        self.right_rectified = np.empty((height, width), np.uint8)
+        self.disparity = np.empty((height, width), np.int16)      # 定点视差（×16）
+        self.points = np.empty((height, width, 3), np.float32)    # 三维坐标（毫米），point_cloud() 时才计算
+        self._points_valid = False
+        self._normalized = np.empty((height, width), np.uint8)
+        self._colored = np.empty((height, width, 3), np.uint8)
+
+    def split(self, frame):
+        """把左右拼接的双目画面（宽度为单目的两倍）分成左、右两幅"""
+        return frame[:self.height, :self.width], frame[:self.height, self.width:2 * self.width]
+
+    def rectify_image(self, image, side, gray, dst):
+        """
+        把单幅图像转为灰度并校正（不使用引擎的缓冲区，可在多个线程中同时调用）
+        side: 0 为左相机，1 为右相机
+        gray, dst: 灰度图和校正结果的输出缓冲区
+        """
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+        rect = self.rectification
+        if side == 0:
+            return cv2.remap(image, rect.left_map1, rect.left_map2, cv2.INTER_LINEAR, dst=dst)
+        return cv2.remap(image, rect.right_map1, rect.right_map2, cv2.INTER_LINEAR, dst=dst)
+
+    def rectify(self, left, right):
+        """转为灰度并校正，结果写入 left_rectified / right_rectified"""
+        self.rectify_image(left, 0, self._gray[0], self.left_rectified)
+        self.rectify_image(right, 1, self._gray[1], self.right_rectified)
+        return self.left_rectified, self.right_rectified
+
+    def compute_pair(self, left, right, reproject=False):
+        """
+        对一对左右图像计算视差（reproject=True 时同时计算整幅点云）
+        返回: (disparity, points)，disparity 为定点视差（×16），points 为三维坐标（毫米），reproject=False 时为 None
+        """
+        self.rectify(left, right)
+        self.matcher.compute(self.left_rectified, self.right_rectified, self.disparity)
+        self._points_valid = False
+        if not reproject:
+            return self.disparity, None
+        return self.disparity, self.point_cloud()
+
+    def compute(self, frame, reproject=False):
+        """对左右拼接的双目画面计算视差，返回值同 compute_pair"""
+        left, right = self.split(frame)
+        return self.compute_pair(left, right, reproject)
+
+    def load_disparity(self, disparity):
+        """载入在引擎之外计算的视差（如 stereo_pipeline），之后可调用 normalized/colorize/point_at 等"""
+        np.copyto(self.disparity, disparity)
+        self._points_valid = False
+        return self.disparity
+
+    def point_cloud(self):
+        """最近一次视差的整幅三维坐标（毫米），同一帧只计算一次；无效视差处 Z 为 10000"""
+        if not self._points_valid:
+            cv2.reprojectImageTo3D(self.disparity, self.Q, self.points, handleMissingValues=True)
+            self._points_valid = True
+        return self.points
+
+    def points_at(self, pixels, radius=0):
+        """
+        只对给定像素计算三维坐标（校正后左图坐标）
+        pixels: (N, 2) 像素坐标
+        radius: 大于0时取 (2*radius+1)² 邻域内有效视差的中位数，减少空洞和噪声的影响
+        返回: (N, 3) float64 三维坐标（毫米），没有有效视差的点为 NaN
+        """
+        pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+        xs = np.clip(np.round(pixels[:, 0]).astype(int), 0, self.width - 1)
+        ys = np.clip(np.round(pixels[:, 1]).astype(int), 0, self.height - 1)
+        invalid = self.min_disparity * 16
+
+        if radius <= 0:
+            disparity = self.disparity[ys, xs].astype(np.float64)
+            disparity[disparity < invalid] = np.nan
+        else:
+            disparity = np.full(len(pixels), np.nan)
+            for i, (x, y) in enumerate(zip(xs, ys)):
+                window = self.disparity[max(0, y - radius):y + radius + 1, max(0, x - radius):x + radius + 1]
+                values = window[window >= invalid]
+                if values.size:
+                    disparity[i] = np.median(values)
+
+        homogeneous = np.column_stack([pixels, disparity, np.ones(len(pixels))]) @ self.Q.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return homogeneous[:, :3] / homogeneous[:, 3:]
+
+    def point_at(self, x, y, radius=2):
+        """
+        单个像素的三维坐标（毫米），见 points_at
+        返回: (X, Y, Z)，没有有效视差时返回 None
+        """
+        point = self.points_at([(x, y)], radius)[0]
+        if not np.all(np.isfinite(point)):
+            return None
+        return float(point[0]), float(point[1]), float(point[2])
+
+    def normalized(self):
+        """把最近一次的视差归一化为 0-255 灰度图（复用缓冲区）"""
+        return cv2.normalize(self.disparity, self._normalized, alpha=0, beta=255,
+                             norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+
+    def colorize(self, colormap=cv2.COLORMAP_JET):
+        """最近一次视差的伪彩色图（复用缓冲区）"""
+        return cv2.applyColorMap(self.normalized(), colormap, dst=self._colored)
+
+    def band_bounds(self, rectified_points, margin=8):
+        """
+        计算包含嘴部的匹配条带 (x0, y0, x1, y1)（校正后左图坐标）
+        左侧按视差搜索范围加宽，使条带内嘴部的每个像素都能搜索完整的视差范围
+        """
+        x_min, y_min = np.floor(rectified_points.min(axis=0)).astype(int)
+        x_max, y_max = np.ceil(rectified_points.max(axis=0)).astype(int)
+        pad = margin + self.block_size // 2
+        x0 = max(0, x_min - pad - self.min_disparity - self.num_disparities)
+        x1 = min(self.width, x_max + pad + 1)
+        y0 = max(0, y_min - pad)
+        y1 = min(self.height, y_max + pad + 1)
+        if x1 - x0 <= self.num_disparities or y1 - y0 < self.block_size:
+            return None
+        return x0, y0, x1, y1
+
+    def mouth_depth(self, frame, mouth_points, margin=8):
+        """
+        只在嘴部附近的水平条带内计算视差，得到嘴部的三维位置
+        frame: 左右拼接的双目画面
+        mouth_points: 左相机原始图像上的嘴部关键点（mouth_track 的 points）
+        返回: {"z": 嘴部多边形内有效视差对应深度的中位数（毫米）, "position": 嘴部中心的 (X, Y, Z)（毫米）,
+               "valid": 有效视差像素数, "band": 条带区域}，条带无效或没有有效视差时返回 None
+        """
+        rect = self.rectification
+        points = rect.rectify_points(mouth_points)
+        band = self.band_bounds(points, margin)
+        if band is None:
+            return None
+        x0, y0, x1, y1 = band
+
+        # 只对条带做校正：映射表的子区域直接给出条带内每个像素在原图中的位置
+        left, right = self.split(frame)
+        left_band = cv2.remap(left, np.ascontiguousarray(rect.left_map1[y0:y1, x0:x1]),
+                              np.ascontiguousarray(rect.left_map2[y0:y1, x0:x1]), cv2.INTER_LINEAR)
+        right_band = cv2.remap(right, np.ascontiguousarray(rect.right_map1[y0:y1, x0:x1]),
+                               np.ascontiguousarray(rect.right_map2[y0:y1, x0:x1]), cv2.INTER_LINEAR)
+        if left_band.ndim == 3:
+            left_band = cv2.cvtColor(left_band, cv2.COLOR_BGR2GRAY)
+            right_band = cv2.cvtColor(right_band, cv2.COLOR_BGR2GRAY)
+        disparity = self.matcher.compute(left_band, right_band)
+
+        # 嘴部多边形（关键点凸包）内的有效视差
+        mask = np.zeros(disparity.shape, np.uint8)
+        hull = cv2.convexHull(np.round(points - (x0, y0)).astype(np.int32))
+        cv2.fillConvexPoly(mask, hull, 1)
+        values = disparity[(mask > 0) & (disparity >= self.min_disparity * 16)]
+        if values.size == 0:
+            return None
+
+        # Z = Q[2,3] / (Q[3,2]*d + Q[3,3])，随视差单调变化，取视差中位数即得深度中位数
+        d = float(np.median(values))
+        cx, cy = points.mean(axis=0)
+        X, Y, Z, W = self.Q @ np.array([cx, cy, d, 1.0])
+        return {
+            "z": float(Z / W),
+            "position": (float(X / W), float(Y / W), float(Z / W)),
+            "valid": int(values.size),
+            "band": band,
+        }
@@ -0,0 +1,313 @@
+"""
+双目深度流水线
+把 calculate_z.py 逐帧串行的循环拆成几个阶段：
+    采集 → 灰度转换和校正（左右两幅并行）→ 立体匹配 → 显示
+相邻阶段之间用有界队列连接，第 N 帧做立体匹配的同时第 N+1 帧已经在校正。
+OpenCV 的计算会释放 GIL，各阶段使用线程即可利用多核。
+每帧的中间结果放在预先分配的帧槽中循环使用，帧槽数量同时限制了流水线中同时存在的帧数；
+显示阶段在调用方线程（主线程）中进行：get() 取出一帧，显示完后 release() 归还帧槽
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+STAGE_NAMES = ("capture", "rectify", "disparity", "display")
+
+# 各流水线级数下，采集、校正、匹配三个阶段如何分配到线程（显示始终在调用方线程）
+#   1: 不使用线程，get() 中依次完成（与原来的串行循环相同）
+#   2: 一个线程完成采集、校正和匹配
+#   3: 采集线程 + 校正和匹配线程
+#   4: 采集、校正、匹配各一个线程
+_STAGE_GROUPS = {
+    1: (),
+    2: (("capture", "rectify", "disparity"),),
+    3: (("capture",), ("rectify", "disparity")),
+    4: (("capture",), ("rectify",), ("disparity",)),
+}
+
+class StereoFrame:
+    """帧槽：流水线中一帧的全部缓冲区"""
+
+    def __init__(self, width, height):
+        self.index = -1
+        self.frame = None
+        self.timestamp = 0.0                # 采集时间 (time.time())
+        self.gray = (np.empty((height, width), np.uint8), np.empty((height, width), np.uint8))
+        self.left_rectified = np.empty((height, width), np.uint8)
+        self.right_rectified = np.empty((height, width), np.uint8)
+        self.disparity = np.empty((height, width), np.int16)
+        self.timings = {}                   # 阶段名 -> 耗时（秒）
+        self._started = 0.0                 # 开始采集的时间 (perf_counter)
+        self._delivered = 0.0               # get() 返回的时间 (perf_counter)
+
+class StageTimer:
+    """各阶段耗时统计（最近 window 帧）"""
+
+    def __init__(self, window=100):
+        self.window = window
+        self._samples = {name: deque(maxlen=window) for name in STAGE_NAMES + ("latency",)}
+        self._done = deque(maxlen=window)   # 各帧完成时间，用于计算帧率
+
+    def add(self, name, seconds):
+        self._samples[name].append(seconds)
+
+    def frame_done(self, now):
+        self._done.append(now)
+
+    def summary(self):
+        """
+        返回: {阶段名: {"mean_ms", "max_ms"}, "latency": {...}, "fps": 输出帧率}
+        latency 为从开始采集到显示完成的时间
+        """
+        result = {}
+        for name, samples in self._samples.items():
+            if samples:
+                values = np.array(samples) * 1000.0
+                result[name] = {"mean_ms": float(values.mean()), "max_ms": float(values.max())}
+        if len(self._done) > 1:
+            result["fps"] = (len(self._done) - 1) / max(self._done[-1] - self._done[0], 1e-6)
+        else:
+            result["fps"] = 0.0
+        return result
+
+    def format(self):
+        """单行文字形式的统计结果"""
+        summary = self.summary()
+        parts = [f"{name} {summary[name]['mean_ms']:.1f} ms" for name in STAGE_NAMES if name in summary]
+        if "latency" in summary:
+            parts.append(f"延迟 {summary['latency']['mean_ms']:.0f} ms")
+        parts.append(f"{summary['fps']:.1f} fps")
+        return " | ".join(parts)
+
+class StereoPipeline:
+    """
+    多线程双目深度流水线
+    用法:
+        pipeline = StereoPipeline(engine, capture)
+        pipeline.start()
+        while True:
+            item = pipeline.get()        # StereoFrame，视频结束时为 None
+            if item is None:
+                break
+            ...                          # 显示 item.frame / item.disparity
+            pipeline.release(item)
+        pipeline.stop()
+    """
+
+    def __init__(self, engine, capture, stages=4, queue_depth=1, parallel_rectify=True, drop_frames=True,
+                 timing_window=100):
+        """
+        engine: StereoDepthEngine，提供校正映射表和立体匹配器（匹配器只在匹配阶段使用）
+        capture: 左右拼接画面的视频源（cv2.VideoCapture 兼容对象）
+        stages: 流水线级数 1-4，见 _STAGE_GROUPS
+        queue_depth: 相邻阶段之间队列的容量（越大越能吸收各阶段耗时的波动，但延迟也越大）
+        parallel_rectify: 左右两幅图像的灰度转换和校正是否在两个线程中同时进行
+        drop_frames: 采集阶段的输出队列已满时是否丢弃最旧的帧（实时摄像头）；
+                     为 False 时采集阶段等待，每一帧都会被处理（回放录像）
+        timing_window: 统计耗时的帧数
+        """
+        if stages not in _STAGE_GROUPS:
+            raise ValueError(f"流水线级数必须是 {min(_STAGE_GROUPS)}-{max(_STAGE_GROUPS)}")
+        self.engine = engine
+        self.capture = capture
+        self.stages = stages
+        self.queue_depth = max(1, queue_depth)
+        self.parallel_rectify = parallel_rectify
+        self.drop_frames = drop_frames
+        self.timer = StageTimer(timing_window)
+
+        groups = _STAGE_GROUPS[stages]
+        # 帧槽数：每个队列装满 + 每个线程各处理一帧 + 调用方持有一帧
+        slot_count = len(groups) * self.queue_depth + len(groups) + 1
+        self._free = queue.Queue()
+        for _ in range(slot_count):
+            self._free.put(StereoFrame(engine.width, engine.height))
+
+        self._stop_event = threading.Event()
+        self._queues = []
+        self._threads = []
+        self._executor = None
+        self._index = 0
+        self._finished = False
+
+    def start(self):
+        """启动各阶段线程"""
+        self._ensure_executor()
+        if self._threads:
+            return
+        self._stop_event.clear()
+        if self.stages == 1:
+            return
+
+        groups = _STAGE_GROUPS[self.stages]
+        self._queues = [queue.Queue(maxsize=self.queue_depth) for _ in groups]
+        for i, group in enumerate(groups):
+            source = self._queues[i - 1] if i > 0 else None
+            thread = threading.Thread(target=self._run_group, args=(group, source, self._queues[i], i == 0),
+                                      name=f"StereoStage-{'+'.join(group)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """停止各阶段线程（不释放视频源）"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(2.0)
+        self._threads = []
+        self._queues = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get(self, timeout=None):
+        """
+        取出下一帧已计算视差的结果，视频源结束或流水线已停止时返回 None
+        返回的帧槽在 release() 之前不会被复用
+        """
+        if self._finished or self._stop_event.is_set():
+            return None
+
+        if self.stages == 1:
+            # 调用方持有的帧槽全部未释放时，最多等待 timeout 秒
+            try:
+                item = self._free.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            if not self._process(item, STAGE_NAMES[:3]):
+                self._free.put(item)
+                self._finished = True
+                return None
+        else:
+            # stop() 会清空队列列表，先取出结果队列的引用；未启动或已停止时没有结果
+            if not self._queues:
+                return None
+            results = self._queues[-1]
+            deadline = None if timeout is None else time.perf_counter() + timeout
+            while True:
+                if self._stop_event.is_set() and results.empty():
+                    return None
+                try:
+                    item = results.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        return None
+            if item is None:
+                self._finished = True
+                return None
+
+        item._delivered = time.perf_counter()
+        return item
+
+    def release(self, item):
+        """显示完成后归还帧槽，并记录显示阶段耗时和端到端延迟"""
+        now = time.perf_counter()
+        self.timer.add("display", now - item._delivered)
+        for name, seconds in item.timings.items():
+            self.timer.add(name, seconds)
+        self.timer.add("latency", now - item._started)
+        self.timer.frame_done(now)
+        item.frame = None
+        self._free.put(item)
+
+    def timings(self):
+        """各阶段耗时统计，见 StageTimer.summary"""
+        return self.timer.summary()
+
+    def _ensure_executor(self):
+        if self.parallel_rectify and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="StereoRectify")
+
+    # ------------------------------------------各阶段------------------------------------------
+
+    def _capture(self, item):
+        """采集一帧，视频源结束时返回 False"""
+        success, frame = self.capture.read()
+        if not success:
+            return False
+        item.frame = frame
+        item.timestamp = time.time()
+        item.index = self._index
+        self._index += 1
+        return True
+
+    def _rectify(self, item):
+        """左右两幅图像的灰度转换和校正，parallel_rectify 时左图交给辅助线程"""
+        left, right = self.engine.split(item.frame)
+        engine = self.engine
+        if self._executor is not None:
+            future = self._executor.submit(engine.rectify_image, left, 0, item.gray[0], item.left_rectified)
+            engine.rectify_image(right, 1, item.gray[1], item.right_rectified)
+            future.result()
+        else:
+            engine.rectify_image(left, 0, item.gray[0], item.left_rectified)
+            engine.rectify_image(right, 1, item.gray[1], item.right_rectified)
+        return True
+
+    def _disparity(self, item):
+        """立体匹配"""
+        self.engine.matcher.compute(item.left_rectified, item.right_rectified, item.disparity)
+        return True
+
+    def _process(self, item, names):
+        """在当前线程依次执行若干阶段，并记录各阶段耗时"""
+        for name in names:
+            start = time.perf_counter()
+            if name == "capture":
+                item.timings = {}
+                item._started = start
+            if not getattr(self, "_" + name)(item):
+                return False
+            item.timings[name] = time.perf_counter() - start
+        return True
+
+    # ------------------------------------------线程------------------------------------------
+
+    def _put(self, target, item, drop_oldest):
+        """放入下一阶段的队列；drop_oldest 时队列已满则丢弃最旧的帧，否则等待"""
+        while not self._stop_event.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if not drop_oldest:
+                    continue
+                try:
+                    dropped = target.get_nowait()
+                except queue.Empty:
+                    continue
+                if dropped is not None:
+                    dropped.frame = None
+                    self._free.put(dropped)
+        return False
+
+    def _take(self, source):
+        """从上一阶段的队列或空闲帧槽中取出一帧，流水线停止时返回 False"""
+        while not self._stop_event.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return False
+
+    def _run_group(self, names, source, target, first):
+        """阶段线程：取帧、执行本线程负责的阶段、交给下一阶段；视频源结束时向下游传递 None"""
+        drop_oldest = first and self.drop_frames
+        while not self._stop_event.is_set():
+            item = self._take(self._free if first else source)
+            if item is False:
+                return
+            if item is None:
+                self._put(target, None, False)
+                return
+            if not self._process(item, names):
+                self._free.put(item)
+                self._put(target, None, False)
+                return
+            if not self._put(target, item, drop_oldest):
+                return
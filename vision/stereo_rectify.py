@@ -0,0 +1,164 @@
+"""
+双目校正映射表缓存
+双目相机的标定参数集中保存在这里，cv2.stereoRectify 和 cv2.initUndistortRectifyMap 的结果按
+“标定参数 + 图像尺寸”的哈希值缓存为 .npy 文件，之后的运行直接以内存映射方式读取，
+calculate_z.py、equip.py 等模块使用同一份映射表
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+# 缓存目录（与本模块同目录）
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rectify_cache")
+
+# 缓存格式版本，映射表的计算方式改变时加一使旧缓存失效
+_CACHE_VERSION = 1
+
+# -----------------------------------双目相机的基本参数---------------------------------------------------------
+#   left_camera_matrix          左相机的内参矩阵
+#   right_camera_matrix         右相机的内参矩阵
+#   left_distortion             左相机的畸变系数    格式(K1,K2,P1,P2,K3)
+#   right_distortion            右相机的畸变系数
+#   R, T                        右相机相对左相机的旋转矩阵和平移向量（毫米）
+#   size                        单个相机的图像尺寸 (宽, 高)
+# -------------------------------------------------------------------------------------------------------------
+DEFAULT_CALIBRATION = {
+    "left_camera_matrix": np.array([[1.28782208e+03, 0.00000000e+00, 1.63925648e+02],
+                                    [0.00000000e+00, 1.30509164e+03, 2.13901456e+02],
+                                    [0.00000000e+00, 0.00000000e+00, 1.00000000e+00]]),
+    "right_camera_matrix": np.array([[1.23753925e+03, 0.00000000e+00, -1.15126361e+01],
+                                     [0.00000000e+00, 1.29207405e+03, 2.28432426e+02],
+                                     [0.00000000e+00, 0.00000000e+00, 1.00000000e+00]]),
+    "left_distortion": np.array([[6.73438062e-01, -1.24494025e+01, -2.86825939e-02, 1.67518823e-02, 5.00656930e+01]]),
+    "right_distortion": np.array([[0.2429477, -5.29792274, -0.03965634, 0.0402608, 15.50194529]]),
+    "R": np.array([[0.99031455, 0.00344004, 0.13879936],
+                   [-0.00305175, 0.99999081, -0.00301023],
+                   [-0.13880844, 0.00255749, 0.99031595]]),
+    "T": np.array([[-61.22409065], [-4.82093845], [5.65538616]]),
+    "size": (640, 480),
+}
+
+_CALIBRATION_KEYS = ("left_camera_matrix", "left_distortion", "right_camera_matrix", "right_distortion", "R", "T")
+_ARRAY_NAMES = ("R1", "R2", "P1", "P2", "Q", "roi1", "roi2", "left_map1", "left_map2", "right_map1", "right_map2")
+
+def calibration_key(calibration, size):
+    """标定参数和图像尺寸的哈希值，作为缓存的键"""
+    digest = hashlib.sha1()
+    digest.update(f"v{_CACHE_VERSION}:{size[0]}x{size[1]}".encode("ascii"))
+    for name in _CALIBRATION_KEYS:
+        digest.update(np.ascontiguousarray(calibration[name], dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+class Rectification:
+    """一组双目校正结果：R1/R2/P1/P2/Q、有效区域和左右映射表，以及所用的标定参数"""
+
+    def __init__(self, key, size, arrays, calibration):
+        self.key = key
+        self.size = tuple(size)
+        self.calibration = calibration
+        for name in _ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+
+    def rectify(self, left, right, interpolation=cv2.INTER_LINEAR):
+        """校正左右图像，返回 (左, 右)"""
+        return (cv2.remap(left, self.left_map1, self.left_map2, interpolation),
+                cv2.remap(right, self.right_map1, self.right_map2, interpolation))
+
+    def rectify_points(self, points):
+        """把左相机原始图像上的像素坐标换算为校正后左图像上的坐标，返回 (N, 2) float32 数组"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        rectified = cv2.undistortPoints(points, self.calibration["left_camera_matrix"],
+                                        self.calibration["left_distortion"], R=self.R1, P=self.P1)
+        return rectified.reshape(-1, 2).astype(np.float32)
+
+def compute_rectification(calibration, size):
+    """计算校正参数和映射表（不使用缓存）"""
+    R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(calibration["left_camera_matrix"], calibration["left_distortion"],
+                                                      calibration["right_camera_matrix"], calibration["right_distortion"],
+                                                      size, calibration["R"], calibration["T"])
+
+    # 校正查找映射表,将原始图像和校正后的图像上的点一一对应起来
+    left_map1, left_map2 = cv2.initUndistortRectifyMap(calibration["left_camera_matrix"], calibration["left_distortion"],
+                                                       R1, P1, size, cv2.CV_16SC2)
+    right_map1, right_map2 = cv2.initUndistortRectifyMap(calibration["right_camera_matrix"], calibration["right_distortion"],
+                                                         R2, P2, size, cv2.CV_16SC2)
+    return {
+        "R1": R1, "R2": R2, "P1": P1, "P2": P2, "Q": Q,
+        "roi1": np.array(roi1, dtype=np.int32), "roi2": np.array(roi2, dtype=np.int32),
+        "left_map1": left_map1, "left_map2": left_map2,
+        "right_map1": right_map1, "right_map2": right_map2,
+    }
+
+def _save_cache(path, arrays):
+    """写入缓存：先写到临时目录再整体改名，避免其他进程读到不完整的缓存"""
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(temp_dir, name + ".npy"), array)
+        os.replace(temp_dir, path)
+    except OSError:
+        # 其他进程已经写好了同一份缓存
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def _load_cache(path):
+    """以内存映射方式读取缓存，不完整时返回 None"""
+    try:
+        return {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in _ARRAY_NAMES}
+    except (OSError, ValueError):
+        return None
+
+# 本进程内已加载的校正结果
+_loaded = {}
+
+def load_rectification(calibration=None, size=None, cache_dir=CACHE_DIR):
+    """
+    获取校正参数和映射表：优先使用本进程已加载的结果，其次读取磁盘缓存，都没有时计算并写入缓存
+    calibration: 标定参数字典（格式同 DEFAULT_CALIBRATION），为 None 时使用默认标定
+    size: 单个相机的图像尺寸 (宽, 高)，为 None 时使用标定参数中的 size
+    cache_dir: 缓存目录，为 None 时不读写磁盘缓存
+    """
+    calibration = DEFAULT_CALIBRATION if calibration is None else calibration
+    size = tuple(calibration["size"] if size is None else size)
+    key = calibration_key(calibration, size)
+
+    rectification = _loaded.get(key)
+    if rectification is not None:
+        return rectification
+
+    arrays = None
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, key)
+        arrays = _load_cache(path)
+    if arrays is None:
+        arrays = compute_rectification(calibration, size)
+        if path is not None:
+            _save_cache(path, arrays)
+
+    rectification = Rectification(key, size, arrays, calibration)
+    _loaded[key] = rectification
+    return rectification
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    compute_rectification(DEFAULT_CALIBRATION, DEFAULT_CALIBRATION["size"])
+    computed = time.perf_counter() - start
+
+    load_rectification()
+    _loaded.clear()
+    start = time.perf_counter()
+    rectification = load_rectification()
+    cached = time.perf_counter() - start
+
+    print(f"缓存键: {rectification.key}")
+    print(f"重新计算: {computed * 1000:.1f} ms，读取缓存: {cached * 1000:.1f} ms")
+    print(rectification.Q)
@@ -0,0 +1,59 @@
+"""
+测试多人脸跟踪（python -m pytest test_face_tracker.py）
+只测试人脸框关联，不运行人脸检测和FaceMesh
+"""
+
+import numpy as np
+
+from face_tracker import FaceTracker, box_iou
+
+def boxes(*items):
+    return np.array(items, dtype=np.float32)
+
+def ids_by_position(tracks):
+    """按人脸框左边界排序的跟踪ID"""
+    return [track.track_id for track in sorted(tracks, key=lambda track: track.box[0])]
+
+def test_box_iou():
+    iou = box_iou(boxes((0, 0, 10, 10)), boxes((0, 0, 10, 10), (5, 0, 15, 10), (20, 20, 30, 30)))
+    np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]], atol=1e-6)
+
+def test_ids_stable_across_frames():
+    tracker = FaceTracker()
+    left, right = np.array([100, 100, 200, 220]), np.array([400, 90, 480, 190])
+    first = ids_by_position(tracker.update(boxes(left, right)))
+    assert first == [1, 2]
+
+    # 两张人脸缓慢移动，检测结果的顺序每帧不同
+    for step in range(1, 10):
+        moved = [left + (5 * step, 2 * step, 5 * step, 2 * step), right - (4 * step, 0, 4 * step, 0)]
+        if step % 2:
+            moved.reverse()
+        assert ids_by_position(tracker.update(boxes(*moved))) == first
+
+    assert tracker.get(1).hits == 10 and tracker.get(1).missed == 0
+
+def test_fast_motion_matched_by_center_distance():
+    tracker = FaceTracker()
+    tracker.update(boxes((100, 100, 200, 200)))
+    # 移动了半个多人脸宽度，IoU 低于阈值，但中心距离在范围内
+    tracks = tracker.update(boxes((155, 100, 255, 200)))
+    assert [track.track_id for track in tracks] == [1]
+    assert tracks[0].box == (155.0, 100.0, 255.0, 200.0)
+
+def test_missing_face_keeps_id_then_expires():
+    tracker = FaceTracker(max_missed=2)
+    tracker.update(boxes((100, 100, 200, 200), (400, 100, 500, 200)))
+
+    # 第二个人暂时检测不到，回来后仍是原来的ID
+    tracker.update(boxes((100, 100, 200, 200)))
+    assert tracker.get(2).missed == 1
+    tracker.update(boxes((100, 100, 200, 200), (405, 100, 505, 200)))
+    assert tracker.get(2).missed == 0
+
+    # 连续超过 max_missed 次检测不到时删除，再出现时分配新ID
+    for _ in range(3):
+        tracker.update(boxes((100, 100, 200, 200)))
+    assert tracker.get(2) is None
+    tracks = tracker.update(boxes((100, 100, 200, 200), (400, 100, 500, 200)))
+    assert ids_by_position(tracks) == [1, 3]
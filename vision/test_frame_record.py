@@ -0,0 +1,61 @@
+"""
+测试帧录制与回放（python -m pytest test_frame_record.py）
+"""
+
+import cv2
+import numpy as np
+
+from frame_record import FrameRecorder, ReplaySource
+
+def make_frames(count=5, shape=(48, 64, 3)):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(count)]
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "session.rec")
+    frames = make_frames()
+    timestamps = [100.0 + i / 30 for i in range(len(frames))]
+    with FrameRecorder(path, codec=".png") as recorder:
+        for i, (frame, timestamp) in enumerate(zip(frames, timestamps)):
+            index = recorder.write(frame, timestamp)
+            if i % 2 == 0:
+                recorder.record_result(index, True, (10.5 + i, 20.25), (1, 2, 30, 40))
+            else:
+                recorder.record_result(index, False)
+
+    source = ReplaySource(path, realtime=False)
+    try:
+        assert source.frame_count == len(frames)
+        assert (source.width, source.height) == (64, 48)
+        assert source.get(cv2.CAP_PROP_FRAME_COUNT) == len(frames)
+        np.testing.assert_array_equal(source.timestamps, timestamps)
+
+        for i, frame in enumerate(frames):
+            success, replayed = source.read()
+            assert success
+            np.testing.assert_array_equal(replayed, frame)     # png 无损
+            if i % 2 == 0:
+                assert source.recorded_result() == (True, (10.5 + i, 20.25), (1.0, 2.0, 30.0, 40.0))
+            else:
+                assert source.recorded_result() == (False, None, None)
+
+        success, frame = source.read()
+        assert not success and frame is None
+    finally:
+        source.release()
+
+def test_seek_and_loop(tmp_path):
+    path = str(tmp_path / "session.rec")
+    frames = make_frames(3)
+    with FrameRecorder(path, codec=".png") as recorder:
+        for i, frame in enumerate(frames):
+            recorder.write(frame, float(i))
+
+    source = ReplaySource(path, realtime=False, loop=True)
+    try:
+        assert source.set(cv2.CAP_PROP_POS_FRAMES, 2)
+        np.testing.assert_array_equal(source.read()[1], frames[2])
+        np.testing.assert_array_equal(source.read()[1], frames[0])    # 播放到结尾后从头开始
+        assert source.recorded_result() is None                        # 没有记录检测结果
+    finally:
+        source.release()
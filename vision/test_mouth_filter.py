@@ -0,0 +1,42 @@
+"""
+测试嘴部位置预测滤波器（python -m pytest test_mouth_filter.py）
+"""
+
+from mouth_filter import MouthKalmanFilter
+
+def feed_constant_velocity(kalman, velocity=(120.0, -60.0), start=(320.0, 240.0), frames=30, period=1 / 30):
+    """按匀速运动输入 frames 帧测量，返回最后一帧的时间"""
+    for i in range(frames):
+        t = i * period
+        kalman.update((start[0] + velocity[0] * t, start[1] + velocity[1] * t), t)
+    return (frames - 1) * period
+
+def test_not_initialized():
+    kalman = MouthKalmanFilter()
+    assert not kalman.initialized
+    assert kalman.predict(0.0) is None
+    assert kalman.velocity() is None
+
+def test_constant_velocity_prediction():
+    kalman = MouthKalmanFilter()
+    last = feed_constant_velocity(kalman)
+
+    vx, vy = kalman.velocity()
+    assert abs(vx - 120.0) < 2.0 and abs(vy + 60.0) < 2.0
+
+    # 预测 0.1 秒之后的位置
+    x, y = kalman.predict(last + 0.1)
+    assert abs(x - (320.0 + 120.0 * (last + 0.1))) < 1.0
+    assert abs(y - (240.0 - 60.0 * (last + 0.1))) < 1.0
+
+def test_prediction_horizon_is_capped():
+    kalman = MouthKalmanFilter(max_horizon=0.3)
+    last = feed_constant_velocity(kalman)
+    assert kalman.predict(last + 0.3) == kalman.predict(last + 5.0)
+
+def test_reset_clears_state():
+    kalman = MouthKalmanFilter()
+    feed_constant_velocity(kalman, frames=5)
+    kalman.reset()
+    assert not kalman.initialized
+    assert kalman.last_update_time is None
@@ -0,0 +1,64 @@
+"""
+测试 SGBM 参数调优的评分工具（python -m pytest test_stereo_autotune.py）
+"""
+
+import json
+
+import numpy as np
+
+from stereo_autotune import lr_consistency, pareto_front, select_config
+
+def score(name, ms, quality):
+    return {"name": name, "ms_per_frame": ms, "quality": quality}
+
+SCORES = [
+    score("slow-best", 40.0, 0.90),
+    score("fast", 5.0, 0.50),
+    score("dominated", 12.0, 0.45),     # 比 fast 慢且质量更差
+    score("middle", 15.0, 0.70),
+    score("tie-worse", 15.0, 0.60),     # 与 middle 同样耗时但质量更差
+    score("empty", 1.0, 0.0),           # 没有可靠视差
+    score("slower-same", 50.0, 0.90),   # 比 slow-best 慢但没有更好
+]
+
+def test_pareto_front():
+    front = pareto_front(SCORES)
+    assert [s["name"] for s in front] == ["fast", "middle", "slow-best"]
+
+def test_pareto_front_empty():
+    assert pareto_front([]) == []
+    assert pareto_front([score("empty", 1.0, 0.0)]) == []
+
+def test_lr_consistency():
+    # 4 行 20 列，左右视差都是 8 像素（定点格式 ×16）
+    left = np.full((4, 20), 8 * 16, dtype=np.int16)
+    right = np.full((4, 20), 8 * 16, dtype=np.int16)
+    left[:, -2:] = -16      # 无效视差
+    valid_ratio, consistent_ratio = lr_consistency(left, right, min_disparity=1)
+    assert valid_ratio == 18 / 20
+    # x < 8 的像素对应到右图之外，不计为一致
+    assert consistent_ratio == 10 / 18
+
+    right[:, :5] = 2 * 16   # 右图左侧 5 列视差不一致
+    _, consistent_ratio = lr_consistency(left, right, min_disparity=1)
+    assert consistent_ratio == 5 / 18
+
+def test_lr_consistency_tolerance():
+    left = np.full((2, 10), 4 * 16, dtype=np.int16)
+    right = left + 8        # 相差半个像素
+    assert lr_consistency(left, right, 1, tolerance=1.0)[1] == 6 / 10
+    assert lr_consistency(left, right, 1, tolerance=0.25)[1] == 0.0
+
+def test_lr_consistency_no_valid_disparity():
+    disparity = np.zeros((3, 3), dtype=np.int16)
+    assert lr_consistency(disparity, disparity, min_disparity=1) == (0.0, 0.0)
+
+def test_select_config(tmp_path):
+    path = tmp_path / "autotune.json"
+    configs = [{"name": s["name"]} for s in SCORES]
+    path.write_text(json.dumps({"configs": configs, "scores": SCORES}), encoding="utf-8")
+
+    assert select_config(str(path))[0]["name"] == "slow-best"
+    assert select_config(str(path), budget_ms=20.0)[0]["name"] == "middle"
+    # 没有满足耗时上限的配置时使用最快的
+    assert select_config(str(path), budget_ms=0.5)[0]["name"] == "empty"
@@ -0,0 +1,51 @@
+"""
+测试双目深度的视差范围换算和定点视差重投影（python -m pytest test_stereo_depth.py）
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from stereo_depth import StereoDepthEngine, disparity_range, scaled_q
+
+# 焦距 500 像素、基线 60 毫米的理想双目：Z = 500 * 60 / d
+FOCAL, BASELINE, CX, CY = 500.0, 60.0, 320.0, 240.0
+Q = np.array([[1, 0, 0, -CX],
+              [0, 1, 0, -CY],
+              [0, 0, 0, FOCAL],
+              [0, 0, 1 / BASELINE, 0]], dtype=np.float64)
+
+def test_disparity_range():
+    # 200 毫米对应视差 150，600 毫米对应视差 50
+    min_disparity, num_disparities = disparity_range(Q, 200, 600)
+    assert min_disparity == 50
+    assert num_disparities % 16 == 0
+    assert min_disparity + num_disparities - 1 >= 150
+    assert num_disparities - 16 < 150 - min_disparity + 1      # 不多于一个16的倍数
+
+def test_disparity_range_minimum():
+    # 很窄的工作距离也至少搜索16个视差
+    assert disparity_range(Q, 500, 510)[1] == 16
+
+def test_scaled_q_matches_fixed_point_disparity():
+    disparity = np.full((4, 4), 75.0, dtype=np.float32)      # 真实视差，Z = 400 毫米
+    expected = cv2.reprojectImageTo3D(disparity, Q)
+    fixed = cv2.reprojectImageTo3D((disparity * 16).astype(np.int16), scaled_q(Q))
+    np.testing.assert_allclose(fixed, expected, rtol=1e-5)
+    assert fixed[0, 0, 2] == pytest.approx(400.0)
+
+def test_scaled_q_does_not_modify_input():
+    original = Q.copy()
+    scaled_q(Q)
+    np.testing.assert_array_equal(Q, original)
+
+def test_engine_distance_range_and_point_at():
+    engine = StereoDepthEngine(mode="sgbm", distance_range=(200, 600))
+    Q_real = engine.rectification.Q
+    assert (engine.min_disparity, engine.num_disparities) == disparity_range(Q_real, 200, 600)
+
+    # 400 毫米处的真实视差，换算为定点视差载入
+    d = (Q_real[2, 3] / 400.0 - Q_real[3, 3]) / Q_real[3, 2]
+    engine.load_disparity(np.full((engine.height, engine.width), round(d * 16), dtype=np.int16))
+    x, y, z = engine.point_at(engine.width // 2, engine.height // 2)
+    assert z == pytest.approx(400.0, rel=0.01)
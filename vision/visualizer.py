@@ -0,0 +1,112 @@
+"""
+可视化输出
+控制路径只提交帧（以及绘制叠加信息的函数），绘制和显示在独立线程中按限定帧率进行，
+被跳过的帧不会绘制；所有 OpenCV 窗口操作都在该线程中完成
+"""
+
+import threading
+import time
+
+import cv2
+
+class VisualizationSink:
+    """限帧率的显示线程，每个窗口只保留最新提交的一帧"""
+
+    def __init__(self, max_fps=15):
+        """
+        max_fps: 最大显示帧率
+        """
+        self.max_fps = max_fps
+        self.quit_requested = threading.Event()   # 在任一窗口按下 'q' 时置位
+
+        self._cond = threading.Condition()
+        self._pending = {}       # 窗口名 -> (frame, overlay, hold)
+        self._expire = {}        # 窗口名 -> 自动关闭时间
+        self._closing = set()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """启动显示线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="VisualizationSink", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止显示线程并关闭所有窗口"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+
+    def submit(self, window, frame, overlay=None, hold=0.0):
+        """
+        提交一帧，不等待显示
+        window: 窗口名
+        frame: 图像，提交后调用方不应再修改
+        overlay: 可选的绘制函数 overlay(frame) -> frame，在显示线程中调用
+        hold: 大于0时该窗口显示 hold 秒后自动关闭（用于单次预览）
+        """
+        with self._cond:
+            self._pending[window] = (frame, overlay, hold)
+            self._closing.discard(window)
+            self._cond.notify_all()
+
+    def close_window(self, window):
+        """关闭窗口"""
+        with self._cond:
+            self._pending.pop(window, None)
+            self._closing.add(window)
+            self._cond.notify_all()
+
+    def _run(self):
+        """显示线程"""
+        period = 1.0 / self.max_fps
+        open_windows = set()
+
+        while True:
+            with self._cond:
+                if not self._running:
+                    break
+                if not self._pending and not self._closing and not open_windows:
+                    self._cond.wait(0.5)
+                    continue
+                pending, self._pending = self._pending, {}
+                closing, self._closing = self._closing, set()
+
+            loop_start = time.time()
+            for window, (frame, overlay, hold) in pending.items():
+                if overlay is not None:
+                    frame = overlay(frame)
+                cv2.imshow(window, frame)
+                open_windows.add(window)
+                if hold > 0:
+                    self._expire[window] = loop_start + hold
+                else:
+                    self._expire.pop(window, None)
+
+            # 到期的单次预览窗口自动关闭
+            closing |= {window for window, deadline in self._expire.items() if deadline <= loop_start}
+            for window in closing & open_windows:
+                cv2.destroyWindow(window)
+                open_windows.discard(window)
+                self._expire.pop(window, None)
+
+            if open_windows:
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    self.quit_requested.set()
+
+            remaining = period - (time.time() - loop_start)
+            if remaining > 0:
+                time.sleep(remaining)
+
+        for window in open_windows:
+            cv2.destroyWindow(window)
+        if open_windows:
+            cv2.waitKey(1)